@@ -3,6 +3,25 @@ ASGI config for multi_tracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Async deployment mode
+---------------------
+The dashboard, history and live event views are async, so under ASGI a worker is not pinned
+to a request while it waits on the database or holds an event stream open. The Procfile runs
+the app with uvicorn workers managed by gunicorn:
+
+    gunicorn multi_tracker.asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000
+
+or, for local development, with uvicorn directly:
+
+    uvicorn multi_tracker.asgi:application --reload
+
+Set CONN_MAX_AGE=0 in the environment when serving over ASGI. Django's persistent
+connections are per thread and are not reused across async requests.
+
+The WSGI entry point (multi_tracker.wsgi) keeps working, with the async views run per request.
+Event streams then degrade to EventSource reconnecting every EVENTS_RETRY_MS, and long-polls
+answer immediately.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -17,7 +17,9 @@ DEBUG = config('DEBUG', default=True, cast=bool)
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='127.0.0.1,localhost', cast=Csv())
 
 # Email Configuration
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Use django.core.mail.backends.locmem.EmailBackend or .filebased.EmailBackend for local testing
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='workspace.email_backends.CertifiSMTPBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'sent_emails'))
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -25,17 +27,51 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', config('EMAIL_HOST_USER'))
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', config('EMAIL_HOST_PASSWORD'))
 EMAIL_SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
 
+# Outbound email queue (see workspace.mail and the send_queued_email command)
+EMAIL_QUEUE_BATCH_SIZE = 100
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_DELAY = 60  # Seconds before the first retry, doubled after each failure
+EMAIL_QUEUE_CLAIM_TIMEOUT = 300  # Seconds a run holds its claimed emails before others may retry them
+
 # Database Configuration
 DATABASES = {
     'default': dj_database_url.config(
         default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
-        conn_max_age=600,
+        conn_max_age=config('CONN_MAX_AGE', default=600, cast=int),  # Set to 0 when serving over ASGI
         ssl_require=False  # Disable SSL for local SQLite
     )
 }
 
+# Cache Configuration
+# Local memory by default. Point CACHE_BACKEND/CACHE_LOCATION at a shared cache in production, e.g.
+# django.core.cache.backends.redis.RedisCache with redis://host:6379/0 (needs the redis package),
+# or django.core.cache.backends.filebased.FileBasedCache with a directory path.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='multi-tracker'),
+    }
+}
+# Whether every worker reads the same cache. Per-user entries invalidated on save only reach
+# other workers through a shared cache, so those caches are bounded or disabled without one.
+CACHE_SHARED = config(
+    'CACHE_SHARED', default=not CACHES['default']['BACKEND'].endswith(('.LocMemCache', '.DummyCache')), cast=bool
+)
+
+DASHBOARD_CACHE_TIMEOUT = 600 if CACHE_SHARED else 30  # Seconds a user's dashboard data and fragments stay cached
+IDEMPOTENCY_KEY_TIMEOUT = 86400  # Seconds a response is replayed for retries with the same Idempotency-Key
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # Seconds a request holds its Idempotency-Key before a retry may run it again
+
+# Authentication
+# Users are loaded with their profile; the profile's role fields are cached only with a shared
+# cache. Sessions created with the stock ModelBackend need to log in again once after switching.
+AUTHENTICATION_BACKENDS = ['workspace.auth_backends.ProfileModelBackend']
+AUTH_PROFILE_CACHE_TIMEOUT = 60 if CACHE_SHARED else 0  # Seconds a profile's role fields are reused, 0 to disable
+
 # Session Security Settings
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # Use database-backed sessions
+# Database-backed sessions by default. Use django.contrib.sessions.backends.cached_db (or .cache)
+# once CACHES points at a cache shared by every worker, so session reads skip the database.
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.db')
 SESSION_COOKIE_AGE = 1200  # 20 minutes to account for network delay on reauthenticate
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True  # Expire session when browser closes
 SESSION_COOKIE_SECURE = not DEBUG  # Secure cookies only in production
@@ -43,6 +79,32 @@ SESSION_COOKIE_HTTPONLY = True  # Prevent JavaScript access to session cookies
 
 # Custom Session Timeout for Middleware
 SESSION_TIMEOUT = 900  # 15 minutes
+SESSION_ACTIVITY_GRANULARITY = 60  # Only rewrite last_activity once it is this many seconds old
+SESSION_WARNING_SECONDS = 60  # Seconds before the timeout that connected pages are warned
+SESSION_ACTIVITY_EXEMPT_PATHS = ('/events/',)  # Background requests that must not keep a session alive
+
+# Live Events (workspace.events)
+EVENTS_BROKER = 'workspace.events.InProcessBroker'  # Same interface backed by Postgres NOTIFY or Redis for multi-process
+EVENTS_BACKLOG = 20  # Recent events kept per channel for reconnecting clients
+EVENTS_HEARTBEAT = 25  # Seconds between keep-alive comments on an idle stream
+EVENTS_STREAM_MAX_AGE = 300  # Seconds before a stream is closed and the browser reconnects
+EVENTS_LONG_POLL_TIMEOUT = 25  # Seconds a long-poll waits for an event
+EVENTS_RETRY_MS = 5000  # Reconnect delay suggested to EventSource clients
+
+# Attendance API (clock-in and offline sync clients)
+ATTENDANCE_API_BATCH_LIMIT = 62  # Most days recorded per call, two months of backlog
+
+# Leave Workflow
+LEAVE_BULK_DECISION_LIMIT = 1000  # Most leave requests a manager can approve or reject per call
+INBOX_PAGE_SIZE = 50  # Most requests per page of a manager's approval inbox
+INBOX_BADGE_CACHE_TIMEOUT = 300 if CACHE_SHARED else 30  # Seconds a manager's pending-approval badge stays cached
+LEAVE_ENTITLEMENTS = {'AL': 25, 'FL': 12}  # Working days per year for leave types tracked in LeaveBalance
+TEAM_MAX_ABSENT_SHARE = 0.5  # Share of a manager's reports allowed off on the same day, None to disable
+ORG_CLOSURE_DAYS = []  # ISO dates the organisation is closed, on top of bank holidays
+
+# Working-day calendar (workspace.working_calendar)
+BANK_HOLIDAYS_FILE = BASE_DIR / 'workspace' / 'data' / 'uk_bank_holidays.json'  # GOV.UK feed layout, read locally
+BANK_HOLIDAY_DIVISION = config('BANK_HOLIDAY_DIVISION', default='england-and-wales')  # Or scotland, northern-ireland
 
 
 # Application Definition
@@ -58,18 +120,29 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'workspace.middleware.QueryProfilingMiddleware',  # Opt-in via PROFILING_ENABLED, removes itself otherwise
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'workspace.middleware.AsyncWhiteNoiseMiddleware',  # WhiteNoise, able to run on the event loop under ASGI
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'workspace.middleware.SessionTimeoutMiddleware',  # Handles timeout
-    'workspace.middleware.UpdateLastActivityMiddleware',  # Tracks user activity
+    'workspace.middleware.SessionTimeoutMiddleware',  # Handles timeout and tracks user activity
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request Profiling (workspace.middleware.QueryProfilingMiddleware and the profile_report command)
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_SINK = config('PROFILING_SINK', default='')  # JSON lines file receiving every sample
+PROFILING_MAX_SAMPLES = 1000  # Samples kept in memory per URL name, summarized at /debug/profile/
+PROFILING_N_PLUS_ONE_THRESHOLD = 5  # Identical SQL templates per request before flagging N+1
+
+# View Benchmarks (workspace.tests.ViewBenchmarkTests, baselines in workspace/benchmark_baselines.json)
+BENCHMARK_ROUNDS = config('BENCHMARK_ROUNDS', default=10, cast=int)
+BENCHMARK_LATENCY_TOLERANCE = config('BENCHMARK_LATENCY_TOLERANCE', default=3.0, cast=float)  # Allowed p95 / baseline
+BENCHMARK_UPDATE_BASELINES = config('BENCHMARK_UPDATE_BASELINES', default=False, cast=bool)
+BENCHMARK_CHECK_LATENCY = config('BENCHMARK_CHECK_LATENCY', default=False, cast=bool)  # Off on shared CI, timings are noisy
 
 ROOT_URLCONF = 'multi_tracker.urls'
 
@@ -85,12 +158,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'workspace.context_processors.session_expiry',
+                'workspace.context_processors.pending_approvals',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'multi_tracker.wsgi.application'
+ASGI_APPLICATION = 'multi_tracker.asgi.application'
 
 # Password Validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -118,6 +193,10 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Attendance Archive (workspace.attendance_archive and the archive_attendance command)
+ATTENDANCE_RETENTION_DAYS = config('ATTENDANCE_RETENTION_DAYS', default=730, cast=int)  # Older whole months are archived
+ATTENDANCE_ARCHIVE_EXPORT_DIR = MEDIA_ROOT / 'attendance_archive'  # Gzipped NDJSON per year, when exported
+
 # Default Primary Key Field Type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -20,10 +20,23 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('verify-email/<uidb64>/<token>/', views.verify_email, name='verify_email'),
     path('leave-requests/', views.leave_request_list, name='leave_requests'),
+    path('leave-requests/new/', views.leave_request_create, name='leave_request_create'),
+    path('leave-requests/export/', views.leave_request_export, name='leave_request_export'),
+    path('attendance/', views.attendance_list, name='attendance_list'),
+    path('attendance/export/', views.attendance_export, name='attendance_export'),
     path('leave/approve/<int:leave_id>/', views.approve_leave, name='approve_leave'),
     path('leave/reject/<int:leave_id>/', views.reject_leave, name='reject_leave'),
+    path('leave/bulk/', views.bulk_decide_leave, name='bulk_decide_leave'),
+    path('api/leave/inbox/', views.leave_inbox_api, name='leave_inbox_api'),
+    path('attendance/bulk/', views.attendance_bulk_import, name='attendance_bulk_import'),
+    path('api/attendance/', views.attendance_upsert_api, name='attendance_upsert_api'),
+    path('team/calendar/<int:year>/<int:month>/', views.team_calendar, name='team_calendar'),
+    path('api/team/calendar/<int:year>/<int:month>/', views.team_calendar_api, name='team_calendar_api'),
+    path('debug/profile/', views.profile_summary, name='profile_summary'),
 
     # Handling timeout
     path('session_timeout_warning/', views.session_timeout_warning, name='session_timeout_warning'),
+    path('events/', views.event_stream, name='event_stream'),
+    path('events/poll/', views.event_poll, name='event_poll'),
 
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
@@ -1,7 +1,14 @@
 from django.contrib import admin
-from .models import UserProfile, AttendanceRecord, LeaveRequest
+from .models import (
+    UserProfile, AttendanceRecord, AttendanceMonthlySummary, ArchivedAttendanceMonth, LeaveBalance, LeaveRequest,
+    OutboundEmail,
+)
 
 # Registering the models for django interface
 admin.site.register(UserProfile)
 admin.site.register(AttendanceRecord)
 admin.site.register(LeaveRequest)
+admin.site.register(LeaveBalance)
+admin.site.register(AttendanceMonthlySummary)
+admin.site.register(ArchivedAttendanceMonth)
+admin.site.register(OutboundEmail)
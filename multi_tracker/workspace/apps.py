@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class WorkspaceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'workspace'
+
+    def ready(self):
+        # Connect signal receivers that live outside models.py
+        from . import balances, events, inbox, notifications, projection  # noqa: F401
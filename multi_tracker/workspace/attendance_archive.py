@@ -0,0 +1,187 @@
+import gzip
+import json
+from datetime import timedelta
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .models import ArchivedAttendanceMonth, AttendanceRecord, filter_months
+from .pagination import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor, keyset_page, keyset_queryset
+
+
+def archive_cutoff(retention_days=None):
+    """
+    Returns the first day still kept in AttendanceRecord: the start of the month that
+    ATTENDANCE_RETENTION_DAYS (or `retention_days`) reaches back to.
+    """
+    if retention_days is None:
+        retention_days = settings.ATTENDANCE_RETENTION_DAYS
+    return (now().date() - timedelta(days=retention_days)).replace(day=1)
+
+
+def _export_rows(rows, export_dir):
+    """
+    Appends rows to one gzipped NDJSON file per year, in the attendance import format.
+    """
+    files = {}
+    try:
+        for username, day, work_type in rows:
+            if day.year not in files:
+                files[day.year] = gzip.open(Path(export_dir) / f'attendance-{day.year}.ndjson.gz', 'at', encoding='utf-8')
+            files[day.year].write(json.dumps({'username': username, 'date': day.isoformat(), 'type': work_type or ''}) + '\n')
+    finally:
+        for export_file in files.values():
+            export_file.close()
+
+
+def archive_user_chunk(user_ids, cutoff, export_dir=None):
+    """
+    Moves the given users' records dated before `cutoff` into ArchivedAttendanceMonth. Returns the rows moved.
+
+    Days projected from approved leave stay in AttendanceRecord, linked to their request, so
+    cancelling the leave still retracts them. The export is written once the move commits, so a
+    rolled-back chunk never reaches the files.
+    """
+    hot = AttendanceRecord.objects.filter(user_id__in=user_ids, date__lt=cutoff, leave_request__isnull=True)
+    with transaction.atomic():
+        rows = list(hot.order_by('user_id', 'date').values_list('user_id', 'user__username', 'date', 'type'))
+        if not rows:
+            return 0
+
+        by_month = {}
+        for user_id, _, day, work_type in rows:
+            by_month.setdefault((user_id, day.year, day.month), []).append((day, work_type))
+        existing = {
+            (month.user_id, month.year, month.month): month
+            for month in ArchivedAttendanceMonth.objects.filter(
+                user_id__in=user_ids, year__in={year for _, year, _ in by_month}
+            )
+        }
+        months = []
+        for (user_id, year, month_number), records in by_month.items():
+            month = existing.get((user_id, year, month_number)) or ArchivedAttendanceMonth(
+                user_id=user_id, year=year, month=month_number, days=''
+            )
+            month.merge(records)
+            months.append(month)
+        ArchivedAttendanceMonth.objects.bulk_create(
+            months, update_conflicts=True, unique_fields=['user', 'year', 'month'], update_fields=['days'],
+            batch_size=1000,
+        )
+        # The summaries rebuilt after the delete read the archive written above, so counts are unchanged
+        hot.bulk_delete()
+
+        if export_dir:
+            transaction.on_commit(partial(
+                _export_rows, [(username, day, work_type) for _, username, day, work_type in rows], export_dir
+            ))
+    return len(rows)
+
+
+def archive_attendance(cutoff, chunk_size=500, export_dir=None, progress=None):
+    """
+    Archives every record dated before `cutoff` except projected leave, one transaction per chunk of users.
+    """
+    if export_dir:
+        Path(export_dir).mkdir(parents=True, exist_ok=True)
+    user_ids = User.objects.order_by('id').values_list('id', flat=True)
+    moved = 0
+    last_id = 0
+    while True:
+        chunk = list(user_ids.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        moved += archive_user_chunk(chunk, cutoff, export_dir)
+        last_id = chunk[-1]
+        if progress:
+            progress(moved)
+    return moved
+
+
+def attendance_values(start_date, end_date, users=None):
+    """
+    Yields (user_id, date, type) for [start_date, end_date], wherever the records are stored.
+
+    Recent ranges find no archived months, so the extra lookup is a single empty index probe.
+    A day logged again in the hot table after it was archived takes precedence.
+    """
+    hot = AttendanceRecord.objects.filter(date__range=(start_date, end_date))
+    if users is not None:
+        hot = hot.filter(user__in=users)
+    yield from hot.values_list('user_id', 'date', 'type')
+    yield from archived_attendance_values(start_date, end_date, users)
+
+
+def archived_attendance_values(start_date, end_date, users=None):
+    """
+    Yields (user_id, date, type) for the archived days in [start_date, end_date] that were not
+    logged again in the hot table, for readers that take the hot rows from elsewhere.
+    """
+    archived = filter_months(ArchivedAttendanceMonth.objects.all(), start_date, end_date)
+    if users is not None:
+        archived = archived.filter(user__in=users)
+    archived = list(archived)
+    if not archived:
+        return
+    relogged = set(AttendanceRecord.objects.filter(
+        user_id__in={month.user_id for month in archived}, date__range=(start_date, end_date),
+    ).values_list('user_id', 'date'))
+    for month in archived:
+        for day, work_type in month.records():
+            if start_date <= day <= end_date and (month.user_id, day) not in relogged:
+                yield month.user_id, day, work_type
+
+
+def attendance_history_page(filters, cursor, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Returns (records, next cursor) for the attendance history, newest first, with archived days
+    merged in as unsaved AttendanceRecords.
+
+    `filters` are the history view's lookups on user, applied to both tables.
+    Archived days take the negated user id as their pk, so they sort after the hot records of the
+    same date and keyset cursors stay unique. Archived months are read newest first and only until
+    the page is full, so a page deep in the archive still reads a few months at most.
+    """
+    position = decode_cursor(cursor)
+    hot = list(keyset_queryset(
+        AttendanceRecord.objects.filter(**filters).only('date', 'type'), 'date', cursor, page_size
+    ))
+    oldest = hot[page_size].date if len(hot) > page_size else None
+
+    archived = ArchivedAttendanceMonth.objects.filter(**filters)
+    if position is not None:
+        newest = position[0]
+        archived = archived.filter(Q(year__lt=newest.year) | Q(year=newest.year, month__lte=newest.month))
+    if oldest is not None:
+        archived = archived.filter(Q(year__gt=oldest.year) | Q(year=oldest.year, month__gte=oldest.month))
+
+    candidates = []
+    more_archived = False
+    month_key = None
+    for month in archived.order_by('-year', '-month').iterator(chunk_size=200):
+        if len(candidates) > page_size and (month.year, month.month) != month_key:
+            more_archived = True  # Older months cannot reach this page
+            break
+        month_key = (month.year, month.month)
+        for day, work_type in month.records():
+            key = (day, -month.user_id)
+            if (oldest is None or day >= oldest) and (position is None or key < position):
+                candidates.append(AttendanceRecord(pk=-month.user_id, user_id=month.user_id, date=day, type=work_type))
+
+    if candidates:
+        relogged = set(AttendanceRecord.objects.filter(
+            user_id__in={record.user_id for record in candidates},
+            date__range=(min(record.date for record in candidates), max(record.date for record in candidates)),
+        ).values_list('user_id', 'date'))
+        candidates = [record for record in candidates if (record.user_id, record.date) not in relogged]
+
+    rows = sorted(hot + candidates, key=lambda record: (record.date, record.pk), reverse=True)
+    page, next_cursor = keyset_page(rows, 'date', page_size)
+    if next_cursor is None and more_archived and page:
+        next_cursor = encode_cursor(page[-1].date, page[-1].pk)
+    return page, next_cursor
@@ -0,0 +1,244 @@
+import codecs
+import csv
+import json
+import time
+
+from django.contrib.auth.models import User
+
+from .forms import AttendanceRecordForm
+from .models import AttendanceRecord
+
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100  # Keeps the error list bounded on very dirty feeds
+
+
+READ_CHUNK_SIZE = 64 * 1024  # Bytes read from a file or request body at a time
+
+
+def iter_text_chunks(stream, encoding='utf-8', chunk_size=READ_CHUNK_SIZE):
+    """
+    Reads a binary stream (a file or request body) in fixed-size chunks and decodes them,
+    so a body without line breaks is still never read in one piece.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while chunk := stream.read(chunk_size):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def _iter_lines(chunks):
+    pending = ''
+    for chunk in chunks:
+        *lines, pending = (pending + chunk).split('\n')
+        for line in lines:
+            yield line + '\n'
+    if pending:
+        yield pending
+
+
+# Incremental parsers. Each takes an iterable of text chunks and yields row dicts,
+# so a file or request body is never loaded into memory in one piece.
+def iter_csv_rows(chunks):
+    """
+    Yields rows from CSV text with a header line (username,date,type).
+    """
+    for row in csv.DictReader(_iter_lines(chunks)):
+        yield row
+
+
+def iter_ndjson_rows(chunks):
+    """
+    Yields rows from newline-delimited JSON, skipping blank lines.
+    """
+    for line in _iter_lines(chunks):
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_json_array_rows(chunks):
+    """
+    Yields the objects of a top-level JSON array, decoding one element at a time.
+
+    Raises ValueError unless the input is exactly one array: a missing "," between elements,
+    input ending before the closing "]" (a cut-off feed) or data after it are all rejected.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    state = 'start'  # Then 'first' (element or "]"), 'next' ("," or "]"), 'element' and 'end'
+    for chunk in chunks:
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            if position >= len(buffer):
+                break
+            char = buffer[position]
+            if state == 'end':
+                raise ValueError('Unexpected data after the end of the JSON array.')
+            if state == 'start':
+                if char != '[':
+                    raise ValueError('Expected a JSON array of attendance rows.')
+                state = 'first'
+            elif state == 'next' or (state == 'first' and char == ']'):
+                if char not in ',]':
+                    raise ValueError(f'Expected "," or "]" after array element, found {char!r}.')
+                state = 'element' if char == ',' else 'end'
+            elif char == ']':
+                raise ValueError('Expected an array element after ",".')
+            else:
+                try:
+                    row, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    break  # Element is split across chunks, wait for more input
+                if end == len(buffer):
+                    break  # A number could continue in the next chunk
+                yield row
+                state, position = 'next', end
+                continue
+            position += 1
+        buffer = buffer[position:]
+    if state in ('first', 'element') and buffer.strip():
+        decoder.raw_decode(buffer, len(buffer) - len(buffer.lstrip()))  # Reports a malformed element
+    if state != 'end':
+        raise ValueError('Unexpected end of input before the closing "]" of the JSON array.')
+
+
+PARSERS = {
+    'csv': iter_csv_rows,
+    'ndjson': iter_ndjson_rows,
+    'json': iter_json_array_rows,
+}
+
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ImportResult:
+    """
+    Running totals for an import, safe to keep around for feeds of any size.
+    """
+
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.monotonic()
+
+    def add_error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'error': message})
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def validate_row(row, user_id, row_number, result):
+    """
+    Validates one {date, type} row for a known user, returning an unsaved record or None.
+    """
+    form = AttendanceRecordForm(data={'date': row.get('date'), 'type': row.get('type') or ''})
+    if not form.is_valid():
+        message = '; '.join(error for errors in form.errors.values() for error in errors)
+        result.add_error(row_number, message)
+        return None
+
+    record = form.save(commit=False)
+    record.user_id = user_id
+    return record
+
+
+def validate_batch(batch, first_row_number, result):
+    """
+    Validates a batch of rows against AttendanceRecordForm and returns unsaved records.
+
+    Users are resolved with a single query per batch. Later rows for the same (user, date)
+    replace earlier ones, as a single upsert statement cannot touch the same row twice.
+    """
+    batch = [row if isinstance(row, dict) else {} for row in batch]
+    usernames = {str(row.get('username', '')).strip().lower() for row in batch}
+    user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+    records = {}
+    for offset, row in enumerate(batch):
+        row_number = first_row_number + offset
+        username = str(row.get('username', '')).strip().lower()
+        user_id = user_ids.get(username)
+        if user_id is None:
+            result.add_error(row_number, f'Unknown user "{username}".')
+            continue
+
+        record = validate_row(row, user_id, row_number, result)
+        if record is not None:
+            records[(user_id, record.date)] = record
+    return list(records.values())
+
+
+def validate_user_rows(rows, user_id, result):
+    """
+    Validates rows for a single, already known user, numbering them from 0 as sent.
+    """
+    records = {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            result.add_error(index, 'Expected an object with "date" and "type".')
+            continue
+        record = validate_row(row, user_id, index, result)
+        if record is not None:
+            records[record.date] = record
+    return list(records.values())
+
+
+def upsert_records(records):
+    """
+    Inserts or updates attendance records on the (user, date) unique constraint.
+
+    A day logged over projected leave becomes the user's own record, so retracting the leave keeps it.
+    """
+    AttendanceRecord.objects.bulk_upsert(records, update_fields=('type', 'leave_request'))
+
+
+def import_attendance(rows, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Streams rows into AttendanceRecord in batches and returns an ImportResult.
+
+    `progress`, if given, is called with the running result after every batch.
+    """
+    result = ImportResult()
+    for batch in _batches(rows, batch_size):
+        records = validate_batch(batch, result.processed + 1, result)
+        if records:
+            upsert_records(records)
+        result.processed += len(batch)
+        result.imported += len(records)
+        if progress:
+            progress(result)
+    return result
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+
+# Profile fields kept in the cache: the role flags and links request handling reads.
+# The User row, with its password hash and is_active, is never cached.
+CACHED_PROFILE_FIELDS = frozenset(['id', 'user_id', 'manager_id', 'is_manager', 'is_tenant_admin', 'is_email_verified'])
+
+
+def _profile_key(user_id):
+    return f'auth:profile:{user_id}'
+
+
+class ProfileModelBackend(ModelBackend):
+    """
+    ModelBackend that loads the user joined with their UserProfile, so request.user.profile
+    and its role flags need no second query.
+
+    With AUTH_PROFILE_CACHE_TIMEOUT set, the profile's role fields are cached and dropped whenever
+    the profile is saved or deleted. That needs CACHE_SHARED, or other workers would keep the old
+    roles. The user itself is read from the database on every request, so a password change or
+    deactivation applies at once.
+    """
+
+    def __init__(self):
+        if settings.AUTH_PROFILE_CACHE_TIMEOUT and not settings.CACHE_SHARED:
+            raise ImproperlyConfigured(
+                'AUTH_PROFILE_CACHE_TIMEOUT needs a cache shared by every worker (CACHE_SHARED).'
+            )
+
+    def get_user(self, user_id):
+        timeout = settings.AUTH_PROFILE_CACHE_TIMEOUT
+        cached = cache.get(_profile_key(user_id)) if timeout else None
+        try:
+            if cached is None:
+                user = User._default_manager.select_related('profile').get(pk=user_id)
+            else:
+                user = User._default_manager.get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+
+        if cached is None:
+            profile = getattr(user, 'profile', None)
+            if profile is not None and timeout:
+                cache.set(_profile_key(user_id), {name: getattr(profile, name) for name in CACHED_PROFILE_FIELDS}, timeout)
+        else:
+            profile_model = User.profile.related.related_model
+            names = [field.attname for field in profile_model._meta.concrete_fields if field.attname in cached]
+            # Fields left out are deferred and load on first access
+            user.profile = profile_model.from_db(user._state.db, names, [cached[name] for name in names])
+        return user if self.user_can_authenticate(user) else None
+
+
+def invalidate_cached_profile(*user_ids):
+    """
+    Drops the cached profiles so the next request reloads them.
+    """
+    cache.delete_many([_profile_key(user_id) for user_id in user_ids if user_id])
@@ -0,0 +1,123 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .dashboard_cache import invalidate_dashboard
+from .models import LeaveBalance, LeaveRequest
+from .signals import leave_status_changed
+from .working_calendar import get_calendar
+
+
+# Balance bucket holding a request's days in each status. Denied and Cancelled hold none.
+STATUS_BUCKETS = {
+    'Pending': 'pending',
+    'Approved': 'taken',
+    'Cancellation Pending': 'taken',
+}
+
+
+def days_by_year(leave):
+    """
+    Counts the working days of a request per calendar year.
+    """
+    return get_calendar().count_by_year(leave.start_date, leave.end_date)
+
+
+def balance_deltas(changes):
+    """
+    Folds [(leave, previous status, new status)] into {(user, leave type, year): {bucket: days}}.
+    """
+    deltas = defaultdict(Counter)
+    for leave, previous_status, new_status in changes:
+        if leave.leave_type not in settings.LEAVE_ENTITLEMENTS:
+            continue
+        previous_bucket, new_bucket = STATUS_BUCKETS.get(previous_status), STATUS_BUCKETS.get(new_status)
+        if previous_bucket == new_bucket:
+            continue
+        for year, days in days_by_year(leave).items():
+            key = (leave.user_id, leave.leave_type, year)
+            if previous_bucket:
+                deltas[key][previous_bucket] -= days
+            if new_bucket:
+                deltas[key][new_bucket] += days
+    return deltas
+
+
+@receiver(leave_status_changed)
+def update_leave_balances(sender, changes, **kwargs):
+    """
+    Moves each request's days between the pending and taken buckets, in the transaction that
+    changed its status. Requests saved without a known previous status are reconciled instead.
+    """
+    known = [(leave, previous_status, leave.status) for leave, previous_status in changes if previous_status != '']
+    LeaveBalance.objects.adjust(balance_deltas(known))
+    unknown_users = {leave.user_id for leave, previous_status in changes if previous_status == ''}
+    if unknown_users:
+        reconcile_balances(unknown_users)
+
+
+@receiver(post_delete, sender=LeaveRequest)
+def release_leave_balance(sender, instance, **kwargs):
+    """
+    Gives back a deleted request's days. Rows already removed with their user are not recreated.
+    """
+    LeaveBalance.objects.adjust(balance_deltas([(instance, instance.status, None)]), create=False)
+
+
+def expected_balances(user_ids=None):
+    """
+    Recomputes {(user, leave type, year): {'pending': days, 'taken': days}} from the leave requests.
+    """
+    leave_requests = LeaveRequest.objects.filter(
+        leave_type__in=list(settings.LEAVE_ENTITLEMENTS), status__in=list(STATUS_BUCKETS),
+    ).only('user_id', 'leave_type', 'start_date', 'end_date', 'status')
+    if user_ids is not None:
+        leave_requests = leave_requests.filter(user_id__in=user_ids)
+    deltas = balance_deltas((leave, None, leave.status) for leave in leave_requests.iterator(chunk_size=2000))
+    return {key: {'pending': buckets['pending'], 'taken': buckets['taken']} for key, buckets in deltas.items()}
+
+
+def reconcile_balances(user_ids=None, fix=True):
+    """
+    Compares the ledger with the leave requests and returns the drifted rows as
+    [{'user_id', 'leave_type', 'year', 'stored': (pending, taken), 'expected': (pending, taken)}].
+
+    With `fix`, drifted and missing rows are rewritten in one bulk upsert. Entitlements are kept.
+    """
+    expected = expected_balances(user_ids)
+    stored = LeaveBalance.objects.all()
+    if user_ids is not None:
+        stored = stored.filter(user_id__in=user_ids)
+    stored = {
+        (balance.user_id, balance.leave_type, balance.year): balance
+        for balance in stored.only('user_id', 'leave_type', 'year', 'entitlement', 'pending', 'taken')
+    }
+
+    drift = []
+    rows = []
+    for key in expected.keys() | stored.keys():
+        buckets = expected.get(key, {'pending': 0, 'taken': 0})
+        balance = stored.get(key)
+        current = (balance.pending, balance.taken) if balance else (0, 0)
+        if current == (buckets['pending'], buckets['taken']):
+            continue
+        user_id, leave_type, year = key
+        drift.append({
+            'user_id': user_id, 'leave_type': leave_type, 'year': year,
+            'stored': current, 'expected': (buckets['pending'], buckets['taken']),
+        })
+        rows.append(LeaveBalance(
+            user_id=user_id, leave_type=leave_type, year=year,
+            entitlement=balance.entitlement if balance else settings.LEAVE_ENTITLEMENTS.get(leave_type, 0),
+            **buckets,
+        ))
+
+    if fix and rows:
+        LeaveBalance.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['user', 'leave_type', 'year'],
+            update_fields=['pending', 'taken'], batch_size=1000,
+        )
+        invalidate_dashboard(*{row.user_id for row in rows})
+    return drift
@@ -1,4 +1,7 @@
-from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .inbox import pending_approval_count
+
 
 def session_expiry(request):
     """
@@ -7,3 +10,14 @@ def session_expiry(request):
     if request.user.is_authenticated:
         return {"session_expiry": request.session.get_expiry_age()}
     return {}
+
+
+def pending_approvals(request):
+    """
+    Adds the manager's inbox size for the nav badge, read from the cache or the profile counter
+    only when a template uses it.
+    """
+    profile = getattr(request.user, 'profile', None) if request.user.is_authenticated else None
+    if profile is None or not profile.is_manager:
+        return {}
+    return {"pending_approval_count": SimpleLazyObject(lambda: pending_approval_count(profile.pk))}
@@ -0,0 +1,45 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# Each user's dashboard entries are keyed by a version token. Invalidation swaps the token,
+# so stale data and template fragments are simply never read again and expire on their own.
+# Tokens expire too: with a cache private to each worker, a swap made elsewhere is never seen,
+# so DASHBOARD_CACHE_TIMEOUT bounds how long another worker serves the old dashboard.
+def _version_key(user_id):
+    return f'dashboard:version:{user_id}'
+
+
+def _data_key(user_id, version):
+    return f'dashboard:data:{user_id}:{version}'
+
+
+async def aget_dashboard_version(user_id):
+    """
+    Returns the user's current dashboard version token, creating one on first use.
+    """
+    version = await cache.aget(_version_key(user_id))
+    if version is None:
+        version = uuid4().hex
+        if not await cache.aadd(_version_key(user_id), version, settings.DASHBOARD_CACHE_TIMEOUT):
+            version = await cache.aget(_version_key(user_id))
+    return version
+
+
+async def aget_dashboard_data(user_id, version):
+    return await cache.aget(_data_key(user_id, version))
+
+
+async def aset_dashboard_data(user_id, version, data):
+    await cache.aset(_data_key(user_id, version), data, settings.DASHBOARD_CACHE_TIMEOUT)
+
+
+def invalidate_dashboard(*user_ids):
+    """
+    Bumps the dashboard version of every given user in one cache round trip.
+    """
+    cache.set_many(
+        {_version_key(user_id): uuid4().hex for user_id in user_ids if user_id}, settings.DASHBOARD_CACHE_TIMEOUT
+    )
@@ -4,7 +4,28 @@ from functools import wraps
 def tenant_required(view_func):
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if not hasattr(request.user, 'userprofile') or not request.user.userprofile.tenant:
+        # Single tenant: membership is having a profile, loaded with the user by ProfileModelBackend
+        if getattr(request.user, 'profile', None) is None:
             return HttpResponseForbidden("You must belong to a tenant to access this view.")
         return view_func(request, *args, **kwargs)
     return _wrapped_view
+
+
+def tenant_admin_required(view_func):
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        profile = getattr(request.user, 'profile', None)
+        if not request.user.is_staff and not (profile and profile.is_tenant_admin):
+            return HttpResponseForbidden("Only tenant admins can access this view.")
+        return view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+
+def manager_required(view_func):
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        profile = getattr(request.user, 'profile', None)
+        if not (profile and profile.is_manager):
+            return HttpResponseForbidden("Only managers can access this view.")
+        return view_func(request, *args, **kwargs)
+    return _wrapped_view
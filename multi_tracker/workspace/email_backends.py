@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.mail.backends.smtp import EmailBackend
+
+
+class CertifiSMTPBackend(EmailBackend):
+    """
+    SMTP backend that reuses the certifi-based SSL context built once in settings,
+    instead of creating a new context for every connection.
+    """
+
+    @property
+    def ssl_context(self):
+        return settings.EMAIL_SSL_CONTEXT
@@ -0,0 +1,247 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .inbox import AWAITING_STATUSES, pending_approval_count
+from .signals import leave_status_changed
+
+
+# Channels events are published on: one per user, and one per manager profile for inbox changes
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def profile_channel(profile_id):
+    return f'profile:{profile_id}'
+
+
+class Event:
+    """
+    One pushed message: a process-wide increasing id (None for per-connection events),
+    a type and a JSON-serializable payload.
+    """
+
+    __slots__ = ('id', 'type', 'data')
+
+    def __init__(self, event_id, event_type, data):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+
+    def as_dict(self):
+        return {'id': self.id, 'type': self.type, 'data': self.data}
+
+    def as_sse(self):
+        event_id = f'id: {self.id}\n' if self.id is not None else ''
+        return f'{event_id}event: {self.type}\ndata: {json.dumps(self.data)}\n\n'
+
+
+class InProcessBroker:
+    """
+    Fans events out to the streams and long-polls connected to this process.
+
+    publish() can be called from any thread; subscribers are asyncio queues woken on their own
+    event loop. A short backlog per channel lets reconnecting clients catch up with
+    Last-Event-ID. A broker backed by Postgres LISTEN/NOTIFY or Redis pub/sub can replace this
+    one through EVENTS_BROKER by providing the same publish, subscribe, since and latest_id.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.latest_id = 0
+        self._subscribers = defaultdict(set)
+        self._backlog = defaultdict(lambda: deque(maxlen=settings.EVENTS_BACKLOG))
+
+    def publish(self, channel, event_type, data):
+        with self._lock:
+            event = Event(next(self._ids), event_type, data)
+            self.latest_id = event.id
+            self._backlog[channel].append(event)
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:  # The subscriber's loop has shut down
+                pass
+        return event
+
+    def since(self, channels, last_id):
+        """
+        Returns the backlog events on `channels` newer than `last_id`, oldest first. A client
+        without a `last_id` has nothing to catch up on.
+        """
+        if last_id is None:
+            return []
+        with self._lock:
+            events = [event for channel in channels for event in self._backlog.get(channel, ()) if event.id > last_id]
+        return sorted(events, key=lambda event: event.id)
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        """
+        Yields an asyncio.Queue receiving every event published on `channels` while subscribed.
+        """
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            for channel in channels:
+                self._subscribers[channel].add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                for channel in channels:
+                    self._subscribers[channel].discard(entry)
+                    if not self._subscribers[channel]:
+                        del self._subscribers[channel]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.EVENTS_BROKER)()
+    return _broker
+
+
+def publish_on_commit(messages):
+    """
+    Publishes [(channel, type, data)] once the surrounding transaction commits, so clients
+    never hear of rolled-back changes.
+    """
+    if messages:
+        transaction.on_commit(lambda: [get_broker().publish(*message) for message in messages])
+
+
+@receiver(leave_status_changed)
+def push_leave_status_changes(sender, changes, **kwargs):
+    """
+    Tells requesters their request changed status, and managers that their inbox changed.
+    Inbox events carry no count: each connected stream reads it from the badge cache.
+    """
+    messages = []
+    managers = set()
+    for leave, previous_status in changes:
+        if previous_status is not None:
+            messages.append((user_channel(leave.user_id), 'leave_status', {
+                'id': leave.pk,
+                'status': leave.status,
+                'previous_status': previous_status or None,
+                'start_date': leave.start_date.isoformat(),
+                'end_date': leave.end_date.isoformat(),
+            }))
+        if leave.manager_id is not None and (
+            previous_status == '' or (previous_status in AWAITING_STATUSES) != (leave.status in AWAITING_STATUSES)
+        ):
+            managers.add(leave.manager_id)
+    messages.extend((profile_channel(profile_id), 'pending_approvals', {}) for profile_id in managers)
+    publish_on_commit(messages)
+
+
+def publish_session_extended(user_id):
+    """
+    Lets open streams push back their expiry warning after activity elsewhere refreshed the session.
+    """
+    get_broker().publish(user_channel(user_id), 'session_extended', {'expires_in': settings.SESSION_TIMEOUT})
+
+
+# Delivery to clients, shared by the SSE stream and the long-poll fallback
+async def session_deadline(session):
+    """
+    Returns the epoch time at which the session times out for inactivity.
+    """
+    last_activity = await session.aget('last_activity')
+    try:
+        started = datetime.fromisoformat(last_activity).timestamp()
+    except (TypeError, ValueError):
+        started = time.time()
+    return started + settings.SESSION_TIMEOUT
+
+
+def _session_event(deadline):
+    remaining = max(0, int(deadline - time.time()))
+    return Event(None, 'session_expiring' if remaining else 'session_expired', {'expires_in': remaining})
+
+
+async def _prepared(event, profile_id):
+    if event.type == 'pending_approvals' and profile_id is not None:
+        count = await sync_to_async(pending_approval_count)(profile_id)
+        return Event(event.id, event.type, {'count': count})
+    return event
+
+
+async def sse_stream(channels, last_id, deadline, profile_id=None):
+    """
+    Yields server-sent events: the backlog after `last_id` (the Last-Event-ID of a reconnect),
+    then live events, keep-alive comments while idle and the session expiry warning.
+    Closes after EVENTS_STREAM_MAX_AGE or on expiry.
+    """
+    broker = get_broker()
+    loop = asyncio.get_running_loop()
+    closes_at = loop.time() + settings.EVENTS_STREAM_MAX_AGE
+    warned = False
+    async with broker.subscribe(channels) as queue:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        for event in broker.since(channels, last_id):
+            yield (await _prepared(event, profile_id)).as_sse()
+
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                yield _session_event(deadline).as_sse()
+                return
+            if not warned and remaining <= settings.SESSION_WARNING_SECONDS:
+                yield _session_event(deadline).as_sse()
+                warned = True
+            until_warning = remaining if warned else remaining - settings.SESSION_WARNING_SECONDS
+            timeout = min(settings.EVENTS_HEARTBEAT, closes_at - loop.time(), until_warning)
+            if closes_at - loop.time() <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(queue.get(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if event.type == 'session_extended':
+                deadline = time.time() + event.data['expires_in']
+                warned = False
+            yield (await _prepared(event, profile_id)).as_sse()
+
+
+async def poll_events(channels, last_id, deadline, profile_id=None, wait=True):
+    """
+    Returns (events after `last_id`, cursor for the next poll), waiting up to
+    EVENTS_LONG_POLL_TIMEOUT for an event if there are none (only with `wait`).
+    A session expiry warning is added once it is due.
+    """
+    broker = get_broker()
+    async with broker.subscribe(channels) as queue:
+        cursor = broker.latest_id
+        events = broker.since(channels, last_id)
+        until_warning = deadline - time.time() - settings.SESSION_WARNING_SECONDS
+        if not events and wait and until_warning > 0:
+            try:
+                events = [await asyncio.wait_for(queue.get(), min(settings.EVENTS_LONG_POLL_TIMEOUT, until_warning))]
+            except asyncio.TimeoutError:
+                pass
+    cursor = max([cursor, last_id or 0, *(event.id for event in events)])
+    events = [await _prepared(event, profile_id) for event in events]
+    if deadline - time.time() <= settings.SESSION_WARNING_SECONDS:
+        events.append(_session_event(deadline))
+    return events, cursor
@@ -0,0 +1,142 @@
+import calendar
+import csv
+import json
+from datetime import date
+
+from .models import ArchivedAttendanceMonth, AttendanceRecord, LeaveRequest
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+ATTENDANCE_COLUMNS = ['username', 'date', 'type']  # Same layout import_attendance reads
+LEAVE_COLUMNS = ['username', 'leave_type', 'start_date', 'end_date', 'status', 'created_at']
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """
+    File-like object whose write() hands the formatted line straight back.
+    """
+
+    def write(self, value):
+        return value
+
+
+# values() rather than values_list(): its iterable is a true generator, which aiterator() requires
+def attendance_export_queryset(filters):
+    return AttendanceRecord.objects.filter(**filters).order_by('-date', '-id').values(
+        'user__username', 'date', 'type'
+    )
+
+
+def attendance_archive_queryset(filters):
+    return ArchivedAttendanceMonth.objects.filter(**filters).select_related('user').only(
+        'year', 'month', 'days', 'user__username'
+    ).order_by('-year', '-month', 'user_id')
+
+
+def leave_export_queryset(filters):
+    return LeaveRequest.objects.filter(**filters).order_by('-start_date', '-id').values(
+        'user__username', 'leave_type', 'start_date', 'end_date', 'status', 'created_at'
+    )
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+class RowFormatter:
+    """
+    Turns value rows (dicts in column order) into CSV or NDJSON lines.
+    """
+
+    def __init__(self, export_format, columns):
+        self.columns = columns
+        self.ndjson = export_format == 'ndjson'
+        self.writer = csv.writer(_Echo())
+
+    def header(self):
+        return [] if self.ndjson else [self.writer.writerow(self.columns)]
+
+    def line(self, row):
+        values = [_format_value(value) for value in row.values()]
+        if self.ndjson:
+            return json.dumps(dict(zip(self.columns, values))) + '\n'
+        return self.writer.writerow(values)
+
+
+def stream_rows(queryset, formatter):
+    """
+    Yields export lines, fetching rows in chunks so memory use stays constant (WSGI).
+    """
+    yield from formatter.header()
+    for row in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield formatter.line(row)
+
+
+async def astream_rows(queryset, formatter):
+    """
+    Async counterpart of stream_rows, so ASGI servers can stream without buffering.
+    """
+    for line in formatter.header():
+        yield line
+    async for row in queryset.aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield formatter.line(row)
+
+
+# Attendance exports also cover archive_attendance's packed months, after the hot rows. Days logged
+# again after they were archived come from the hot table only: hot rows dated within the archive's
+# months are remembered while streaming, which in practice is only those re-logged days.
+def _archive_end(month):
+    return None if month is None else date(month.year, month.month, calendar.monthrange(month.year, month.month)[1])
+
+
+def _archived_rows(month, relogged):
+    for day, work_type in reversed(list(month.records())):
+        if (month.user.username, day) not in relogged:
+            yield {'user__username': month.user.username, 'date': day, 'type': work_type}
+
+
+def stream_attendance_rows(filters, formatter):
+    """
+    stream_rows for attendance_export_queryset(filters), followed by the archived days.
+    """
+    archived = attendance_archive_queryset(filters)
+    archive_end = _archive_end(archived.first())
+    relogged = set()
+    yield from formatter.header()
+    for row in attendance_export_queryset(filters).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        if archive_end and row['date'] <= archive_end:
+            relogged.add((row['user__username'], row['date']))
+        yield formatter.line(row)
+    if archive_end:
+        for month in archived.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            for row in _archived_rows(month, relogged):
+                yield formatter.line(row)
+
+
+async def astream_attendance_rows(filters, formatter):
+    """
+    Async counterpart of stream_attendance_rows.
+    """
+    archived = attendance_archive_queryset(filters)
+    archive_end = _archive_end(await archived.afirst())
+    relogged = set()
+    for line in formatter.header():
+        yield line
+    async for row in attendance_export_queryset(filters).aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+        if archive_end and row['date'] <= archive_end:
+            relogged.add((row['user__username'], row['date']))
+        yield formatter.line(row)
+    if archive_end:
+        async for month in archived.aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+            for row in _archived_rows(month, relogged):
+                yield formatter.line(row)
@@ -1,9 +1,14 @@
+from datetime import timedelta
+
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
 from django.utils.timezone import now
-from .models import AttendanceRecord, LeaveRequest, UserProfile
+from .balances import STATUS_BUCKETS, days_by_year
+from .models import AttendanceRecord, LeaveBalance, LeaveRequest, UserProfile
+from .working_calendar import get_calendar
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 
@@ -108,6 +113,16 @@ class LeaveRequestForm(forms.ModelForm):
             'end_date': forms.DateInput(attrs={'type': 'date'}),
         }
 
+    def __init__(self, *args, user=None, **kwargs):
+        """
+        `user` is the requester. When given, the request is checked against their leave balance,
+        their other requests and their team's coverage.
+        """
+        super().__init__(*args, **kwargs)
+        self.user = user
+        if user is not None and self.instance.user_id is None:
+            self.instance.user = user
+
     def clean(self):
         """
         Custom validation for leave request dates.
@@ -121,11 +136,58 @@ class LeaveRequestForm(forms.ModelForm):
             self.add_error('start_date', _("Start date cannot be in the past unless you're a manager."))
 
         # Validate end date is not before start date
-        if end_date and end_date < start_date:
+        if start_date and end_date and end_date < start_date:
             self.add_error('end_date', _("End date cannot be before the start date."))
+        elif start_date and end_date and self.user is not None:
+            self.check_entitlement(cleaned_data.get('leave_type'), start_date, end_date)
+            self.check_team_coverage(start_date, end_date)
 
         return cleaned_data
 
+    def check_entitlement(self, leave_type, start_date, end_date):
+        """
+        Rejects requests for more working days than remain in the user's balance, one row read per year.
+
+        When an existing request is edited, the days it already holds in the balance are credited back,
+        so it is not counted against itself.
+        """
+        if leave_type not in settings.LEAVE_ENTITLEMENTS:
+            return
+        held = {}
+        instance = self.instance  # clean() runs before the form's values are copied onto it
+        if instance.pk is not None and instance.leave_type == leave_type and instance.status in STATUS_BUCKETS:
+            held = days_by_year(instance)
+        for year, days in get_calendar().count_by_year(start_date, end_date).items():
+            remaining = LeaveBalance.objects.for_user(self.user, leave_type, year).remaining + held.get(year, 0)
+            if days > remaining:
+                self.add_error(None, _("This request needs %(days)d days but only %(remaining)d remain for %(year)d.") % {
+                    'days': days, 'remaining': max(remaining, 0), 'year': year,
+                })
+
+    def check_team_coverage(self, start_date, end_date):
+        """
+        Rejects requests that would leave too few of the user's team working on any working day.
+
+        The team is everyone reporting to the user's manager. At most TEAM_MAX_ABSENT_SHARE of it
+        may be off at once, and always at least one person. Two queries whatever the team size.
+        """
+        profile = getattr(self.user, 'profile', None)
+        if settings.TEAM_MAX_ABSENT_SHARE is None or profile is None or profile.manager_id is None:
+            return
+        team = UserProfile.objects.filter(manager_id=profile.manager_id).exclude(user=self.user)
+        allowed = max(1, int(settings.TEAM_MAX_ABSENT_SHARE * (team.count() + 1)))
+        absent = LeaveRequest.objects.absent_per_day(start_date, end_date, team.values('user_id'))
+        calendar = get_calendar()
+        short_days = [
+            start_date + timedelta(days=offset)
+            for offset, count in enumerate(absent)
+            if count + 1 > allowed and calendar.is_working_day(start_date + timedelta(days=offset))
+        ]
+        if short_days:
+            self.add_error(None, _("Too many of your team are already off on %(days)s.") % {
+                'days': ', '.join(day.isoformat() for day in short_days[:5]) + ('...' if len(short_days) > 5 else ''),
+            })
+
 
 # Form for attendance records
 class AttendanceRecordForm(forms.ModelForm):
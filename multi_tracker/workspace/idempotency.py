@@ -0,0 +1,67 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+_IN_PROGRESS = 'in-progress'
+_DONE = 'done'
+
+
+def _key(scope, user_id, idempotency_key):
+    return f'idempotency:{scope}:{user_id}:{idempotency_key}'
+
+
+def idempotent(scope):
+    """
+    View decorator replaying the stored response when a client retries with the same Idempotency-Key.
+
+    The first request claims the key with cache.add, so a retry racing the original gets a 409
+    instead of doing the work twice. The claim lasts IDEMPOTENCY_LOCK_TIMEOUT seconds, so a worker
+    killed mid-request does not block the key for long. Responses are kept for IDEMPOTENCY_KEY_TIMEOUT
+    seconds with a hash of the request body, and a key reused with a different body gets a 422.
+    Server errors release the key so the client can try again. Requests without the header
+    are passed through unchanged.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            idempotency_key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()[:255]
+            if not idempotency_key:
+                return view_func(request, *args, **kwargs)
+
+            key = _key(scope, request.user.pk, idempotency_key)
+            body_hash = hashlib.sha256(request.body).hexdigest()
+            if not cache.add(key, (_IN_PROGRESS, body_hash), settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                stored = cache.get(key)
+                if stored is None:
+                    return JsonResponse({"error": "A request with this Idempotency-Key is in progress."}, status=409)
+                if stored[1] != body_hash:
+                    return JsonResponse(
+                        {"error": "This Idempotency-Key was already used with a different request body."}, status=422
+                    )
+                if stored[0] == _IN_PROGRESS:
+                    return JsonResponse({"error": "A request with this Idempotency-Key is in progress."}, status=409)
+                _, _, status, content_type, content = stored
+                response = HttpResponse(content, status=status, content_type=content_type)
+                response['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                cache.delete(key)
+                raise
+            if response.status_code >= 500:
+                cache.delete(key)
+            else:
+                cache.set(
+                    key, (_DONE, body_hash, response.status_code, response['Content-Type'], response.content),
+                    settings.IDEMPOTENCY_KEY_TIMEOUT,
+                )
+            return response
+        return _wrapped_view
+    return decorator
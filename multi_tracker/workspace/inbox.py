@@ -0,0 +1,107 @@
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import LeaveRequest, UserProfile
+from .pagination import keyset_page, keyset_queryset
+from .signals import leave_status_changed
+
+
+# Statuses that put a request in its manager's inbox
+AWAITING_STATUSES = frozenset(LeaveRequest.DECISIONS['approve'])
+
+
+def badge_cache_key(profile_id):
+    return f'inbox:badge:{profile_id}'
+
+
+def pending_approval_count(profile_id):
+    """
+    Returns a manager's inbox size from the cache, falling back to the denormalized counter.
+    """
+    key = badge_cache_key(profile_id)
+    count = cache.get(key)
+    if count is None:
+        count = UserProfile.objects.filter(pk=profile_id).values_list('pending_approvals', flat=True).first() or 0
+        cache.set(key, count, settings.INBOX_BADGE_CACHE_TIMEOUT)
+    return count
+
+
+def invalidate_badges(profile_ids):
+    """
+    Drops cached badge counts now and again once the surrounding transaction commits,
+    so a render racing the commit cannot keep the old count cached.
+    """
+    keys = [badge_cache_key(profile_id) for profile_id in profile_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def adjust_pending_approvals(deltas):
+    """
+    Applies {manager profile id: change} to the counters with one UPDATE ... CASE.
+    """
+    deltas = {profile_id: delta for profile_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    UserProfile.objects.filter(pk__in=deltas).update(pending_approvals=Greatest(
+        Case(*[When(pk=profile_id, then=F('pending_approvals') + delta) for profile_id, delta in deltas.items()]),
+        0,
+    ))
+    invalidate_badges(deltas)
+
+
+@receiver(leave_status_changed)
+def update_pending_approvals(sender, changes, **kwargs):
+    """
+    Counts requests into and out of their manager's inbox as their status changes.
+    Requests saved without a known previous status have their manager recounted instead.
+    """
+    deltas = Counter()
+    recount = set()
+    for leave, previous_status in changes:
+        if leave.manager_id is None:
+            continue
+        if previous_status == '':
+            recount.add(leave.manager_id)
+            continue
+        deltas[leave.manager_id] += (leave.status in AWAITING_STATUSES) - (previous_status in AWAITING_STATUSES)
+    adjust_pending_approvals(deltas)
+    if recount:
+        UserProfile.objects.filter(pk__in=recount).recount_pending_approvals()
+        invalidate_badges(recount)
+
+
+@receiver(post_delete, sender=LeaveRequest)
+def release_pending_approval(sender, instance, **kwargs):
+    if instance.manager_id is not None and instance.status in AWAITING_STATUSES:
+        adjust_pending_approvals({instance.manager_id: -1})
+
+
+def _parse_created_at(value):
+    # A '+' in an unencoded query string arrives as a space
+    return datetime.fromisoformat(value.replace(' ', '+'))
+
+
+def inbox_page(profile, cursor=None, page_size=None):
+    """
+    Returns (requests, next cursor) awaiting `profile`'s decision, oldest first.
+
+    Pages walk the (manager, status, created_at, id) index from `cursor` onwards.
+    """
+    page_size = page_size or settings.INBOX_PAGE_SIZE
+    queryset = keyset_queryset(
+        LeaveRequest.objects.awaiting_decision().filter(manager=profile).select_related('user').only(
+            'leave_type', 'start_date', 'end_date', 'status', 'created_at',
+            'user__username', 'user__first_name', 'user__last_name',
+        ),
+        'created_at', cursor, page_size=page_size, descending=False, parse=_parse_created_at,
+    )
+    return keyset_page(list(queryset), 'created_at', page_size=page_size)
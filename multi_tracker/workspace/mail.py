@@ -0,0 +1,137 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from .models import OutboundEmail
+
+
+def queue_email(subject, body, to, html=False, from_email=None):
+    """
+    Queues an email for background delivery and returns the OutboundEmail row.
+    """
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        content_subtype='html' if html else 'plain',
+        from_email=from_email or settings.EMAIL_HOST_USER,
+        to=list(to),
+    )
+
+
+def queue_emails(messages):
+    """
+    Queues several emails with a single insert. `messages` yields dicts of queue_email arguments.
+    """
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(
+            subject=message['subject'],
+            body=message['body'],
+            content_subtype='html' if message.get('html') else 'plain',
+            from_email=message.get('from_email') or settings.EMAIL_HOST_USER,
+            to=list(message['to']),
+        )
+        for message in messages
+    ])
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff: EMAIL_QUEUE_RETRY_DELAY seconds, doubled after every failed attempt.
+    """
+    return timedelta(seconds=settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def _record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+        email.status = OutboundEmail.FAILED
+    else:
+        email.next_attempt_at = now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def claim_due_emails(batch_size, after_id=0):
+    """
+    Claims up to `batch_size` due emails for this run and returns them, oldest first.
+
+    Claimed rows have next_attempt_at pushed EMAIL_QUEUE_CLAIM_TIMEOUT ahead, so concurrent runs
+    skip them and the emails of a run that died come due again afterwards. Rows are locked with
+    SKIP LOCKED where the database supports it, and the exact lease time tells this claim apart
+    from any other.
+    """
+    claimed_until = now() + timedelta(seconds=settings.EMAIL_QUEUE_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        due = OutboundEmail.objects.filter(status=OutboundEmail.QUEUED, next_attempt_at__lte=now(), id__gt=after_id)
+        ids = list(due.select_for_update(skip_locked=True).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return []
+        due.filter(id__in=ids).update(next_attempt_at=claimed_until)
+    return list(OutboundEmail.objects.filter(
+        id__in=ids, status=OutboundEmail.QUEUED, next_attempt_at=claimed_until
+    ).order_by('id'))
+
+
+def deliver_queued_emails(batch_size=None, connection=None):
+    """
+    Sends every due email in batches over a single backend connection.
+
+    Returns (sent, failed). Each batch is claimed first, so concurrent runs never send the same
+    email. Successful sends are marked with one UPDATE per batch; failures are rescheduled with
+    backoff, or marked Failed after EMAIL_QUEUE_MAX_ATTEMPTS. The connection is reopened after
+    a failure, so a dropped SMTP session does not fail the rest of the run. If it cannot be
+    reopened, the unsent part of the batch is released and the error raised.
+    """
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    connection = connection or get_connection()
+    sent = failed = 0
+    last_id = 0
+
+    try:
+        connection.open()
+        while True:
+            batch = claim_due_emails(batch_size, last_id)
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            delivered = []
+            unsent = {email.id for email in batch}
+            try:
+                for email in batch:
+                    message = EmailMessage(
+                        subject=email.subject,
+                        body=email.body,
+                        from_email=email.from_email,
+                        to=email.to,
+                        connection=connection,
+                    )
+                    message.content_subtype = email.content_subtype
+                    try:
+                        message.send()
+                    except Exception as exc:  # Any backend error is retried later
+                        unsent.discard(email.id)
+                        _record_failure(email, exc)
+                        failed += 1
+                        connection.close()
+                        connection.open()
+                    else:
+                        unsent.discard(email.id)
+                        delivered.append(email.id)
+            finally:
+                OutboundEmail.objects.filter(id__in=delivered).update(
+                    status=OutboundEmail.SENT, sent_at=now(), attempts=F('attempts') + 1, last_error=''
+                )
+                sent += len(delivered)
+                if unsent:
+                    # Left over by a connection that could not be reopened; due again straight away
+                    OutboundEmail.objects.filter(
+                        id__in=unsent, next_attempt_at=batch[0].next_attempt_at
+                    ).update(next_attempt_at=now())
+    finally:
+        connection.close()
+    return sent, failed
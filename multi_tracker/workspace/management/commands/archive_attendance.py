@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from workspace.attendance_archive import archive_attendance, archive_cutoff
+
+
+class Command(BaseCommand):
+    help = "Moves attendance older than the retention window into the packed monthly archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int, default=None,
+            help="Keep this many days in the hot table. Defaults to ATTENDANCE_RETENTION_DAYS.",
+        )
+        parser.add_argument('--before', default=None, help="Archive records before this date (YYYY-MM-DD) instead.")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Users archived per transaction.")
+        parser.add_argument(
+            '--export', action='store_true',
+            help="Also append the archived rows to gzipped NDJSON files per year in ATTENDANCE_ARCHIVE_EXPORT_DIR.",
+        )
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                cutoff = date.fromisoformat(options['before'])
+            except ValueError as exc:
+                raise CommandError(f'Invalid date: {exc}')
+        else:
+            cutoff = archive_cutoff(options['retention_days'])
+
+        export_dir = settings.ATTENDANCE_ARCHIVE_EXPORT_DIR if options['export'] else None
+        moved = archive_attendance(
+            cutoff,
+            chunk_size=options['chunk_size'],
+            export_dir=export_dir,
+            progress=lambda total: self.stdout.write(f'Archived {total} records...'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} attendance records dated before {cutoff}.'))
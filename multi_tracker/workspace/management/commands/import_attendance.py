@@ -0,0 +1,47 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from workspace.attendance_import import DEFAULT_BATCH_SIZE, PARSERS, import_attendance, iter_text_chunks
+
+
+class Command(BaseCommand):
+    help = "Streams attendance rows from a CSV, NDJSON or JSON file and upserts them in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' to read from stdin.")
+        parser.add_argument(
+            '--format', choices=sorted(PARSERS), help="Input format. Defaults to the file extension."
+        )
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if input_format not in PARSERS:
+            raise CommandError(f'Cannot detect the input format of "{path}", pass --format.')
+
+        def report(result):
+            self.stdout.write(
+                f'{result.processed} rows processed, {result.failed} rejected '
+                f'({result.rows_per_second:.0f} rows/s)'
+            )
+
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            result = import_attendance(
+                PARSERS[input_format](iter_text_chunks(stream)), batch_size=options['batch_size'], progress=report
+            )
+        except ValueError as exc:
+            raise CommandError(f'Could not parse "{path}": {exc}')
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        for error in result.errors:
+            self.stdout.write(self.style.WARNING(f"Row {error['row']}: {error['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.imported} of {result.processed} rows in {result.elapsed:.1f}s '
+            f'({result.rows_per_second:.0f} rows/s).'
+        ))
@@ -0,0 +1,40 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from workspace.profiling import summarize
+
+
+class Command(BaseCommand):
+    help = "Summarizes profiled requests per view: latency percentiles, query counts and N+1 suspects."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None, help="Sample file to read. Defaults to PROFILING_SINK.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        path = options['file'] or settings.PROFILING_SINK
+        if not path:
+            raise CommandError('No sample file given. Set PROFILING_SINK or pass --file.')
+        try:
+            with open(path, encoding='utf-8') as sink:
+                report = summarize(json.loads(line) for line in sink if line.strip())
+        except OSError as exc:
+            raise CommandError(f'Could not read "{path}": {exc}')
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        header = f"{'view':40} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'db ms':>8} {'tpl ms':>8} {'queries':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in report:
+            self.stdout.write(
+                f"{row['view'][:40]:40} {row['requests']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+                f"{row['p99_ms']:>9.1f} {row['avg_db_ms']:>8.1f} {row['avg_template_ms']:>8.1f} "
+                f"{row['max_queries']:>8}"
+            )
+            for sql, count in row['repeated']:
+                self.stdout.write(self.style.WARNING(f"    possible N+1: {count}x {sql[:150]}"))
@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from workspace.models import AttendanceMonthlySummary
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the monthly attendance summaries from raw attendance records, in chunks of users."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Users rebuilt per transaction.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        user_ids = User.objects.order_by('id').values_list('id', flat=True)
+        total = 0
+
+        last_id = 0
+        while True:
+            chunk = list(user_ids.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            AttendanceMonthlySummary.objects.rebuild(chunk)
+            total += len(chunk)
+            last_id = chunk[-1]
+            self.stdout.write(f'Rebuilt summaries for {total} users...')
+
+        self.stdout.write(self.style.SUCCESS(f'Attendance summaries rebuilt for {total} users.'))
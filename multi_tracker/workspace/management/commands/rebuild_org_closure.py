@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from workspace.models import UserProfileClosure
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the reporting hierarchy closure table from UserProfile.manager."
+
+    def handle(self, *args, **kwargs):
+        rows = UserProfileClosure.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Org closure table rebuilt with {rows} rows.'))
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from workspace.balances import reconcile_balances
+
+
+class Command(BaseCommand):
+    help = "Recomputes leave balances from leave requests, in chunks of users, and reports any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Users reconciled per pass.")
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        fix = not options['dry_run']
+        user_ids = User.objects.order_by('id').values_list('id', flat=True)
+        total = 0
+        drifted = 0
+
+        last_id = 0
+        while True:
+            chunk = list(user_ids.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            for row in reconcile_balances(chunk, fix=fix):
+                drifted += 1
+                self.stdout.write(
+                    f"User {row['user_id']} {row['leave_type']} {row['year']}: "
+                    f"stored pending/taken {row['stored'][0]}/{row['stored'][1]}, "
+                    f"expected {row['expected'][0]}/{row['expected'][1]}"
+                )
+            total += len(chunk)
+            last_id = chunk[-1]
+
+        action = 'reported' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'Leave balances reconciled for {total} users: {drifted} drifted rows {action}.'
+        ))
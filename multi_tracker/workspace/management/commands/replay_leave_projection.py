@@ -0,0 +1,27 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from workspace.projection import replay_projection
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the attendance projected from approved leave for a date window."
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', help="First day of the window (YYYY-MM-DD).")
+        parser.add_argument('end', help="Last day of the window (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        try:
+            start_date = date.fromisoformat(options['start'])
+            end_date = date.fromisoformat(options['end'])
+        except ValueError as exc:
+            raise CommandError(f'Invalid date: {exc}')
+        if end_date < start_date:
+            raise CommandError('The end date cannot be before the start date.')
+
+        retracted, projected = replay_projection(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {retracted} projected days and wrote {projected} from approved leave.'
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from workspace.synthetic import seed_org
+
+
+class Command(BaseCommand):
+    help = "Bulk-generates a synthetic organisation with attendance and leave history for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--years', type=int, default=3, help="Years of history, ending today.")
+        parser.add_argument('--span-of-control', type=int, default=8, help="Direct reports per manager.")
+        parser.add_argument('--prefix', default='synthetic-', help="Username prefix for generated users.")
+        parser.add_argument('--password', default=None, help="Password for every user. Unusable if omitted.")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed for repeatable data.")
+        parser.add_argument('--chunk-size', type=int, default=200, help="Users generated per transaction.")
+
+    def handle(self, *args, **options):
+        def report(result):
+            self.stdout.write(
+                f'{result.attendance_records} attendance rows, {result.leave_requests} leave requests '
+                f'({result.rows / result.elapsed:.0f} rows/s)'
+            )
+
+        result = seed_org(
+            users=options['users'],
+            years=options['years'],
+            prefix=options['prefix'],
+            span_of_control=options['span_of_control'],
+            password=options['password'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            progress=report,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {result.users} users, {result.leave_requests} leave requests and '
+            f'{result.attendance_records} attendance records in {result.elapsed:.1f}s '
+            f'({result.rows / result.elapsed:.0f} rows/s).'
+        ))
@@ -0,0 +1,28 @@
+import smtplib
+import time
+
+from django.core.management.base import BaseCommand
+
+from workspace.mail import deliver_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Delivers queued outbound emails in batches over one reused connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help="Keep polling the queue instead of exiting.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                sent, failed = deliver_queued_emails(batch_size=options['batch_size'])
+            except (smtplib.SMTPException, OSError) as exc:  # Mail server unreachable; the queue is left untouched
+                self.stderr.write(self.style.ERROR(f'Could not connect to the mail server: {exc}'))
+            else:
+                if sent or failed or not options['loop']:
+                    self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails, {failed} failed.'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
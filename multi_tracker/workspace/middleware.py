@@ -1,59 +1,163 @@
+from contextlib import ExitStack
 from datetime import datetime
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.decorators import sync_and_async_middleware
 from django.utils.timezone import now
 from django.conf import settings
-from django.contrib.auth import logout
+from django.contrib.auth import alogout, logout
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .events import publish_session_extended
+from .profiling import RequestProfile, _current_profile, get_profile_store, install_template_timer
 
 
+@sync_and_async_middleware
 class SessionTimeoutMiddleware:
     """
-    Middleware to enforce session timeouts for authenticated users.
+    Middleware to enforce session timeouts for authenticated users and track their activity.
+
+    The 'last_activity' timestamp is only rewritten once it is older than
+    SESSION_ACTIVITY_GRANULARITY seconds, so most requests leave the session unmodified
+    and the session backend skips its write. Event streams (SESSION_ACTIVITY_EXEMPT_PATHS)
+    never count as activity, so an open tab does not keep its session alive.
+
+    Runs natively in both modes, so under ASGI async views stay on the event loop instead
+    of being handed to a worker thread.
     """
 
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         # Check if the user is authenticated
         if request.user.is_authenticated:
-            # Get the last activity timestamp from the session
-            last_activity = request.session.get('last_activity')
-            
-            # Timeout period in seconds (default to 15 minutes = 900 seconds)
-            timeout = getattr(settings, 'SESSION_TIMEOUT', 900)
-
-            if last_activity:
-                try:
-                    # Convert ISO string back to datetime object
-                    last_activity = datetime.fromisoformat(last_activity)
-                except ValueError:
-                    # If deserialization fails, log out the user
-                    logout(request)
-                    request.session.flush()
-                    return self.get_response(request)
-
-                # Check if the session has timed out
-                if (now() - last_activity).total_seconds() > timeout:
-                    logout(request)  # Log out the user
-                    request.session.flush()  # Clear the session
-                    return self.get_response(request)
-
-            # Update the last activity timestamp in the session
-            request.session['last_activity'] = now().isoformat()
-
+            # Share the user loaded here with request.auser(), so async views don't fetch it again
+            request._acached_user = request._cached_user
+            if not self.track_activity(request, request.user, request.session.get('last_activity')):
+                logout(request)  # Log out the user
+                request.session.flush()  # Clear the session
+                request._acached_user = request.user  # Now anonymous, for async views too
         return self.get_response(request)
 
+    async def __acall__(self, request):
+        user = await request.auser()
+        if user.is_authenticated:
+            # And the other way round, for sync views adapted to run under ASGI
+            request._cached_user = user
+            if not self.track_activity(request, user, await request.session.aget('last_activity')):
+                await alogout(request)
+                await request.session.aflush()
+                request._acached_user = request.user
+        return await self.get_response(request)
+
+    def track_activity(self, request, user, last_activity):
+        """
+        Returns False when the session has timed out or its timestamp cannot be read, otherwise
+        refreshes 'last_activity' if it is due. The session is already loaded by the caller.
+        """
+        current_time = now()
+
+        # Timeout period in seconds (default to 15 minutes = 900 seconds)
+        timeout = getattr(settings, 'SESSION_TIMEOUT', 900)
+        granularity = getattr(settings, 'SESSION_ACTIVITY_GRANULARITY', 60)
 
-class UpdateLastActivityMiddleware:
+        if last_activity:
+            try:
+                # Convert ISO string back to datetime object
+                last_activity = datetime.fromisoformat(last_activity)
+            except ValueError:
+                # If deserialization fails, log out the user
+                return False
+
+            idle_seconds = (current_time - last_activity).total_seconds()
+
+            # Check if the session has timed out
+            if idle_seconds > timeout:
+                return False
+
+            # Recent enough, or a background request, leave the session untouched to avoid a write
+            if idle_seconds < granularity or request.path.startswith(settings.SESSION_ACTIVITY_EXEMPT_PATHS):
+                return True
+
+        # Update the last activity timestamp in the session, and push back warnings on open pages
+        request.session['last_activity'] = current_time.isoformat()
+        publish_session_extended(user.pk)
+        return True
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
     """
-    Middleware to update the 'last_activity' timestamp in the session for authenticated users.
+    WhiteNoiseMiddleware that can also run on the event loop. WhiteNoise itself is sync-only,
+    which would make Django adapt every request under it, async views included, onto a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class QueryProfilingMiddleware:
+    """
+    Opt-in middleware (PROFILING_ENABLED) recording SQL query count, DB time, template time
+    and wall time per request.
+
+    Adds a Server-Timing header and keeps samples per URL name in memory, where the profile_summary
+    view reads them, appending them to PROFILING_SINK when set so the profile_report command can
+    summarize them across workers. It is sync-only,
+    since query wrappers are installed per thread, so while enabled async views run on a thread.
     """
 
     def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed()
         self.get_response = get_response
+        self.store = get_profile_store()
+        install_template_timer()
 
     def __call__(self, request):
-        # Only update if the user is authenticated
-        if request.user.is_authenticated:
-            # Store the current timestamp as an ISO string
-            request.session['last_activity'] = now().isoformat()
-        return self.get_response(request)
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.record_query))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = (match.view_name if match else None) or request.path
+        sample = profile.sample(view_name, response.status_code)
+        self.store.add(sample)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={sample["db_ms"]};desc="{sample["queries"]} queries"',
+            f'tpl;dur={sample["template_ms"]}',
+            f'total;dur={sample["wall_ms"]}',
+        ])
+        return response
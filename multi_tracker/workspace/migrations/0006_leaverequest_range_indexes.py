@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0005_userprofile_is_email_verified'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['user', 'start_date', 'end_date'], name='leave_user_range_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['manager', 'status', 'start_date'], name='leave_manager_status_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0006_leaverequest_range_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('type', models.CharField(blank=True, choices=[('WFH', 'Work from Home'), ('IO', 'In Office'), ('AL', 'Annual Leave'), ('S', 'Sick'), ('FL', 'Flexi Leave'), ('NWD', 'Non Working Day'), ('BT', 'Business Travel'), ('T', 'Training')], max_length=3)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['year', 'month'], name='attendance_summary_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'year', 'month', 'type'), name='attendance_summary_bucket')],
+            },
+        ),
+    ]
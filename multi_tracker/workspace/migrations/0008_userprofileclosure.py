@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    """
+    Backfills closure rows for profiles that existed before the table did.
+    """
+    UserProfile = apps.get_model('workspace', 'UserProfile')
+    UserProfileClosure = apps.get_model('workspace', 'UserProfileClosure')
+    manager_of = dict(UserProfile.objects.values_list('id', 'manager_id'))
+    rows = []
+    for profile_id in manager_of:
+        ancestor_id, depth, seen = profile_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append(UserProfileClosure(ancestor_id=ancestor_id, descendant_id=profile_id, depth=depth))
+            ancestor_id, depth = manager_of.get(ancestor_id), depth + 1
+    UserProfileClosure.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0007_attendancemonthlysummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProfileClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='workspace.userprofile')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='workspace.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='profile_closure_desc_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='profile_closure_pair')],
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0009_outboundemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['user', 'date', 'id'], name='attendance_user_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['date', 'id'], name='attendance_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['user', 'start_date', 'id'], name='leave_user_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0010_history_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='leave_request',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='projected_attendance', to='workspace.leaverequest'),
+        ),
+    ]
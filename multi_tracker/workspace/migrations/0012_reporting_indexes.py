@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_attendance_date_brin(apps, schema_editor):
+    """
+    Adds a BRIN index on attendance dates (Postgres only). Rows arrive roughly in date order,
+    so the per-block-range summaries stay tiny and still prune most of the table for date range reports.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS attendance_date_brin ON workspace_attendancerecord USING brin (date)'
+        )
+
+
+def drop_attendance_date_brin(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS attendance_date_brin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0011_attendancerecord_leave_request'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(condition=models.Q(('status__in', ['Pending', 'Cancellation Pending'])), fields=['manager', 'start_date'], name='leave_awaiting_decision_idx'),
+        ),
+        migrations.RunPython(create_attendance_date_brin, drop_attendance_date_brin),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0013_archivedattendancemonth'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('leave_type', models.CharField(choices=[('SL', 'Sick Leave'), ('PL', 'Personal Leave'), ('AL', 'Annual Leave'), ('FL', 'Flexi Leave'), ('NWD', 'Non Working Day')], max_length=3)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('entitlement', models.PositiveSmallIntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('taken', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_balances', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'leave_type', 'year'), name='leave_balance_bucket')],
+            },
+        ),
+    ]
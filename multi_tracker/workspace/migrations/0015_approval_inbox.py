@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_pending_approvals(apps, schema_editor):
+    """
+    Backfills the inbox counters with one UPDATE, as UserProfile.objects.recount_pending_approvals does.
+    """
+    LeaveRequest = apps.get_model('workspace', 'LeaveRequest')
+    UserProfile = apps.get_model('workspace', 'UserProfile')
+    awaiting = LeaveRequest.objects.filter(
+        manager=OuterRef('pk'), status__in=['Pending', 'Cancellation Pending']
+    ).order_by().values('manager').annotate(count=Count('id')).values('count')
+    UserProfile.objects.update(pending_approvals=Coalesce(Subquery(awaiting), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0014_leavebalance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='pending_approvals',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['manager', 'status', 'created_at', 'id'], name='leave_manager_inbox_idx'),
+        ),
+        migrations.RunPython(count_pending_approvals, migrations.RunPython.noop),
+    ]
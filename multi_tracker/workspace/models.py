@@ -1,10 +1,83 @@
-from django.db import models
+import calendar
+from collections import Counter
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from django.db.models.signals import post_save
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.utils.timezone import now
 
+from .signals import attendance_bulk_changed, leave_status_changed
+from .dashboard_cache import invalidate_dashboard
+from .auth_backends import invalidate_cached_profile
+from .working_calendar import count_working_days
+
+
+# Org hierarchy queries backed by UserProfileClosure
+class UserProfileQuerySet(models.QuerySet):
+    """
+    Transitive reporting-line lookups that resolve in a single indexed query.
+    """
+
+    def descendants_of(self, profile, include_self=False, max_depth=None):
+        """
+        Returns everyone reporting to `profile`, directly or through other managers.
+        """
+        links = {'ancestor_links__ancestor': profile}
+        if not include_self:
+            links['ancestor_links__depth__gte'] = 1
+        if max_depth is not None:
+            links['ancestor_links__depth__lte'] = max_depth
+        return self.filter(**links)
+
+    def ancestors_of(self, profile, include_self=False):
+        """
+        Returns the management chain above `profile`, nearest manager first.
+        """
+        links = {'descendant_links__descendant': profile}
+        if not include_self:
+            links['descendant_links__depth__gte'] = 1
+        return self.filter(**links).order_by('descendant_links__depth')
+
+    def recount_pending_approvals(self):
+        """
+        Recomputes pending_approvals for the profiles in this queryset with one UPDATE.
+        """
+        awaiting = LeaveRequest.objects.awaiting_decision().filter(manager=OuterRef('pk')).order_by().values(
+            'manager'
+        ).annotate(count=Count('id')).values('count')
+        return self.update(pending_approvals=Coalesce(Subquery(awaiting), 0))
+
+    def bulk_create_with_users(self, users, batch_size=1000, **profile_fields):
+        """
+        Inserts unsaved users together with their profiles and closure rows, a few statements per batch.
+
+        bulk_create does not send post_save, so this stands in for create_or_update_user_profile
+        and update_profile_closure on HR syncs and other mass imports. Returns the new profiles.
+        """
+        with transaction.atomic():
+            users = User.objects.bulk_create(users, batch_size=batch_size)
+            profiles = self.bulk_create(
+                [UserProfile(user=user, **profile_fields) for user in users], batch_size=batch_size
+            )
+            # Same rows as UserProfileClosure.attach: self at depth 0, then the manager's chain
+            chains = {}
+            for descendant_id, ancestor_id, depth in UserProfileClosure.objects.filter(
+                descendant_id__in={profile.manager_id for profile in profiles if profile.manager_id}
+            ).values_list('descendant_id', 'ancestor_id', 'depth'):
+                chains.setdefault(descendant_id, []).append((ancestor_id, depth + 1))
+            UserProfileClosure.objects.bulk_create([
+                UserProfileClosure(ancestor_id=ancestor_id, descendant_id=profile.pk, depth=depth)
+                for profile in profiles
+                for ancestor_id, depth in [(profile.pk, 0)] + chains.get(profile.manager_id, [])
+            ], batch_size=5000)
+        return profiles
+
 
 # UserProfile model without tenancy
 class UserProfile(models.Model):
@@ -18,6 +91,57 @@ class UserProfile(models.Model):
     manager = models.ForeignKey(
         'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='managed_employees'
     )  # Reporting hierarchy
+    pending_approvals = models.PositiveIntegerField(
+        default=0, editable=False
+    )  # Requests awaiting this manager's decision, kept in step by workspace.inbox
+
+    objects = UserProfileQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the stored manager so the closure table is only rewritten when it changes.
+        """
+        instance = super().from_db(db, field_names, values)
+        if 'manager_id' in instance.__dict__:
+            instance._stored_manager_id = instance.manager_id  # type: ignore
+        return instance
+
+    @property
+    def manager_changed(self):
+        return not hasattr(self, '_stored_manager_id') or self._stored_manager_id != self.manager_id
+
+    def clean(self):
+        """
+        Prevents reporting loops, such as a manager reporting to one of their own reports.
+        """
+        if self.pk and self.manager_id and (
+            self.manager_id == self.pk
+            or UserProfileClosure.objects.filter(ancestor_id=self.pk, descendant_id=self.manager_id).exists()
+        ):
+            raise ValidationError('A user cannot report to themselves or to one of their reports.')
+
+    def save(self, *args, **kwargs):
+        """
+        Leaves pending_approvals out of updates, so saving a stale copy never rewinds the counter.
+
+        A new manager is checked for reporting loops before anything is written, and the row is
+        saved in the same transaction as the closure relink done by update_profile_closure.
+        """
+        if self._state.adding or kwargs.get('force_insert'):
+            super().save(*args, **kwargs)
+            return
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'pending_approvals'
+            ]
+        if not self.manager_changed:
+            super().save(*args, **kwargs)
+            return
+        self.clean()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         """
@@ -27,18 +151,205 @@ class UserProfile(models.Model):
         return f"{self.user.username} - {role}"
 
 
+# Closure table of the reporting hierarchy
+class UserProfileClosureQuerySet(models.QuerySet):
+    """
+    Maintenance operations for the (ancestor, descendant, depth) closure rows.
+    """
+
+    def attach(self, profile):
+        """
+        Adds rows for a new profile: itself at depth 0 plus every ancestor of its manager.
+        """
+        rows = [UserProfileClosure(ancestor_id=profile.pk, descendant_id=profile.pk, depth=0)]
+        if profile.manager_id:
+            rows += [
+                UserProfileClosure(ancestor_id=ancestor_id, descendant_id=profile.pk, depth=depth + 1)
+                for ancestor_id, depth in self.filter(descendant_id=profile.manager_id).values_list(
+                    'ancestor_id', 'depth'
+                )
+            ]
+        self.bulk_create(rows, ignore_conflicts=True)
+
+    def move(self, profile):
+        """
+        Re-links the subtree rooted at `profile` under its current manager.
+        """
+        subtree = list(self.filter(ancestor_id=profile.pk).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+        if profile.manager_id in subtree_ids:
+            raise ValidationError('A user cannot report to themselves or to one of their reports.')
+
+        with transaction.atomic():
+            # Drop the links between the subtree and its old ancestors
+            self.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+            if profile.manager_id:
+                new_ancestors = self.filter(descendant_id=profile.manager_id).values_list('ancestor_id', 'depth')
+                self.bulk_create([
+                    UserProfileClosure(
+                        ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1
+                    )
+                    for ancestor_id, ancestor_depth in new_ancestors
+                    for descendant_id, depth in subtree
+                ])
+
+    def detach_descendants(self, profile):
+        """
+        Removes the links between everyone below `profile` and `profile`'s own chain (itself included).
+        """
+        self.filter(
+            descendant_id__in=self.filter(ancestor_id=profile.pk, depth__gte=1).values('descendant_id'),
+            ancestor_id__in=list(self.filter(descendant_id=profile.pk).values_list('ancestor_id', flat=True)),
+        ).delete()
+
+    def rebuild(self):
+        """
+        Recomputes the whole table from UserProfile.manager.
+        """
+        manager_of = dict(UserProfile.objects.values_list('id', 'manager_id'))
+        rows = []
+        for profile_id in manager_of:
+            ancestor_id, depth, seen = profile_id, 0, set()
+            while ancestor_id is not None and ancestor_id not in seen:
+                seen.add(ancestor_id)
+                rows.append(UserProfileClosure(ancestor_id=ancestor_id, descendant_id=profile_id, depth=depth))
+                ancestor_id, depth = manager_of.get(ancestor_id), depth + 1
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(rows, batch_size=5000)
+        return len(rows)
+
+
+class UserProfileClosure(models.Model):
+    """
+    One row per (ancestor, descendant) pair in the reporting hierarchy, including self at depth 0.
+    """
+    ancestor = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveSmallIntegerField()
+
+    objects = UserProfileClosureQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='profile_closure_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='profile_closure_desc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
 # Signal to auto-create or update UserProfile whenever a User is saved
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_or_update_user_profile(sender, instance, created, update_fields=None, **kwargs):
     """
-    Ensures a UserProfile is created or updated whenever a User object is saved.
+    Ensures a UserProfile is created with every new User, and saves the profile along with
+    its user when the caller loaded it.
+
+    Saves naming their fields (last_login on every login, is_active on email verification)
+    cannot have touched the profile and are skipped, as is a profile that was never loaded:
+    fetching it only to write it back unchanged cost a SELECT and an UPDATE per save.
     """
     if created:
         UserProfile.objects.create(user=instance)
-    else:
+    elif update_fields is None and User.profile.is_cached(instance):
         instance.profile.save()
 
 
+# Signal to keep the reporting hierarchy closure table in step with UserProfile.manager
+@receiver(post_save, sender=UserProfile)
+def update_profile_closure(sender, instance, created, **kwargs):
+    """
+    Adds closure rows for new profiles and re-links the subtree when the manager changes.
+    """
+    if created:
+        UserProfileClosure.objects.attach(instance)
+    elif instance.manager_changed:
+        UserProfileClosure.objects.move(instance)
+    instance._stored_manager_id = instance.manager_id
+
+
+@receiver(pre_delete, sender=UserProfile)
+def detach_profile_closure(sender, instance, **kwargs):
+    """
+    Cuts the deleted profile's reports loose from its management chain, mirroring SET_NULL.
+    """
+    UserProfileClosure.objects.detach_descendants(instance)
+
+
+# Bulk writes for attendance records
+class AttendanceRecordQuerySet(models.QuerySet):
+    """
+    Set-based writes that keep derived data in step through attendance_bulk_changed.
+    """
+
+    def bulk_upsert(self, records, update_fields=('type',), batch_size=1000):
+        """
+        Inserts or updates records on the (user, date) unique constraint.
+        """
+        if not records:
+            return
+        self.bulk_create(
+            records,
+            update_conflicts=True,
+            unique_fields=['user', 'date'],
+            update_fields=list(update_fields),
+            batch_size=batch_size,
+        )
+        _send_attendance_bulk_changed((record.user_id, record.date) for record in records)
+
+    def bulk_insert_missing(self, records, batch_size=1000):
+        """
+        Inserts the records whose (user, date) has no row yet, leaving existing rows untouched,
+        and returns the records inserted.
+        """
+        if not records:
+            return []
+        existing = set(self.filter(
+            user_id__in={record.user_id for record in records},
+            date__range=(min(record.date for record in records), max(record.date for record in records)),
+        ).values_list('user_id', 'date'))
+        missing = {}
+        for record in records:
+            missing.setdefault((record.user_id, record.date), record)
+        missing = [record for key, record in missing.items() if key not in existing]
+        # Conflicts are still ignored, for a row written concurrently since the lookup
+        self.bulk_create(missing, ignore_conflicts=True, batch_size=batch_size)
+        _send_attendance_bulk_changed((record.user_id, record.date) for record in missing)
+        return missing
+
+    def bulk_delete(self):
+        """
+        Deletes the matching rows with one DELETE statement and no per-row signals.
+        """
+        touched = list(self.values_list('user_id', 'date').order_by())
+        # _raw_delete skips collecting rows for post_delete; derived data is refreshed below instead
+        deleted = self._raw_delete(self.db)
+        _send_attendance_bulk_changed(touched)
+        return deleted
+
+
+def _send_attendance_bulk_changed(user_dates):
+    """
+    Sends attendance_bulk_changed for the range of dates touched per user, grouping users
+    that share a range (such as a nightly feed for one day) into a single signal.
+    """
+    ranges = {}
+    for user_id, day in user_dates:
+        first, last = ranges.get(user_id, (day, day))
+        ranges[user_id] = (min(first, day), max(last, day))
+    users_by_range = {}
+    for user_id, date_range in ranges.items():
+        users_by_range.setdefault(date_range, []).append(user_id)
+    for (start_date, end_date), user_ids in users_by_range.items():
+        attendance_bulk_changed.send(
+            sender=AttendanceRecord, user_ids=user_ids, start_date=start_date, end_date=end_date
+        )
+
+
 # Attendance record model
 class AttendanceRecord(models.Model):
     """
@@ -58,9 +369,28 @@ class AttendanceRecord(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date = models.DateField()  # The date of attendance
     type = models.CharField(max_length=3, choices=WORK_TYPES, null=True, blank=True)  # Type of work
+    leave_request = models.ForeignKey(
+        'LeaveRequest', on_delete=models.CASCADE, null=True, blank=True, related_name='projected_attendance'
+    )  # Set when the record was projected from an approved leave request
+
+    objects = AttendanceRecordQuerySet.as_manager()
 
     class Meta:
         unique_together = ('user', 'date')  # Ensures a user can only have one attendance record per date
+        indexes = [
+            models.Index(fields=['user', 'date', 'id'], name='attendance_user_keyset_idx'),
+            models.Index(fields=['date', 'id'], name='attendance_keyset_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the stored (user, date, type) so summary maintenance can apply exact deltas.
+        """
+        instance = super().from_db(db, field_names, values)
+        if {'user_id', 'date', 'type'} <= instance.__dict__.keys():  # Not for only() projections
+            instance._stored_values = (instance.user_id, instance.date, instance.type)  # type: ignore
+        return instance
 
     def __str__(self):
         """
@@ -69,6 +399,310 @@ class AttendanceRecord(models.Model):
         return f"{self.user.username} - {self.get_type_display()} on {self.date}"  # type: ignore
 
 
+# Monthly attendance aggregates
+class AttendanceMonthlySummaryQuerySet(models.QuerySet):
+    """
+    Reads and maintains the precomputed (user, year, month, type) counts.
+    """
+
+    def counts(self, users, year, month=None):
+        """
+        Returns {type: count} summed over the given users for a month, or a whole year.
+        """
+        queryset = self.filter(user__in=users, year=year)
+        if month is not None:
+            queryset = queryset.filter(month=month)
+        totals = queryset.values('type').annotate(total=Sum('count')).filter(total__gt=0)
+        return {row['type'] or None: row['total'] for row in totals}
+
+    def apply_delta(self, user_id, day, work_type, delta):
+        """
+        Adjusts a single bucket by `delta`, creating it on first use.
+        """
+        bucket = {'user_id': user_id, 'year': day.year, 'month': day.month, 'type': work_type or ''}
+        if self.filter(**bucket).update(count=F('count') + delta) or delta < 0:
+            return
+        try:
+            with transaction.atomic():
+                self.create(count=delta, **bucket)
+        except IntegrityError:  # Created concurrently, fall back to the increment
+            self.filter(**bucket).update(count=F('count') + delta)
+
+    def rebuild(self, user_ids, start_date=None, end_date=None):
+        """
+        Recomputes every bucket for the given users in the months spanned by [start_date, end_date].
+
+        Used after bulk writes and by the rebuild_attendance_summaries command. Without dates
+        the users' whole history is rebuilt.
+        """
+        user_ids = list(user_ids)
+        records = AttendanceRecord.objects.filter(user_id__in=user_ids)
+        summaries = self.filter(user_id__in=user_ids)
+        archived = ArchivedAttendanceMonth.objects.filter(user_id__in=user_ids)
+        if start_date is not None and end_date is not None:
+            start_date = start_date.replace(day=1)
+            end_date = end_date.replace(day=calendar.monthrange(end_date.year, end_date.month)[1])
+            records = records.filter(date__range=(start_date, end_date))
+            summaries = filter_months(summaries, start_date, end_date)
+            archived = filter_months(archived, start_date, end_date)
+
+        rows = (
+            records.annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+            .values('user_id', 'year', 'month', 'type')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        totals = Counter()
+        for row in rows:
+            totals[row['user_id'], row['year'], row['month'], row['type'] or ''] += row['total']
+        # Archived days still count, so summaries survive archive_attendance and later rebuilds.
+        # A day logged again after it was archived is counted once, from the hot table.
+        archived = list(archived)
+        relogged = set()
+        if archived:
+            newest = max((month.year, month.month) for month in archived)
+            relogged = set(records.filter(
+                date__lte=date(*newest, calendar.monthrange(*newest)[1])
+            ).values_list('user_id', 'date'))
+        for archived_month in archived:
+            for day, work_type in archived_month.records():
+                if (archived_month.user_id, day) not in relogged:
+                    totals[archived_month.user_id, day.year, day.month, work_type or ''] += 1
+
+        with transaction.atomic():
+            summaries.delete()
+            self.bulk_create([
+                AttendanceMonthlySummary(user_id=user_id, year=year, month=month, type=work_type, count=count)
+                for (user_id, year, month, work_type), count in totals.items()
+            ])
+
+
+def filter_months(queryset, start_date, end_date):
+    """
+    Restricts a queryset with year and month fields to the months spanned by [start_date, end_date].
+    """
+    return queryset.filter(
+        year__gte=start_date.year, year__lte=end_date.year,
+    ).exclude(
+        year=start_date.year, month__lt=start_date.month,
+    ).exclude(
+        year=end_date.year, month__gt=end_date.month,
+    )
+
+
+class AttendanceMonthlySummary(models.Model):
+    """
+    Materialized per-user monthly attendance counts, one row per work type.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendance_summaries')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    type = models.CharField(max_length=3, choices=AttendanceRecord.WORK_TYPES, blank=True)  # '' when untyped
+    count = models.PositiveIntegerField(default=0)
+
+    objects = AttendanceMonthlySummaryQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'year', 'month', 'type'], name='attendance_summary_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['year', 'month'], name='attendance_summary_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.year}-{self.month:02d} {self.type or 'Untyped'}: {self.count}"
+
+
+# Attendance moved out of the hot table by the archive_attendance command
+class ArchivedAttendanceMonth(models.Model):
+    """
+    One user's archived attendance for a month, with each day's type packed into one character,
+    so a month of history is a single short row instead of up to 31 indexed ones.
+    """
+    NO_RECORD = '.'
+    UNTYPED = '-'
+    DAY_CODES = {'WFH': 'W', 'IO': 'O', 'AL': 'A', 'S': 'S', 'FL': 'F', 'NWD': 'N', 'BT': 'B', 'T': 'T'}
+    TYPES_BY_CODE = {code: work_type for work_type, code in DAY_CODES.items()}
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_attendance')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    days = models.CharField(max_length=31)  # Day n at index n - 1, NO_RECORD where nothing was logged
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'year', 'month'], name='archived_attendance_month'),
+        ]
+        indexes = [
+            models.Index(fields=['year', 'month'], name='archived_attendance_month_idx'),
+        ]
+
+    def records(self):
+        """
+        Yields (date, type) for every archived day, type None when the record was untyped.
+        """
+        for index, code in enumerate(self.days):
+            if code != self.NO_RECORD:
+                yield date(self.year, self.month, index + 1), self.TYPES_BY_CODE.get(code)
+
+    def merge(self, records):
+        """
+        Packs (date, type) pairs for this month into `days`, replacing any day already archived.
+        """
+        days = list(self.days.ljust(calendar.monthrange(self.year, self.month)[1], self.NO_RECORD))
+        for day, work_type in records:
+            days[day.day - 1] = self.DAY_CODES.get(work_type, self.UNTYPED)
+        self.days = ''.join(days)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.year}-{self.month:02d}: {self.days}"
+
+
+# Signals keeping AttendanceMonthlySummary in step with AttendanceRecord
+@receiver(post_save, sender=AttendanceRecord)
+def update_attendance_summary_on_save(sender, instance, created, **kwargs):
+    """
+    Moves one count between buckets when a record is created or its date/type changes.
+    """
+    current = (instance.user_id, instance.date, instance.type)
+    stored = getattr(instance, '_stored_values', None)
+    if created:
+        AttendanceMonthlySummary.objects.apply_delta(*current, 1)
+    elif stored is None:
+        # Updated without knowing the previous values, recompute the affected month
+        AttendanceMonthlySummary.objects.rebuild([instance.user_id], instance.date, instance.date)
+    elif stored != current:
+        AttendanceMonthlySummary.objects.apply_delta(*stored, -1)
+        AttendanceMonthlySummary.objects.apply_delta(*current, 1)
+    instance._stored_values = current
+
+
+@receiver(post_delete, sender=AttendanceRecord)
+def update_attendance_summary_on_delete(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_values', None) or (instance.user_id, instance.date, instance.type)
+    AttendanceMonthlySummary.objects.apply_delta(*stored, -1)
+
+
+@receiver(attendance_bulk_changed)
+def rebuild_attendance_summary_on_bulk_change(sender, user_ids, start_date, end_date, **kwargs):
+    AttendanceMonthlySummary.objects.rebuild(user_ids, start_date, end_date)
+
+
+# Interval queries for leave requests
+class LeaveRequestQuerySet(models.QuerySet):
+    """
+    Range queries over leave requests backed by the (user, start_date, end_date) index.
+    """
+    ACTIVE_STATUSES = ('Pending', 'Approved', 'Cancellation Pending')
+
+    def overlapping(self, start, end, users=None):
+        """
+        Returns leave requests whose [start_date, end_date] range intersects [start, end].
+
+        Requests can never be longer than LeaveRequest.MAX_LEAVE_DAYS, so start_date is bounded
+        on both sides. Each user then resolves to a single narrow range scan of the composite
+        index instead of visiting every request that started before `end`.
+        """
+        queryset = self.filter(
+            start_date__gte=start - timedelta(days=LeaveRequest.MAX_LEAVE_DAYS - 1),
+            start_date__lte=end,
+            end_date__gte=start,
+        )
+        if users is not None:
+            queryset = queryset.filter(user__in=users)
+        return queryset
+
+    def on_day(self, day, users=None):
+        """
+        Returns leave requests covering a single day.
+        """
+        return self.overlapping(day, day, users=users)
+
+    def active(self):
+        """
+        Restricts to requests that still hold the dates (pending or approved).
+        """
+        return self.filter(status__in=self.ACTIVE_STATUSES)
+
+    def absent_per_day(self, start, end, users):
+        """
+        Counts how many of `users` are off on each day of [start, end], from one range query.
+
+        Returns a list with one count per day. A user is counted once per day even when
+        several of their requests cover it.
+        """
+        days = (end - start).days + 1
+        ranges = {}
+        for user_id, start_date, end_date in self.active().overlapping(start, end, users=users).values_list(
+            'user_id', 'start_date', 'end_date'
+        ):
+            ranges.setdefault(user_id, []).append(
+                ((max(start_date, start) - start).days, (min(end_date, end) - start).days + 1)
+            )
+
+        # Difference array over the merged ranges of each user
+        changes = [0] * (days + 1)
+        for user_ranges in ranges.values():
+            user_ranges.sort()
+            merged_start, merged_end = user_ranges[0]
+            for range_start, range_end in user_ranges[1:] + [(days + 1, days + 1)]:
+                if range_start > merged_end:
+                    changes[merged_start] += 1
+                    changes[merged_end] -= 1
+                    merged_start, merged_end = range_start, range_end
+                else:
+                    merged_end = max(merged_end, range_end)
+
+        absent = []
+        running = 0
+        for change in changes[:days]:
+            running += change
+            absent.append(running)
+        return absent
+
+    def approved(self):
+        return self.filter(status='Approved')
+
+    def awaiting_decision(self):
+        """
+        Restricts to requests a manager can still approve or reject.
+        """
+        return self.filter(status__in=list(LeaveRequest.DECISIONS['approve']))
+
+    def decide(self, ids, manager_profile, action):
+        """
+        Approves or rejects many requests at once on behalf of `manager_profile`.
+
+        Ownership is checked in one query, each resulting status is written with one
+        UPDATE ... WHERE id IN (...), and leave_status_changed is sent once for the batch,
+        all inside a single transaction. Returns {id: outcome} for every requested id.
+        """
+        transitions = LeaveRequest.DECISIONS[action]
+        results = {leave_id: 'not_found' for leave_id in ids}
+        with transaction.atomic():
+            leave_requests = list(
+                self.select_for_update().select_related('user').filter(id__in=ids, manager=manager_profile)
+            )
+            by_new_status = {}
+            changes = []
+            for leave in leave_requests:
+                new_status = transitions.get(leave.status)
+                if new_status is None:
+                    results[leave.id] = 'invalid_status'
+                    continue
+                by_new_status.setdefault((leave.status, new_status), []).append(leave.id)
+                changes.append((leave, leave.status))
+                leave.status = new_status
+                results[leave.id] = new_status
+
+            for (old_status, new_status), leave_ids in by_new_status.items():
+                self.model.objects.filter(id__in=leave_ids, status=old_status).update(status=new_status)
+            if changes:
+                leave_status_changed.send(sender=self.model, changes=changes)
+        return results
+
+
 # Leave request model
 class LeaveRequest(models.Model):
     """
@@ -100,16 +734,78 @@ class LeaveRequest(models.Model):
     )  # Link to a manager for approval workflow
     created_at = models.DateTimeField(auto_now_add=True)  # Automatically stores creation timestamp
 
+    MAX_LEAVE_DAYS = 366  # Upper bound on a single request, keeps overlap queries index-bounded
+
+    # Manager decisions: current status -> resulting status
+    DECISIONS = {
+        'approve': {'Pending': 'Approved', 'Cancellation Pending': 'Cancelled'},
+        'reject': {'Pending': 'Denied', 'Cancellation Pending': 'Approved'},
+    }
+
+    objects = LeaveRequestQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'start_date', 'end_date'], name='leave_user_range_idx'),
+            models.Index(fields=['manager', 'status', 'start_date'], name='leave_manager_status_idx'),
+            models.Index(fields=['user', 'start_date', 'id'], name='leave_user_keyset_idx'),
+            models.Index(fields=['manager', 'status', 'created_at', 'id'], name='leave_manager_inbox_idx'),
+            # Partial: only the small set of requests awaiting a decision, see awaiting_decision()
+            models.Index(
+                fields=['manager', 'start_date'],
+                condition=models.Q(status__in=['Pending', 'Cancellation Pending']),
+                name='leave_awaiting_decision_idx',
+            ),
+        ]
+
     def clean(self):
         """
         Validates leave request dates:
         - Start date cannot be in the past.
         - End date must be after the start date.
+        - A single request cannot span more than MAX_LEAVE_DAYS.
+        - A new request cannot overlap the user's pending or approved requests.
         """
         if self.start_date < now().date():
             raise ValidationError('Start date cannot be in the past.')
         if self.end_date < self.start_date:
             raise ValidationError('End date cannot be before the start date.')
+        if (self.end_date - self.start_date).days >= self.MAX_LEAVE_DAYS:
+            raise ValidationError(f'A leave request cannot be longer than {self.MAX_LEAVE_DAYS} days.')
+        if self.pk is None and self.user_id is not None and self.status in LeaveRequestQuerySet.ACTIVE_STATUSES:
+            conflict = LeaveRequest.objects.active().overlapping(
+                self.start_date, self.end_date, users=[self.user_id]
+            ).order_by('start_date').first()
+            if conflict:
+                raise ValidationError(
+                    f'These dates overlap your {conflict.get_status_display().lower()} request '
+                    f'from {conflict.start_date} to {conflict.end_date}.'
+                )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the stored status so saves that change it can be broadcast.
+        """
+        instance = super().from_db(db, field_names, values)
+        if 'status' in instance.__dict__:
+            instance._stored_status = instance.status  # type: ignore
+        return instance
+
+    @property
+    def working_days(self):
+        """
+        Working days covered by the request, skipping weekends, bank holidays and closure days.
+        """
+        return count_working_days(self.start_date, self.end_date)
+
+    def refresh_from_db(self, *args, **kwargs):
+        """
+        Reloaded rows carry their stored status too, so a later save compares against the database.
+        """
+        super().refresh_from_db(*args, **kwargs)
+        if 'status' in self.__dict__:
+            self._stored_status = self.status
 
     def save(self, *args, **kwargs):
         """
@@ -123,3 +819,185 @@ class LeaveRequest(models.Model):
         Returns a string representation of the leave request.
         """
         return f"{self.user.username} - {self.get_leave_type_display()} ({self.get_status_display()}) from {self.start_date} to {self.end_date}"  # type: ignore
+
+
+# Leave entitlement ledger, maintained by workspace.balances
+class LeaveBalanceQuerySet(models.QuerySet):
+    """
+    Single-row reads and in-place adjustments of the (user, leave type, year) ledger.
+    """
+
+    def adjust(self, deltas, create=True):
+        """
+        Adds working days to the pending and taken buckets of many rows at once.
+
+        `deltas` maps (user id, leave type, year) to {'pending': days, 'taken': days}. Existing rows
+        are incremented with one UPDATE ... CASE, missing ones inserted with one bulk insert
+        (skipped without `create`), so a batch costs the same few queries whatever its size.
+        """
+        deltas = {key: buckets for key, buckets in deltas.items() if any(buckets.values())}
+        if not deltas:
+            return
+        users, leave_types, years = (set(part) for part in zip(*deltas))
+        with transaction.atomic():
+            existing = {
+                (row['user_id'], row['leave_type'], row['year']): row['id']
+                for row in self.select_for_update().filter(
+                    user_id__in=users, leave_type__in=leave_types, year__in=years
+                ).values('id', 'user_id', 'leave_type', 'year')
+                if (row['user_id'], row['leave_type'], row['year']) in deltas
+            }
+            if existing:
+                self.filter(id__in=existing.values()).update(**{
+                    bucket: Case(
+                        *[When(id=row_id, then=F(bucket) + deltas[key].get(bucket, 0)) for key, row_id in existing.items()],
+                        default=F(bucket),
+                    )
+                    for bucket in ('pending', 'taken')
+                })
+            missing = [key for key in deltas if key not in existing]
+            if not (create and missing):
+                return
+            try:
+                with transaction.atomic():
+                    self.bulk_create([
+                        LeaveBalance(
+                            user_id=key[0], leave_type=key[1], year=key[2],
+                            entitlement=settings.LEAVE_ENTITLEMENTS.get(key[1], 0),
+                            pending=deltas[key].get('pending', 0), taken=deltas[key].get('taken', 0),
+                        )
+                        for key in missing
+                    ])
+            except IntegrityError:  # Created concurrently, retry as increments
+                self.adjust({key: deltas[key] for key in missing})
+
+    def for_user(self, user, leave_type, year):
+        """
+        Returns the user's balance row, or an unsaved one at the default entitlement.
+        """
+        balance = self.filter(user=user, leave_type=leave_type, year=year).first()
+        if balance is None:
+            balance = LeaveBalance(
+                user=user, leave_type=leave_type, year=year,
+                entitlement=settings.LEAVE_ENTITLEMENTS.get(leave_type, 0),
+            )
+        return balance
+
+
+class LeaveBalance(models.Model):
+    """
+    Working days of a leave type a user is entitled to, has requested and has been granted in a year.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leave_balances')
+    leave_type = models.CharField(max_length=3, choices=LeaveRequest.LEAVE_TYPES)
+    year = models.PositiveSmallIntegerField()
+    entitlement = models.PositiveSmallIntegerField(default=0)
+    pending = models.IntegerField(default=0)  # Days in requests awaiting approval
+    taken = models.IntegerField(default=0)  # Days in approved requests, including pending cancellations
+
+    objects = LeaveBalanceQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'leave_type', 'year'], name='leave_balance_bucket'),
+        ]
+
+    @property
+    def remaining(self):
+        """
+        Days still available to request.
+        """
+        return self.entitlement - self.pending - self.taken
+
+    def __str__(self):
+        return f"{self.user_id} - {self.leave_type} {self.year}: {self.remaining}/{self.entitlement}"
+
+
+# Outbound email queue, drained by the send_queued_email command
+class OutboundEmail(models.Model):
+    """
+    An email waiting to be delivered off the request path, with retry bookkeeping.
+    """
+    QUEUED = 'Queued'
+    SENT = 'Sent'
+    FAILED = 'Failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    content_subtype = models.CharField(max_length=10, default='plain')  # 'plain' or 'html'
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField()  # List of recipient addresses
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
+
+
+# Signals invalidating cached dashboards when the data behind them changes
+@receiver(post_save, sender=AttendanceRecord)
+@receiver(post_delete, sender=AttendanceRecord)
+@receiver(post_save, sender=UserProfile)
+def invalidate_user_dashboard(sender, instance, **kwargs):
+    invalidate_dashboard(instance.user_id)
+
+
+# Cached profile role fields (auth_backends.ProfileModelBackend)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_request_profile(sender, instance, **kwargs):
+    invalidate_cached_profile(instance.user_id)
+
+
+@receiver(post_save, sender=LeaveRequest)
+@receiver(post_delete, sender=LeaveRequest)
+def invalidate_leave_dashboards(sender, instance, **kwargs):
+    """
+    Invalidates the requester's dashboard and the approving manager's.
+    """
+    manager_user_id = None
+    if instance.manager_id:
+        manager_user_id = UserProfile.objects.filter(pk=instance.manager_id).values_list(
+            'user_id', flat=True
+        ).first()
+    invalidate_dashboard(instance.user_id, manager_user_id)
+
+
+@receiver(attendance_bulk_changed)
+def invalidate_dashboards_on_bulk_change(sender, user_ids, **kwargs):
+    invalidate_dashboard(*user_ids)
+
+
+@receiver(leave_status_changed)
+def invalidate_dashboards_on_leave_decision(sender, changes, **kwargs):
+    manager_ids = {leave.manager_id for leave, _ in changes if leave.manager_id}
+    manager_user_ids = UserProfile.objects.filter(pk__in=manager_ids).values_list('user_id', flat=True)
+    invalidate_dashboard(*{leave.user_id for leave, _ in changes}, *manager_user_ids)
+
+
+# Broadcast single-row status changes through the same signal as bulk decisions
+@receiver(post_save, sender=LeaveRequest)
+def send_leave_status_changed(sender, instance, created, **kwargs):
+    """
+    Sends leave_status_changed when a request is created or saved with a different status.
+
+    Requests saved without a known previous status are treated as changed.
+    """
+    previous_status = None if created else getattr(instance, '_stored_status', '')
+    if previous_status != instance.status:
+        leave_status_changed.send(sender=LeaveRequest, changes=[(instance, previous_status)])
+    instance._stored_status = instance.status
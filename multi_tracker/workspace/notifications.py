@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.dispatch import receiver
+
+from .mail import queue_emails
+from .signals import leave_status_changed
+
+
+def _status_change(previous_status, status):
+    # '' is an unknown previous status, such as a request saved without its stored status
+    if previous_status:
+        return f'changed from {previous_status} to {status}'
+    return f'is now {status}'
+
+
+@receiver(leave_status_changed)
+def queue_leave_decision_emails(sender, changes, **kwargs):
+    """
+    Queues one email per decided request with a single insert, once the decision commits.
+    """
+    messages = [
+        {
+            'subject': f'Your leave request is now {leave.status}',
+            'body': (
+                f'Your {leave.get_leave_type_display()} request from {leave.start_date} '
+                f'to {leave.end_date} {_status_change(previous_status, leave.status)}.'
+            ),
+            'to': [leave.user.email],
+        }
+        for leave, previous_status in changes
+        if previous_status is not None and leave.user.email  # Not for newly submitted requests
+    ]
+    if messages:
+        transaction.on_commit(lambda: queue_emails(messages))
@@ -0,0 +1,50 @@
+from datetime import date
+
+from django.db.models import Q
+
+
+DEFAULT_PAGE_SIZE = 50
+
+
+# Keyset (cursor) pagination over (date or datetime field, id), newest first by default. Each page
+# is a single index range scan, however deep into the history it is.
+def encode_cursor(value, pk):
+    return f'{value.isoformat()}.{pk}'
+
+
+def decode_cursor(cursor, parse=date.fromisoformat):
+    """
+    Returns (value, id) from a cursor string, or None if it is missing or malformed.
+    """
+    try:
+        value, pk = cursor.rsplit('.', 1)
+        return parse(value), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def keyset_queryset(queryset, date_field, cursor, page_size=DEFAULT_PAGE_SIZE, descending=True,
+                    parse=date.fromisoformat):
+    """
+    Orders by (date_field, id) and returns one row more than a page, starting after `cursor`.
+    """
+    position = decode_cursor(cursor, parse)
+    lookup = 'lt' if descending else 'gt'
+    if position is not None:
+        value, pk = position
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__{lookup}': value}) | Q(**{date_field: value, f'id__{lookup}': pk})
+        )
+    prefix = '-' if descending else ''
+    return queryset.order_by(f'{prefix}{date_field}', f'{prefix}id')[:page_size + 1]
+
+
+def keyset_page(rows, date_field, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Splits the rows fetched by keyset_queryset into (page, next cursor or None).
+    """
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, date_field), last.pk)
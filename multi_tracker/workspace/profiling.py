@@ -0,0 +1,175 @@
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template.base import Template
+
+
+# Per-request profile, visible to the execute wrapper and the template timer
+_current_profile = ContextVar('workspace_request_profile', default=None)
+
+# Literals stripped from SQL so queries that differ only in their values share a template
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|\?")
+_SQL_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+def sql_template(sql):
+    """
+    Normalizes a statement into its template: literals become ? and IN lists collapse to (?).
+    """
+    return _SQL_IN_LISTS.sub('(?)', _SQL_LITERALS.sub('?', sql))
+
+
+class RequestProfile:
+    """
+    Costs collected while serving one request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.sql_templates = Counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        connection.execute_wrapper hook: times every statement sent to the database.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.query_count += 1
+            self.sql_templates[sql_template(sql)] += 1
+
+    def repeated_queries(self):
+        """
+        Returns [(template, count)] for statements repeated often enough to suggest an N+1 pattern.
+        """
+        threshold = settings.PROFILING_N_PLUS_ONE_THRESHOLD
+        return [(sql, count) for sql, count in self.sql_templates.most_common() if count >= threshold]
+
+    def sample(self, view_name, status_code):
+        return {
+            'view': view_name,
+            'status': status_code,
+            'wall_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'db_ms': round(self.db_time * 1000, 3),
+            'template_ms': round(self.template_time * 1000, 3),
+            'queries': self.query_count,
+            'repeated': [{'sql': sql, 'count': count} for sql, count in self.repeated_queries()],
+        }
+
+
+# Template timing. Only the outermost render is timed so includes are not counted twice.
+_original_template_render = Template.render
+_template_timer_lock = threading.Lock()
+
+
+def _timed_template_render(self, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return _original_template_render(self, context)
+    profile.template_depth += 1
+    started = time.perf_counter()
+    try:
+        return _original_template_render(self, context)
+    finally:
+        profile.template_depth -= 1
+        if profile.template_depth == 0:
+            profile.template_time += time.perf_counter() - started
+
+
+def install_template_timer():
+    with _template_timer_lock:
+        if Template.render is not _timed_template_render:
+            Template.render = _timed_template_render
+
+
+class ProfileStore:
+    """
+    Keeps recent samples per URL name in memory and appends them to the file sink, if configured.
+    """
+
+    def __init__(self, max_samples, sink_path=None):
+        self.samples = defaultdict(lambda: deque(maxlen=max_samples))
+        self.sink_path = sink_path
+        self.lock = threading.Lock()
+
+    def add(self, sample):
+        with self.lock:
+            self.samples[sample['view']].append(sample)
+            if self.sink_path:
+                with open(self.sink_path, 'a', encoding='utf-8') as sink:
+                    sink.write(json.dumps(sample) + '\n')
+
+    def recent(self):
+        """
+        Returns a snapshot of the samples kept in memory, every view's together.
+        """
+        with self.lock:
+            return [sample for samples in self.samples.values() for sample in samples]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_profile_store():
+    """
+    Returns this process's ProfileStore, shared by the middleware and the profile_summary view.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProfileStore(settings.PROFILING_MAX_SAMPLES, settings.PROFILING_SINK or None)
+    return _store
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a non-empty list.
+    """
+    ordered = sorted(values)
+    # Rounded first so float error (0.07 * 100 == 7.000000000000001) cannot push the rank up by one
+    return ordered[max(0, math.ceil(round(fraction * len(ordered), 9)) - 1)]
+
+
+def summarize(samples):
+    """
+    Aggregates samples into per-view latency percentiles, query counts and repeated-SQL flags.
+    """
+    by_view = defaultdict(list)
+    for sample in samples:
+        by_view[sample['view']].append(sample)
+
+    report = []
+    for view, view_samples in sorted(by_view.items()):
+        wall = [sample['wall_ms'] for sample in view_samples]
+        queries = [sample['queries'] for sample in view_samples]
+        repeated = Counter()
+        for sample in view_samples:
+            for entry in sample['repeated']:
+                repeated[entry['sql']] = max(repeated[entry['sql']], entry['count'])
+        report.append({
+            'view': view,
+            'requests': len(view_samples),
+            'p50_ms': percentile(wall, 0.50),
+            'p95_ms': percentile(wall, 0.95),
+            'p99_ms': percentile(wall, 0.99),
+            'avg_db_ms': sum(sample['db_ms'] for sample in view_samples) / len(view_samples),
+            'avg_template_ms': sum(sample['template_ms'] for sample in view_samples) / len(view_samples),
+            'max_queries': max(queries),
+            'avg_queries': sum(queries) / len(queries),
+            'repeated': repeated.most_common(),
+        })
+    return report
@@ -0,0 +1,94 @@
+from django.dispatch import receiver
+
+from .models import AttendanceRecord, LeaveRequest
+from .signals import leave_status_changed
+from .working_calendar import working_days
+
+
+# Attendance type written for each leave type. Personal leave has no attendance equivalent.
+LEAVE_ATTENDANCE_TYPES = {
+    'AL': 'AL',
+    'FL': 'FL',
+    'NWD': 'NWD',
+    'SL': 'S',
+}
+
+# Statuses whose dates are held in attendance: approved, including while a cancellation is pending
+PROJECTED_STATUSES = ('Approved', 'Cancellation Pending')
+
+BATCH_SIZE = 1000  # Days inserted per statement when projecting many requests
+
+
+def expand_leave(leave, start_date=None, end_date=None):
+    """
+    Returns unsaved AttendanceRecords for a request, optionally clipped to a window.
+    """
+    work_type = LEAVE_ATTENDANCE_TYPES.get(leave.leave_type)
+    if work_type is None:
+        return []
+    first = max(leave.start_date, start_date) if start_date else leave.start_date
+    last = min(leave.end_date, end_date) if end_date else leave.end_date
+    return [
+        AttendanceRecord(user_id=leave.user_id, date=day, type=work_type, leave_request_id=leave.id)
+        for day in working_days(first, last)
+    ]
+
+
+def project_leave(leave_requests, start_date=None, end_date=None, batch_size=BATCH_SIZE):
+    """
+    Writes per-day attendance for approved requests, one bulk insert per `batch_size` days,
+    and returns the number of days written.
+
+    Days the user already recorded keep their record: overwriting it would lose it for good
+    once the leave is retracted, since retract_leave deletes the projected rows.
+    """
+    written = 0
+    batch = []
+    for leave in leave_requests:
+        batch.extend(expand_leave(leave, start_date, end_date))
+        if len(batch) >= batch_size:
+            written += len(AttendanceRecord.objects.bulk_insert_missing(batch))
+            batch = []
+    if batch:
+        written += len(AttendanceRecord.objects.bulk_insert_missing(batch))
+    return written
+
+
+def retract_leave(leave_ids):
+    """
+    Removes the projected attendance of the given requests with one DELETE. Records the user
+    logged over a projected day are detached from the leave (see upsert_records) and stay.
+    """
+    return AttendanceRecord.objects.filter(leave_request_id__in=leave_ids).bulk_delete()
+
+
+def replay_projection(start_date, end_date, batch_size=BATCH_SIZE):
+    """
+    Rebuilds the projection for a date window from the requests approved in it, streaming the
+    requests and inserting their days in batches.
+    """
+    retracted = AttendanceRecord.objects.filter(
+        leave_request__isnull=False, date__range=(start_date, end_date)
+    ).bulk_delete()
+    leave_requests = LeaveRequest.objects.overlapping(start_date, end_date).filter(status__in=PROJECTED_STATUSES)
+    projected = project_leave(leave_requests.iterator(chunk_size=1000), start_date, end_date, batch_size)
+    return retracted, projected
+
+
+@receiver(leave_status_changed)
+def sync_leave_projection(sender, changes, **kwargs):
+    """
+    Projects newly approved requests and retracts those that left the approved states.
+    """
+    to_project = []
+    to_retract = []
+    for leave, previous_status in changes:
+        if leave.status in PROJECTED_STATUSES:
+            if previous_status not in PROJECTED_STATUSES:
+                to_project.append(leave)
+        elif previous_status in PROJECTED_STATUSES or previous_status == '':
+            to_retract.append(leave.id)  # '' is an unknown previous status; retracting is idempotent
+    if to_retract:
+        retract_leave(to_retract)
+    if to_project:
+        project_leave(to_project)
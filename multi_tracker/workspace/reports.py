@@ -0,0 +1,183 @@
+import calendar
+from collections import Counter
+from datetime import date
+
+from django.db import connection
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .attendance_archive import archived_attendance_values
+from .models import ArchivedAttendanceMonth, AttendanceMonthlySummary, AttendanceRecord, UserProfile, filter_months
+
+
+# One output column per work type, plus records with no type
+TYPE_COLUMNS = {code: code.lower() for code, _ in AttendanceRecord.WORK_TYPES}
+UNTYPED_COLUMN = 'untyped'
+COUNT_COLUMNS = [*TYPE_COLUMNS.values(), UNTYPED_COLUMN, 'total']
+
+
+def _whole_months(start_date, end_date):
+    return start_date.day == 1 and end_date.day == calendar.monthrange(end_date.year, end_date.month)[1]
+
+
+def _grouped_queryset(start_date, end_date, users=None):
+    """
+    Returns the (manager, employee, month) breakdown queryset and the columns identifying its month.
+
+    Whole-month ranges read AttendanceMonthlySummary, which holds a handful of rows per user
+    and month whatever the size of the attendance table. Other ranges aggregate the raw
+    records, grouped with date_trunc (TruncMonth) and bounded by the date index; the days that
+    archive_attendance moved out of them are added by _archived_breakdown.
+    """
+    people = {'manager': F('user__profile__manager_id'), 'employee': F('user_id')}
+    if _whole_months(start_date, end_date):
+        queryset = filter_months(AttendanceMonthlySummary.objects.all(), start_date, end_date).values(
+            'year', 'month', **people
+        )
+        month_columns = ('year', 'month')
+        aggregates = {column: Sum('count', filter=Q(type=code)) for code, column in TYPE_COLUMNS.items()}
+        aggregates[UNTYPED_COLUMN] = Sum('count', filter=Q(type=''))
+        aggregates['total'] = Sum('count')
+    else:
+        queryset = AttendanceRecord.objects.filter(
+            date__range=(start_date, end_date),
+        ).values(month_start=TruncMonth('date'), **people)
+        month_columns = ('month_start',)
+        aggregates = {column: Count('id', filter=Q(type=code)) for code, column in TYPE_COLUMNS.items()}
+        aggregates[UNTYPED_COLUMN] = Count('id', filter=Q(type__isnull=True) | Q(type=''))
+        aggregates['total'] = Count('id')
+
+    if users is not None:
+        queryset = queryset.filter(user__in=users)
+    return queryset.annotate(**aggregates).order_by(), month_columns
+
+
+def _month_of(row, month_columns):
+    if month_columns == ('month_start',):
+        value = row['month_start']
+        return value.date() if hasattr(value, 'date') else value
+    return date(row['year'], row['month'], 1)
+
+
+def _has_archived(start_date, end_date, users):
+    archived = filter_months(ArchivedAttendanceMonth.objects.all(), start_date, end_date)
+    if users is not None:
+        archived = archived.filter(user__in=users)
+    return archived.exists()
+
+
+def _archived_breakdown(start_date, end_date, users):
+    """
+    Counts per (manager, employee, month) for the archived days of a partial-month range,
+    in the same shape as the raw branch of _grouped_queryset.
+    """
+    counts = {}
+    for user_id, day, work_type in archived_attendance_values(start_date, end_date, users):
+        row = counts.setdefault((user_id, day.replace(day=1)), Counter())
+        row[TYPE_COLUMNS.get(work_type, UNTYPED_COLUMN)] += 1
+        row['total'] += 1
+    if not counts:
+        return []
+    managers = dict(UserProfile.objects.filter(
+        user_id__in={user_id for user_id, _ in counts},
+    ).values_list('user_id', 'manager_id'))
+    return [
+        _report_row('month', managers.get(user_id), user_id, month, row)
+        for (user_id, month), row in counts.items()
+    ]
+
+
+def _merge_rows(rows, extra):
+    merged = {(row['manager_id'], row['user_id'], row['month']): row for row in rows}
+    for row in extra:
+        existing = merged.setdefault((row['manager_id'], row['user_id'], row['month']), row)
+        if existing is not row:
+            for column in COUNT_COLUMNS:
+                existing[column] += row[column]
+    return list(merged.values())
+
+
+def _report_row(level, manager_id, user_id, month, counts):
+    return {
+        'level': level,
+        'manager_id': manager_id,
+        'user_id': user_id,
+        'month': month,
+        **{column: int(counts.get(column) or 0) for column in COUNT_COLUMNS},
+    }
+
+
+def attendance_breakdown(start_date, end_date, users=None):
+    """
+    Returns attendance-type counts per manager, user and month for [start_date, end_date].
+
+    Each row has manager_id, user_id, month (first day), one count per work type (TYPE_COLUMNS),
+    untyped and total.
+    """
+    queryset, month_columns = _grouped_queryset(start_date, end_date, users)
+    rows = [
+        _report_row('month', row['manager'], row['employee'], _month_of(row, month_columns), row)
+        for row in queryset
+    ]
+    if _whole_months(start_date, end_date):
+        return rows
+    return _merge_rows(rows, _archived_breakdown(start_date, end_date, users))
+
+
+def attendance_breakdown_rollup(start_date, end_date, users=None):
+    """
+    Same as attendance_breakdown, with subtotal rows per user and per manager and a grand total.
+    Row 'level' is 'month' for detail rows, then 'user', 'manager' and 'org' for the subtotals.
+
+    Postgres computes the subtotals in the same statement with GROUP BY ROLLUP. Other backends
+    (SQLite in development and tests), and partial-month ranges reaching archived attendance,
+    add them up from the detail rows.
+    """
+    if connection.vendor == 'postgresql' and (
+        _whole_months(start_date, end_date) or not _has_archived(start_date, end_date, users)
+    ):
+        return _postgres_rollup(start_date, end_date, users)
+
+    rows = attendance_breakdown(start_date, end_date, users)
+    subtotals = {}
+    for row in rows:
+        for level, key in (
+            ('user', (row['manager_id'], row['user_id'])),
+            ('manager', (row['manager_id'], None)),
+            ('org', (None, None)),
+        ):
+            subtotal = subtotals.setdefault((level, key), _report_row(level, *key, None, {}))
+            for column in COUNT_COLUMNS:
+                subtotal[column] += row[column]
+    return rows + list(subtotals.values())
+
+
+def _postgres_rollup(start_date, end_date, users):
+    queryset, month_columns = _grouped_queryset(start_date, end_date, users)
+    inner_sql, params = queryset.query.sql_with_params()
+    quote = connection.ops.quote_name
+    month_keys = ', '.join(quote(column) for column in month_columns)
+    sums = ', '.join(f'SUM({quote(column)}) AS {quote(column)}' for column in COUNT_COLUMNS)
+    sql = (
+        f'SELECT manager, employee, {month_keys}, {sums}, '
+        f'GROUPING(manager) AS manager_rolled, GROUPING(employee) AS employee_rolled, '
+        f'GROUPING({month_keys}) AS month_rolled '
+        f'FROM ({inner_sql}) AS breakdown '
+        f'GROUP BY ROLLUP (manager, employee, ({month_keys}))'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        names = [column[0] for column in cursor.description]
+        results = [dict(zip(names, values)) for values in cursor.fetchall()]
+
+    rows = []
+    for row in results:
+        if row['manager_rolled']:
+            rows.append(_report_row('org', None, None, None, row))
+        elif row['employee_rolled']:
+            rows.append(_report_row('manager', row['manager'], None, None, row))
+        elif row['month_rolled']:
+            rows.append(_report_row('user', row['manager'], row['employee'], None, row))
+        else:
+            rows.append(_report_row('month', row['manager'], row['employee'], _month_of(row, month_columns), row))
+    return rows
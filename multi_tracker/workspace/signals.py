@@ -0,0 +1,12 @@
+from django.dispatch import Signal
+
+
+# Sent after attendance rows are written or removed in bulk (bulk_create upserts, ranged deletes),
+# which bypass the per-instance post_save/post_delete signals.
+# Arguments: user_ids (iterable of user ids), start_date, end_date (inclusive range touched).
+attendance_bulk_changed = Signal()
+
+# Sent inside the transaction after LeaveRequest statuses are changed with a bulk UPDATE,
+# which bypasses post_save. Arguments: changes, a list of (leave_request, previous_status)
+# pairs where leave_request already carries its new status.
+leave_status_changed = Signal()
@@ -0,0 +1,169 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.crypto import get_random_string
+
+from .balances import reconcile_balances
+from .models import AttendanceMonthlySummary, AttendanceRecord, LeaveRequest, UserProfile, UserProfileClosure
+from .projection import LEAVE_ATTENDANCE_TYPES, PROJECTED_STATUSES
+from .working_calendar import working_days as calendar_days
+
+
+# Share of working days per attendance type, outside of leave
+ATTENDANCE_WEIGHTS = {'IO': 45, 'WFH': 42, 'BT': 4, 'T': 3, 'S': 3, None: 3}
+
+# Leave requests per user per year, as (leave type, requests, min days, max days)
+LEAVE_PATTERN = [('AL', 6, 1, 10), ('FL', 4, 1, 1), ('SL', 1, 1, 3), ('PL', 1, 1, 2)]
+
+STATUS_WEIGHTS = {'Approved': 80, 'Pending': 8, 'Denied': 5, 'Cancellation Pending': 2, 'Cancelled': 5}
+
+
+class SeedResult:
+    """
+    Row counts and timing for a seeding run.
+    """
+
+    def __init__(self):
+        self.users = 0
+        self.leave_requests = 0
+        self.attendance_records = 0
+        self.started = time.monotonic()
+
+    @property
+    def rows(self):
+        return self.users * 2 + self.leave_requests + self.attendance_records
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def create_users(count, prefix, span_of_control, password=None, seed=None):
+    """
+    Creates `count` users with profiles arranged in a tree where every manager has up to
+    `span_of_control` reports. Returns (user id, profile) pairs in creation order.
+    """
+    hashed = make_password(password) if password else UNUSABLE_PASSWORD_PREFIX + get_random_string(40)
+    rng = random.Random(seed)
+    first_names = ['Alex', 'Sam', 'Jo', 'Priya', 'Tom', 'Aisha', 'Chen', 'Maria', 'Olu', 'Kate']
+    last_names = ['Smith', 'Jones', 'Patel', 'Khan', 'Brown', 'Wilson', 'Evans', 'Taylor', 'Wright', 'Hughes']
+
+    profiles = UserProfile.objects.bulk_create_with_users([
+        User(
+            username=f'{prefix}{index}@example.com',
+            email=f'{prefix}{index}@example.com',
+            first_name=rng.choice(first_names),
+            last_name=rng.choice(last_names),
+            password=hashed,
+        )
+        for index in range(count)
+    ], batch_size=2000, is_email_verified=True)
+
+    # Heap layout: profile i reports to profile (i - 1) // span_of_control
+    for index, profile in enumerate(profiles):
+        if index:
+            profile.manager_id = profiles[(index - 1) // span_of_control].id
+        profile.is_manager = index * span_of_control + 1 < len(profiles)
+    UserProfile.objects.bulk_update(profiles, ['manager', 'is_manager'], batch_size=2000)
+    return [(profile.user_id, profile) for profile in profiles]
+
+
+def _leave_for_user(rng, user_id, manager_id, start_date, end_date):
+    leave_requests = []
+    for year in range(start_date.year, end_date.year + 1):
+        for leave_type, requests, min_days, max_days in LEAVE_PATTERN:
+            for _ in range(requests):
+                first = date(year, 1, 1) + timedelta(days=rng.randrange(365))
+                last = first + timedelta(days=rng.randint(min_days, max_days) - 1)
+                if first < start_date or last > end_date:
+                    continue
+                leave_requests.append(LeaveRequest(
+                    user_id=user_id,
+                    leave_type=leave_type,
+                    start_date=first,
+                    end_date=last,
+                    status=_weighted(rng, STATUS_WEIGHTS),
+                    manager_id=manager_id,
+                ))
+    return leave_requests
+
+
+def _attendance_for_user(rng, user_id, leave_requests, working_days):
+    leave_days = {}
+    for leave in leave_requests:
+        work_type = LEAVE_ATTENDANCE_TYPES.get(leave.leave_type)
+        if leave.status in PROJECTED_STATUSES and work_type:
+            day = leave.start_date
+            while day <= leave.end_date:
+                leave_days[day] = (work_type, leave.id)
+                day += timedelta(days=1)
+
+    types, weights = list(ATTENDANCE_WEIGHTS), list(ATTENDANCE_WEIGHTS.values())
+    drawn = rng.choices(types, weights=weights, k=len(working_days))
+    records = []
+    for day, work_type in zip(working_days, drawn):
+        leave_request_id = None
+        if day in leave_days:
+            work_type, leave_request_id = leave_days[day]
+        records.append(AttendanceRecord(
+            user_id=user_id, date=day, type=work_type, leave_request_id=leave_request_id
+        ))
+    return records
+
+
+def seed_org(users, years, prefix='synthetic-', span_of_control=8, password=None, seed=None,
+             chunk_size=200, progress=None, end_date=None):
+    """
+    Generates an org of `users` people with `years` of attendance and leave history, ending on
+    `end_date` (today by default). Pass a fixed `end_date` for data that does not depend on the run date.
+
+    Users are processed in chunks with bulk inserts, so memory stays bounded by the chunk.
+    Monthly summaries and leave balances are rebuilt per chunk, the closure table and inbox counters
+    once at the end.
+    """
+    rng = random.Random(seed)
+    result = SeedResult()
+    end_date = end_date or date.today()
+    start_date = date(end_date.year - years + 1, 1, 1)
+    working_days = list(calendar_days(start_date, end_date))
+
+    with transaction.atomic():
+        people = create_users(users, prefix, span_of_control, password, seed)
+    result.users = len(people)
+
+    for offset in range(0, len(people), chunk_size):
+        chunk = people[offset:offset + chunk_size]
+        with transaction.atomic():
+            leave_by_user = {
+                user_id: _leave_for_user(rng, user_id, profile.manager_id, start_date, end_date)
+                for user_id, profile in chunk
+            }
+            LeaveRequest.objects.bulk_create(
+                [leave for leave_requests in leave_by_user.values() for leave in leave_requests],
+                batch_size=2000,
+            )
+            records = [
+                record
+                for user_id, leave_requests in leave_by_user.items()
+                for record in _attendance_for_user(rng, user_id, leave_requests, working_days)
+            ]
+            AttendanceRecord.objects.bulk_create(records, batch_size=5000)
+            AttendanceMonthlySummary.objects.rebuild([user_id for user_id, _ in chunk])
+            reconcile_balances([user_id for user_id, _ in chunk])  # bulk_create sends no status signals
+
+        result.leave_requests += sum(len(leave_requests) for leave_requests in leave_by_user.values())
+        result.attendance_records += len(records)
+        if progress:
+            progress(result)
+
+    UserProfileClosure.objects.rebuild()
+    UserProfile.objects.recount_pending_approvals()
+    return result
@@ -0,0 +1,102 @@
+import base64
+import calendar
+from array import array
+from datetime import date
+
+from .attendance_archive import attendance_values
+from .models import AttendanceRecord, LeaveRequest, UserProfile
+
+
+# Cell codes: 0 is an empty day, then attendance types, then approved leave types.
+CELL_CODES = (
+    [''] + [code for code, _ in AttendanceRecord.WORK_TYPES]
+    + [f'leave:{code}' for code, _ in LeaveRequest.LEAVE_TYPES]
+)
+CELL_LABELS = (
+    [''] + [label for _, label in AttendanceRecord.WORK_TYPES]
+    + [f'{label} (approved)' for _, label in LeaveRequest.LEAVE_TYPES]
+)
+_CODE_INDEX = {code: index for index, code in enumerate(CELL_CODES)}
+
+
+class TeamCalendar:
+    """
+    An employee-by-day matrix of cell codes for one manager's team and month.
+
+    Row i holds employees[i]; column j is day j + 1 of the month.
+    """
+
+    def __init__(self, year, month, employees, matrix):
+        self.year = year
+        self.month = month
+        self.days = calendar.monthrange(year, month)[1]
+        self.employees = employees
+        self.matrix = matrix
+
+    @property
+    def day_numbers(self):
+        return range(1, self.days + 1)
+
+    def rows(self):
+        """
+        Yields (employee, [(short code, label) per day]) for template rendering.
+        """
+        cells = [(code.replace('leave:', ''), label) for code, label in zip(CELL_CODES, CELL_LABELS)]
+        for index, employee in enumerate(self.employees):
+            row = self.matrix[index * self.days:(index + 1) * self.days]
+            yield employee, [cells[code] for code in row]
+
+    def as_dict(self):
+        """
+        JSON-ready form. The matrix is sent as base64 of its raw bytes (one byte per cell).
+        """
+        return {
+            'year': self.year,
+            'month': self.month,
+            'days': self.days,
+            'employees': self.employees,
+            'codes': CELL_CODES,
+            'labels': CELL_LABELS,
+            'matrix': base64.b64encode(self.matrix.tobytes()).decode('ascii'),
+        }
+
+
+def build_team_calendar(manager_profile, year, month, include_indirect=False):
+    """
+    Builds the calendar for the manager's reports in four queries (team, leave, attendance and
+    archived attendance), whatever the team size.
+
+    With `include_indirect`, everyone below the manager in the org tree is included.
+    """
+    days = calendar.monthrange(year, month)[1]
+    first_day, last_day = date(year, month, 1), date(year, month, days)
+    if include_indirect:
+        team = UserProfile.objects.descendants_of(manager_profile)
+    else:
+        team = UserProfile.objects.filter(manager=manager_profile)
+
+    employees = [
+        {'id': user_id, 'name': f'{first_name} {last_name}'.strip() or username}
+        for user_id, first_name, last_name, username in team.order_by(
+            'user__last_name', 'user__first_name', 'user_id'
+        ).values_list('user_id', 'user__first_name', 'user__last_name', 'user__username')
+    ]
+    row_of = {employee['id']: index for index, employee in enumerate(employees)}
+    matrix = array('B', bytes(len(employees) * days))
+
+    # Approved leave first, so a recorded attendance day takes precedence over the plan
+    team_users = team.values('user_id')
+    leaves = LeaveRequest.objects.approved().overlapping(first_day, last_day).filter(
+        user__in=team_users
+    ).values_list('user_id', 'start_date', 'end_date', 'leave_type')
+    for user_id, start_date, end_date, leave_type in leaves:
+        start = row_of[user_id] * days + max(start_date, first_day).day - 1
+        end = row_of[user_id] * days + min(end_date, last_day).day
+        matrix[start:end] = array('B', [_CODE_INDEX[f'leave:{leave_type}']]) * (end - start)
+
+    # Read through the archive as well, so months past the retention window still render
+    for user_id, day, work_type in attendance_values(first_day, last_day, users=team_users):
+        if work_type:
+            matrix[row_of[user_id] * days + day.day - 1] = _CODE_INDEX[work_type]
+
+    return TeamCalendar(year, month, employees, matrix)
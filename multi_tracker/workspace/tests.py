@@ -1,3 +1,1184 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from operator import itemgetter
+from pathlib import Path
+from smtplib import SMTPServerDisconnected
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.handlers.asgi import ASGIHandler
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+
+from .attendance_archive import archive_attendance, attendance_history_page, attendance_values
+from .attendance_import import PARSERS, import_attendance, iter_text_chunks, upsert_records
+from .auth_backends import ProfileModelBackend
+from .balances import reconcile_balances
+from .dashboard_cache import aget_dashboard_version, invalidate_dashboard
+from .events import get_broker, profile_channel, sse_stream, user_channel
+from .forms import LeaveRequestForm
+from .inbox import pending_approval_count
+from .mail import claim_due_emails, deliver_queued_emails, queue_emails
+from .models import (
+    ArchivedAttendanceMonth, AttendanceMonthlySummary, AttendanceRecord, LeaveBalance, LeaveRequest, OutboundEmail,
+    UserProfile, UserProfileClosure,
+)
+from .profiling import percentile
+from .projection import project_leave, replay_projection, retract_leave
+from .reports import COUNT_COLUMNS, _postgres_rollup, attendance_breakdown, attendance_breakdown_rollup
+from .signals import leave_status_changed
+from .synthetic import create_users, seed_org
+from .team_calendar import build_team_calendar
+from .working_calendar import WorkingCalendar, count_working_days, get_calendar, load_closed_days
+
+
+BENCHMARK_BASELINES = Path(__file__).resolve().parent / 'benchmark_baselines.json'
+LATENCY_FLOOR_MS = 25  # Headroom for views whose baseline is only a few milliseconds
+BENCHMARK_SEED_END = date(2025, 12, 31)  # Fixed, so the seeded data does not depend on the run date
+
+# Session and user (joined with the profile), then the view's own queries.
+DASHBOARD_QUERIES = 5
+HISTORY_LIST_QUERIES = 3
+ATTENDANCE_LIST_QUERIES = HISTORY_LIST_QUERIES + 1  # The archive probe
+TEAM_CALENDAR_QUERIES = 4  # Team, approved leave, attendance and the archive probe
+
+
+class ViewBenchmarkTests(TestCase):
+    """
+    Drives the main views over a synthetic org and compares query counts and p95 latency
+    against benchmark_baselines.json.
+
+    Query counts must not exceed the baseline. Latency is only checked with
+    BENCHMARK_CHECK_LATENCY=1, and may then drift up to BENCHMARK_LATENCY_TOLERANCE times
+    the baseline, as timings vary between machines.
+    Run with BENCHMARK_UPDATE_BASELINES=1 to rewrite the baselines after an intended change.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_org(users=60, years=1, prefix='bench-', span_of_control=8, seed=14, end_date=BENCHMARK_SEED_END)
+        profiles = UserProfile.objects.filter(user__username__startswith='bench-').order_by('id')
+        cls.manager = profiles[0].user
+        cls.employee = profiles[len(profiles) - 1].user
+        cls.reports = list(profiles.filter(manager=profiles[0]).values_list('user_id', flat=True))
+        cls.manager.is_staff = True
+        cls.manager.save()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.results:
+            sys.stderr.write('\n' + f"{'benchmark':32} {'queries':>8} {'p50 ms':>9} {'p95 ms':>9}\n")
+            for name, result in sorted(cls.results.items()):
+                sys.stderr.write(
+                    f"{name:32} {result['queries']:>8} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f}\n"
+                )
+            if settings.BENCHMARK_UPDATE_BASELINES:
+                BENCHMARK_BASELINES.write_text(json.dumps(cls.results, indent=2, sort_keys=True) + '\n')
+        super().tearDownClass()
+
+    def measure(self, name, request, prepare=None, expected_status=200):
+        """
+        Issues `request` BENCHMARK_ROUNDS times after one warm-up and checks it against the baseline.
+        """
+        timings = []
+        queries = 0
+        for round_number in range(settings.BENCHMARK_ROUNDS + 1):
+            if prepare:
+                prepare()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                elapsed = (time.perf_counter() - started) * 1000
+            self.assertEqual(response.status_code, expected_status)
+            if round_number:
+                timings.append(elapsed)
+                queries = max(queries, len(captured))
+
+        result = {
+            'queries': queries,
+            'p50_ms': round(percentile(timings, 0.50), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+        }
+        self.results[name] = result
+        if settings.BENCHMARK_UPDATE_BASELINES:
+            return
+
+        baselines = json.loads(BENCHMARK_BASELINES.read_text()) if BENCHMARK_BASELINES.exists() else {}
+        baseline = baselines.get(name)
+        if baseline is None:
+            self.skipTest(f'No baseline recorded for {name}.')
+        self.assertLessEqual(
+            result['queries'], baseline['queries'],
+            f"{name} ran {result['queries']} queries, baseline is {baseline['queries']}.",
+        )
+        if not settings.BENCHMARK_CHECK_LATENCY:
+            return
+        allowed_ms = max(baseline['p95_ms'] * settings.BENCHMARK_LATENCY_TOLERANCE, baseline['p95_ms'] + LATENCY_FLOOR_MS)
+        self.assertLessEqual(
+            result['p95_ms'], allowed_ms,
+            f"{name} p95 is {result['p95_ms']}ms, allowed {allowed_ms:.2f}ms.",
+        )
+
+    def test_dashboard(self):
+        self.client.force_login(self.manager)
+        # Invalidated every round so the uncached build is measured
+        self.measure(
+            'dashboard', lambda: self.client.get(reverse('dashboard')),
+            prepare=lambda: invalidate_dashboard(self.manager.pk),
+        )
+
+    def test_dashboard_cached(self):
+        self.client.force_login(self.manager)
+        self.measure('dashboard_cached', lambda: self.client.get(reverse('dashboard')))
+
+    def test_attendance_list(self):
+        self.client.force_login(self.employee)
+        self.measure('attendance_list', lambda: self.client.get(reverse('attendance_list')))
+
+    def test_attendance_list_all(self):
+        self.client.force_login(self.manager)
+        self.measure('attendance_list_all', lambda: self.client.get(reverse('attendance_list'), {'scope': 'all'}))
+
+    def test_leave_request_list(self):
+        self.client.force_login(self.employee)
+        self.measure('leave_request_list', lambda: self.client.get(reverse('leave_requests')))
+
+    def test_leave_request_list_all(self):
+        self.client.force_login(self.manager)
+        self.measure('leave_request_list_all', lambda: self.client.get(reverse('leave_requests'), {'scope': 'all'}))
+
+    def test_approve_leave(self):
+        self.client.force_login(self.manager)
+        leave = LeaveRequest.objects.filter(manager__user=self.manager).first()
+
+        def reset():
+            LeaveRequest.objects.filter(pk=leave.pk).update(status='Pending')
+
+        self.measure(
+            'approve_leave',
+            lambda: self.client.get(reverse('approve_leave', args=[leave.pk])),
+            prepare=reset,
+            expected_status=302,
+        )
+
+    def test_bulk_decide_leave(self):
+        self.client.force_login(self.manager)
+        leave_ids = list(
+            LeaveRequest.objects.filter(manager__user=self.manager).values_list('id', flat=True)[:50]
+        )
+
+        def reset():
+            LeaveRequest.objects.filter(pk__in=leave_ids).update(status='Pending')
+
+        self.measure(
+            'bulk_decide_leave',
+            lambda: self.client.post(
+                reverse('bulk_decide_leave'),
+                json.dumps({'ids': leave_ids, 'action': 'approve'}),
+                content_type='application/json',
+            ),
+            prepare=reset,
+        )
+
+
+class ViewQueryCountTests(TestCase):
+    """
+    Locks in a constant number of queries for the dashboard and history views, whatever the team size.
+    """
+
+    def build_team(self, size):
+        people = create_users(size + 1, f'team{size}-', span_of_control=size)
+        manager_id, manager_profile = people[0]
+        leave_requests = []
+        records = []
+        for user_id, profile in people[1:]:
+            leave_requests.append(LeaveRequest(
+                user_id=user_id, leave_type='AL', start_date=date(2024, 3, 4), end_date=date(2024, 3, 8),
+                status='Pending', manager_id=manager_profile.id,
+            ))
+            records.append(AttendanceRecord(user_id=user_id, date=date(2024, 3, 1), type='IO'))
+        LeaveRequest.objects.bulk_create(leave_requests)
+        AttendanceRecord.objects.bulk_create(records)
+        UserProfile.objects.filter(pk=manager_profile.pk).update(is_tenant_admin=True)
+        self.client.force_login(User.objects.get(pk=manager_id))
+        return manager_id
+
+    def assert_constant_queries(self, size):
+        manager_id = self.build_team(size)
+        self.client.get(reverse('home'))  # Settles the session so no activity write is counted
+        invalidate_dashboard(manager_id)
+        with self.assertNumQueries(DASHBOARD_QUERIES):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['leave_requests']), size)
+        with self.assertNumQueries(HISTORY_LIST_QUERIES):
+            self.client.get(reverse('leave_requests'), {'scope': 'all'})
+        with self.assertNumQueries(ATTENDANCE_LIST_QUERIES):
+            self.client.get(reverse('attendance_list'), {'scope': 'all'})
+
+    def test_team_of_10(self):
+        self.assert_constant_queries(10)
+
+    def test_team_of_100(self):
+        self.assert_constant_queries(100)
+
+    def test_team_of_1000(self):
+        self.assert_constant_queries(1000)
+
+
+class DroppingBackend(BaseEmailBackend):
+    """
+    Email backend whose session drops on the first send, like an SMTP server closing the connection.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.connected = False
+        self.opened = 0
+        self.sent = []
+
+    def open(self):
+        self.connected = True
+        self.opened += 1
+
+    def close(self):
+        self.connected = False
+
+    def send_messages(self, email_messages):
+        if not self.connected:
+            raise SMTPServerDisconnected('Not connected')
+        if self.opened == 1:
+            self.connected = False
+            raise SMTPServerDisconnected('Connection unexpectedly closed')
+        self.sent += email_messages
+        return len(email_messages)
+
+
+class EmailQueueTests(TestCase):
+    def setUp(self):
+        queue_emails([{'subject': f'Email {index}', 'body': 'Body', 'to': ['to@example.com']} for index in range(3)])
+
+    def test_claimed_emails_skipped_by_other_runs(self):
+        self.assertEqual(len(claim_due_emails(2)), 2)
+        self.assertEqual(len(claim_due_emails(10)), 1)
+        self.assertEqual(claim_due_emails(10), [])
+
+    def test_connection_reopened_after_disconnect(self):
+        backend = DroppingBackend()
+        self.assertEqual(deliver_queued_emails(connection=backend), (2, 1))
+        self.assertEqual(backend.opened, 2)
+        self.assertEqual([message.subject for message in backend.sent], ['Email 1', 'Email 2'])
+        self.assertEqual(OutboundEmail.objects.get(subject='Email 0').attempts, 1)
+
+    def test_command_reports_only_connection_errors(self):
+        stderr = StringIO()
+        with mock.patch('workspace.management.commands.send_queued_email.deliver_queued_emails',
+                        side_effect=ConnectionRefusedError('refused')):
+            call_command('send_queued_email', stdout=StringIO(), stderr=stderr)
+        self.assertIn('Could not connect to the mail server: refused', stderr.getvalue())
+        with mock.patch('workspace.management.commands.send_queued_email.deliver_queued_emails',
+                        side_effect=ValueError('bad batch')), self.assertRaises(ValueError):
+            call_command('send_queued_email', stdout=StringIO(), stderr=StringIO())
+
+
+class PercentileTests(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual([percentile(values, fraction) for fraction in (0.07, 0.5, 0.95, 0.99, 1.0)], [7, 50, 95, 99, 100])
+        self.assertEqual(percentile(list(range(1, 21)), 0.95), 19)
+        self.assertEqual(percentile([4], 0.5), 4)
+
+
+class DashboardCacheTests(SimpleTestCase):
+    def test_version_tokens_expire(self):
+        # Another worker with its own cache never sees this swap, so the token must not live forever
+        invalidate_dashboard(7)
+        version = async_to_sync(aget_dashboard_version)(7)
+        self.assertEqual(async_to_sync(aget_dashboard_version)(7), version)
+        later = time.time() + settings.DASHBOARD_CACHE_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertNotEqual(async_to_sync(aget_dashboard_version)(7), version)
+
+
+class ProfileSummaryTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('profiling@example.com', is_staff=True)
+        self.client.force_login(self.admin)
+
+    @override_settings(PROFILING_ENABLED=True, PROFILING_SINK='')
+    def test_summarizes_samples_in_memory(self):
+        with mock.patch('workspace.profiling._store', None):
+            for _ in range(3):
+                self.client.get(reverse('home'))
+            views = {row['view']: row for row in self.client.get(reverse('profile_summary')).json()['views']}
+        self.assertEqual(views['home']['requests'], 3)
+        self.assertIn('p95_ms', views['home'])
+
+    def test_unavailable_while_disabled(self):
+        self.assertEqual(self.client.get(reverse('profile_summary')).status_code, 404)
+
+
+class AsyncMiddlewareTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('async@example.com', password='unused')
+
+    @override_settings(DEBUG=True, PROFILING_ENABLED=False)
+    def test_async_chain_needs_no_adaptation(self):
+        # With DEBUG, Django logs every middleware it has to wrap in async_to_sync or sync_to_async.
+        # The profiling middleware is adapted before it raises MiddlewareNotUsed, then dropped.
+        handler = ASGIHandler.__new__(ASGIHandler)
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            handler.load_middleware(is_async=True)
+        adapted = [line for line in logs.output if 'adapted' in line and 'QueryProfilingMiddleware' not in line]
+        self.assertEqual(adapted, [])
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
+
+    async def test_session_timeout_on_event_loop(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+        session = await self.async_client.asession()
+        await session.aset('last_activity', (now() - timedelta(seconds=settings.SESSION_TIMEOUT + 1)).isoformat())
+        await session.asave()
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+
+class ProfileModelBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('backend@example.com', password='unused')
+        self.backend = ProfileModelBackend()
+
+    def test_profile_loaded_with_user(self):
+        with self.assertNumQueries(1):
+            user = self.backend.get_user(self.user.pk)
+            self.assertFalse(user.profile.is_manager)
+
+    @override_settings(CACHE_SHARED=True, AUTH_PROFILE_CACHE_TIMEOUT=60)
+    def test_profile_cached_until_it_changes(self):
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(1):  # The user row only
+            self.assertFalse(self.backend.get_user(self.user.pk).profile.is_manager)
+
+        profile = UserProfile.objects.get(user=self.user)
+        profile.is_manager = True
+        profile.save()
+        with self.assertNumQueries(1):
+            self.assertTrue(self.backend.get_user(self.user.pk).profile.is_manager)
+
+    @override_settings(CACHE_SHARED=True, AUTH_PROFILE_CACHE_TIMEOUT=60)
+    def test_user_read_fresh_with_cached_profile(self):
+        self.backend.get_user(self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(password='changed')
+        self.assertEqual(self.backend.get_user(self.user.pk).password, 'changed')
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_profile_not_cached_without_shared_cache(self):
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertFalse(self.backend.get_user(self.user.pk).profile.is_manager)
+        self.assertIsNone(cache.get(f'auth:profile:{self.user.pk}'))
+        with override_settings(AUTH_PROFILE_CACHE_TIMEOUT=60), self.assertRaises(ImproperlyConfigured):
+            ProfileModelBackend()
+
+
+class UserProfileHookTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('hook@example.com', password='unused')
+        self.user = User.objects.get(pk=self.user.pk)
+
+    def test_partial_save_skips_profile(self):
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['last_login'])
+
+    def test_full_save_skips_unloaded_profile(self):
+        with self.assertNumQueries(1):
+            self.user.save()
+
+    def test_full_save_persists_loaded_profile(self):
+        self.user.profile.is_manager = True
+        self.user.save()
+        self.assertTrue(UserProfile.objects.get(user=self.user).is_manager)
+
+    def test_bulk_create_with_users(self):
+        manager = self.user.profile
+        with self.assertNumQueries(6):  # Savepoint pair, users, profiles, manager chain, closure rows
+            profiles = UserProfile.objects.bulk_create_with_users(
+                [User(username=f'bulk{index}@example.com') for index in range(50)], manager=manager
+            )
+        self.assertEqual(len(profiles), 50)
+        self.assertEqual(UserProfile.objects.descendants_of(manager).count(), 50)
+        self.assertEqual(UserProfileClosure.objects.filter(descendant=profiles[0]).count(), 2)
+
+
+class ReportingHierarchyTests(TestCase):
+    def setUp(self):
+        self.a, self.b, self.c, self.d = [
+            User.objects.create_user(f'{name}@example.com', password='unused').profile for name in 'abcd'
+        ]
+        self.set_manager(self.d, self.c)
+
+    def set_manager(self, profile, manager):
+        profile.manager = manager
+        profile.save()
+
+    def assertReports(self, profile, expected):
+        self.assertEqual(set(UserProfile.objects.descendants_of(profile)), set(expected))
+
+    def test_move_relinks_subtree(self):
+        self.set_manager(self.c, self.a)
+        self.assertReports(self.a, [self.c, self.d])
+
+        self.set_manager(self.c, self.b)
+        self.assertReports(self.a, [])
+        self.assertReports(self.b, [self.c, self.d])
+        self.assertEqual(list(UserProfile.objects.ancestors_of(self.d)), [self.c, self.b])
+
+    def test_attach_links_new_profile_to_chain(self):
+        self.set_manager(self.c, self.a)
+        e = UserProfile.objects.bulk_create_with_users([User(username='e@example.com')], manager=self.d)[0]
+        self.assertEqual(list(UserProfile.objects.ancestors_of(e)), [self.d, self.c, self.a])
+        self.assertReports(self.a, [self.c, self.d, e])
+
+    def test_loop_rejected_before_write(self):
+        self.set_manager(self.c, self.a)
+        self.a.manager = self.d
+        with self.assertRaises(ValidationError):
+            self.a.save()
+        self.assertIsNone(UserProfile.objects.get(pk=self.a.pk).manager_id)
+        self.assertReports(self.a, [self.c, self.d])
+
+    def test_delete_detaches_reports(self):
+        self.set_manager(self.c, self.a)
+        self.c.user.delete()
+        self.assertReports(self.a, [])
+        self.assertEqual(list(UserProfile.objects.ancestors_of(self.d)), [])
+        self.assertIsNone(UserProfile.objects.get(pk=self.d.pk).manager_id)
+
+    def test_rebuild_matches_maintained_rows(self):
+        self.set_manager(self.c, self.a)
+        self.set_manager(self.b, self.a)
+        rows = set(UserProfileClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+        self.assertEqual(UserProfileClosure.objects.rebuild(), len(rows))
+        self.assertEqual(set(UserProfileClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth')), rows)
+
+
+class AttendanceReportTests(TestCase):
+    def setUp(self):
+        manager = User.objects.create_user('report-manager@example.com').profile
+        self.profiles = UserProfile.objects.bulk_create_with_users(
+            [User(username=f'report{index}@example.com') for index in range(2)], manager=manager
+        )
+        for profile in self.profiles:
+            for day, work_type in ((1, 'IO'), (2, 'IO'), (3, 'WFH'), (6, None), (28, 'AL')):
+                AttendanceRecord.objects.create(user_id=profile.user_id, date=date(2024, 5, day), type=work_type)
+        self.manager_id = manager.pk
+
+    def test_whole_months_match_raw_records(self):
+        from_summaries = attendance_breakdown(date(2024, 5, 1), date(2024, 5, 31))
+        from_records = attendance_breakdown(date(2024, 5, 1), date(2024, 5, 30))
+        self.assertEqual(sorted(from_summaries, key=itemgetter('user_id')), sorted(from_records, key=itemgetter('user_id')))
+        self.assertEqual(
+            {column: from_summaries[0][column] for column in ('io', 'wfh', 'al', 'untyped', 'total')},
+            {'io': 2, 'wfh': 1, 'al': 1, 'untyped': 1, 'total': 5},
+        )
+
+    def assert_rollup_subtotals(self, rows):
+        by_level = {}
+        for row in rows:
+            by_level.setdefault(row['level'], []).append(row)
+        self.assertEqual(len(by_level['month']), 2)
+        self.assertEqual(len(by_level['user']), 2)
+        self.assertEqual([(row['manager_id'], row['total']) for row in by_level['manager']], [(self.manager_id, 10)])
+        self.assertEqual(by_level['org'][0]['io'], 4)
+
+    def test_rollup_subtotals(self):
+        self.assert_rollup_subtotals(attendance_breakdown_rollup(date(2024, 5, 1), date(2024, 5, 31)))
+
+    @skipUnless(connection.vendor == 'postgresql', 'GROUP BY ROLLUP is only used on Postgres')
+    def test_postgres_rollup(self):
+        for start_date, end_date in ((date(2024, 5, 1), date(2024, 5, 31)), (date(2024, 5, 1), date(2024, 5, 30))):
+            rollup = mock.patch('workspace.reports._postgres_rollup', wraps=_postgres_rollup)
+            with self.subTest(end_date=end_date), rollup as rollup:
+                self.assert_rollup_subtotals(attendance_breakdown_rollup(start_date, end_date))
+                rollup.assert_called_once()
+
+    def test_rollup_statement_and_row_mapping(self):
+        # Runs the ROLLUP branch against a stub cursor, so the SQL and row mapping are checked on any backend
+        counts = {column: 0 for column in COUNT_COLUMNS}
+        results = [
+            {'manager': 5, 'employee': 7, 'year': 2024, 'month': 5, **counts, 'io': 2, 'total': 2, 'rolled': (0, 0, 0)},
+            {'manager': 5, 'employee': 7, 'year': None, 'month': None, **counts, 'total': 2, 'rolled': (0, 0, 1)},
+            {'manager': 5, 'employee': None, 'year': None, 'month': None, **counts, 'total': 2, 'rolled': (0, 1, 1)},
+            {'manager': None, 'employee': None, 'year': None, 'month': None, **counts, 'total': 2, 'rolled': (1, 1, 1)},
+        ]
+        names = [
+            'manager', 'employee', 'year', 'month', *COUNT_COLUMNS, 'manager_rolled', 'employee_rolled', 'month_rolled',
+        ]
+        cursor = mock.MagicMock(description=[(name,) for name in names])
+        cursor.fetchall.return_value = [
+            tuple(row[name] for name in names[:-3]) + row['rolled'] for row in results
+        ]
+        with mock.patch.object(connection, 'cursor', return_value=mock.MagicMock(__enter__=lambda _: cursor)):
+            rows = _postgres_rollup(date(2024, 5, 1), date(2024, 5, 31), None)
+
+        sql = cursor.execute.call_args.args[0]
+        self.assertIn('FROM (SELECT', sql)
+        self.assertIn('GROUPING("year", "month") AS month_rolled', sql)
+        self.assertTrue(sql.endswith('GROUP BY ROLLUP (manager, employee, ("year", "month"))'))
+        self.assertEqual(
+            [(row['level'], row['manager_id'], row['user_id'], row['month'], row['total']) for row in rows],
+            [('month', 5, 7, date(2024, 5, 1), 2), ('user', 5, 7, None, 2), ('manager', 5, None, None, 2),
+             ('org', None, None, None, 2)],
+        )
+        self.assertEqual(rows[0]['io'], 2)
+
+
+class TeamCalendarTests(TestCase):
+    def build_team(self, size, prefix='calendar-'):
+        people = create_users(size + 1, prefix, span_of_control=size)
+        (manager_id, manager), reports = people[0], [user_id for user_id, _ in people[1:]]
+        return manager_id, manager, reports
+
+    def test_matrix_layout(self):
+        _, manager, (first, second) = self.build_team(2)
+        LeaveRequest.objects.bulk_create([
+            LeaveRequest(user_id=first, leave_type='AL', start_date=date(2024, 2, 26), end_date=date(2024, 3, 5),
+                         status='Approved', manager=manager),
+            LeaveRequest(user_id=second, leave_type='SL', start_date=date(2024, 3, 28), end_date=date(2024, 4, 3),
+                         status='Approved', manager=manager),
+            LeaveRequest(user_id=second, leave_type='FL', start_date=date(2024, 3, 12), end_date=date(2024, 3, 12),
+                         status='Pending', manager=manager),
+        ])
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(user_id=first, date=date(2024, 3, 4), type='IO'),
+            AttendanceRecord(user_id=second, date=date(2024, 3, 29), type='WFH'),
+        ])
+
+        team_calendar = build_team_calendar(manager, 2024, 3)
+        self.assertEqual(team_calendar.days, 31)
+        self.assertEqual(len(team_calendar.matrix), 2 * 31)
+        rows = {employee['id']: [code for code, _ in cells] for employee, cells in team_calendar.rows()}
+        # Leave clipped to the month, with recorded attendance taking precedence
+        self.assertEqual(rows[first][:6], ['AL', 'AL', 'AL', 'IO', 'AL', ''])
+        self.assertEqual(set(rows[first][6:]), {''})
+        self.assertEqual(rows[second][27:], ['SL', 'WFH', 'SL', 'SL'])
+        self.assertEqual(set(rows[second][:27]), {''})  # Pending leave is not shown
+
+    def test_api_sends_matrix_bytes(self):
+        manager_id, _, (first, second) = self.build_team(2)
+        AttendanceRecord.objects.create(user_id=second, date=date(2024, 2, 29), type='BT')
+        self.client.force_login(User.objects.get(pk=manager_id))
+        data = self.client.get(reverse('team_calendar_api', args=[2024, 2])).json()
+        matrix = base64.b64decode(data['matrix'])
+        self.assertEqual(len(matrix), len(data['employees']) * data['days'])
+        row = [employee['id'] for employee in data['employees']].index(second)
+        self.assertEqual(data['codes'][matrix[row * data['days'] + 28]], 'BT')
+        self.assertEqual(self.client.get(reverse('team_calendar_api', args=[2024, 13])).status_code, 404)
+
+    def test_constant_queries(self):
+        cache.clear()
+        for size in (5, 300):
+            manager_id, manager, reports = self.build_team(size, prefix=f'calendar-{size}-')
+            LeaveRequest.objects.bulk_create([
+                LeaveRequest(user_id=user_id, leave_type='AL', start_date=date(2024, 3, 4), end_date=date(2024, 3, 8),
+                             status='Approved', manager=manager)
+                for user_id in reports
+            ])
+            AttendanceRecord.objects.bulk_create([
+                AttendanceRecord(user_id=user_id, date=date(2024, 3, 1), type='IO') for user_id in reports
+            ])
+            with self.subTest(size=size), self.assertNumQueries(TEAM_CALENDAR_QUERIES):
+                team_calendar = build_team_calendar(manager, 2024, 3)
+            self.assertEqual(len(team_calendar.employees), size)
+
+            self.client.force_login(User.objects.get(pk=manager_id))
+            self.client.get(reverse('home'))  # Settles the session so no activity write is counted
+            # Session and user, plus the inbox badge on the page
+            views = [('team_calendar', TEAM_CALENDAR_QUERIES + 3), ('team_calendar_api', TEAM_CALENDAR_QUERIES + 2)]
+            for name, queries in views:
+                with self.subTest(size=size, view=name), self.assertNumQueries(queries):
+                    self.client.get(reverse(name, args=[2024, 3]))
+
+
+class AttendanceArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('archive@example.com')
+        for day, work_type in ((date(2023, 1, 2), 'IO'), (date(2023, 1, 3), None), (date(2023, 2, 1), 'AL')):
+            AttendanceRecord.objects.create(user=self.user, date=day, type=work_type)
+        AttendanceRecord.objects.create(user=self.user, date=date(2024, 6, 3), type='WFH')
+
+    def test_archive_moves_old_records_and_keeps_reads(self):
+        before = sorted(attendance_values(date(2023, 1, 1), date(2024, 12, 31)))
+        self.assertEqual(archive_attendance(date(2024, 1, 1)), 3)
+
+        self.assertEqual(AttendanceRecord.objects.count(), 1)
+        self.assertEqual(ArchivedAttendanceMonth.objects.get(year=2023, month=1).days[:4], '.O-.')
+        self.assertEqual(sorted(attendance_values(date(2023, 1, 1), date(2024, 12, 31))), before)
+
+    def test_export_written_once_committed(self):
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir)
+        export = Path(export_dir) / 'attendance-2023.ndjson.gz'
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                archive_attendance(date(2024, 1, 1), export_dir=export_dir)
+                raise RuntimeError
+        self.assertFalse(export.exists())
+        self.assertEqual(AttendanceRecord.objects.count(), 4)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            archive_attendance(date(2024, 1, 1), export_dir=export_dir)
+        self.assertFalse(export.exists())
+        for callback in callbacks:
+            callback()
+        with gzip.open(export, 'rt') as rows:
+            self.assertEqual([json.loads(row)['date'] for row in rows], ['2023-01-02', '2023-01-03', '2023-02-01'])
+
+    def test_projected_leave_kept_for_retraction(self):
+        [leave] = LeaveRequest.objects.bulk_create([LeaveRequest(
+            user=self.user, leave_type='AL', start_date=date(2023, 3, 6), end_date=date(2023, 3, 7), status='Approved',
+        )])
+        project_leave([leave])
+        self.assertEqual(archive_attendance(date(2024, 1, 1)), 3)
+        self.assertEqual(AttendanceRecord.objects.filter(leave_request=leave).count(), 2)
+
+        retract_leave([leave.pk])
+        self.assertEqual(list(attendance_values(date(2023, 3, 1), date(2023, 3, 31))), [])
+        self.assertEqual(AttendanceMonthlySummary.objects.counts([self.user], 2023), {'IO': 1, None: 1, 'AL': 1})
+
+    def test_summaries_survive_archive_and_rebuild(self):
+        archive_attendance(date(2024, 1, 1))
+        self.assertEqual(AttendanceMonthlySummary.objects.counts([self.user], 2023), {'IO': 1, None: 1, 'AL': 1})
+        AttendanceMonthlySummary.objects.rebuild([self.user.pk])
+        self.assertEqual(AttendanceMonthlySummary.objects.counts([self.user], 2023), {'IO': 1, None: 1, 'AL': 1})
+
+    def test_relogged_day_counted_once(self):
+        archive_attendance(date(2024, 1, 1))
+        AttendanceRecord.objects.create(user=self.user, date=date(2023, 1, 2), type='WFH')
+        AttendanceMonthlySummary.objects.rebuild([self.user.pk])
+        self.assertEqual(AttendanceMonthlySummary.objects.counts([self.user], 2023), {'WFH': 1, None: 1, 'AL': 1})
+        self.assertEqual(
+            sorted(attendance_values(date(2023, 1, 1), date(2023, 1, 31))),
+            [(self.user.pk, date(2023, 1, 2), 'WFH'), (self.user.pk, date(2023, 1, 3), None)],
+        )
+
+    def test_history_export_and_reports_read_archive(self):
+        archive_attendance(date(2024, 1, 1))
+        AttendanceRecord.objects.create(user=self.user, date=date(2023, 1, 2), type='WFH')
+        self.client.force_login(self.user)
+
+        expected = [(date(2024, 6, 3), 'WFH'), (date(2023, 2, 1), 'AL'), (date(2023, 1, 3), None), (date(2023, 1, 2), 'WFH')]
+        response = self.client.get(reverse('attendance_list'))
+        self.assertEqual([(record.date, record.type) for record in response.context['attendance_records']], expected)
+        rows, cursor = [], None
+        while True:
+            page, cursor = attendance_history_page({'user': self.user}, cursor, page_size=1)
+            rows += [(record.date, record.type) for record in page]
+            if cursor is None:
+                break
+        self.assertEqual(rows, expected)
+
+        export = b''.join(self.client.get(reverse('attendance_export')).streaming_content).decode().splitlines()
+        self.assertEqual(export[1:], [
+            'archive@example.com,2024-06-03,WFH', 'archive@example.com,2023-01-02,WFH',
+            'archive@example.com,2023-02-01,AL', 'archive@example.com,2023-01-03,',
+        ])
+
+        rows = attendance_breakdown(date(2023, 1, 2), date(2023, 2, 10))
+        self.assertEqual(sorted((row['month'], row['total']) for row in rows), [(date(2023, 1, 1), 2), (date(2023, 2, 1), 1)])
+
+
+class AttendanceImportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('import-admin@example.com')
+        UserProfile.objects.filter(user=self.admin).update(is_tenant_admin=True)
+        self.user = User.objects.create_user('import@example.com')
+
+    def parse(self, parser, text, chunk_size=4):
+        return list(PARSERS[parser](iter_text_chunks(BytesIO(text.encode()), chunk_size=chunk_size)))
+
+    def attendance(self):
+        return dict(AttendanceRecord.objects.filter(user=self.user).values_list('date', 'type'))
+
+    def test_parsers_read_rows_split_across_chunks(self):
+        rows = [{'username': 'import@example.com', 'date': '2024-05-06', 'type': 'IO'}, {'n': 12345}]
+        self.assertEqual(self.parse('json', json.dumps(rows)), rows)
+        self.assertEqual(self.parse('json', ' [ ] '), [])
+        self.assertEqual(self.parse('ndjson', '{"n": 1}\r\n\n{"n": 2}'), [{'n': 1}, {'n': 2}])
+        self.assertEqual(
+            self.parse('csv', 'username,date,type\r\nimport@example.com,2024-05-06,"W\nFH"\n'),
+            [{'username': 'import@example.com', 'date': '2024-05-06', 'type': 'W\nFH'}],
+        )
+
+    def test_malformed_json_array_rejected(self):
+        for text in ['[{"a": 1}', '[{"a": 1} {"a": 2}]', '[{"a": 1}] trailing', '[{"a": 1},]', '{"a": 1}', '[{"a": }]']:
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                self.parse('json', text)
+
+    def test_rows_rejected_individually_and_batches_flushed(self):
+        rows = [
+            {'username': 'import@example.com', 'date': '2024-05-06', 'type': 'IO'},
+            {'username': 'nobody@example.com', 'date': '2024-05-07', 'type': 'IO'},
+            {'username': 'IMPORT@example.com', 'date': 'soon', 'type': 'IO'},
+            'not an object',
+            {'username': 'import@example.com', 'date': '2024-05-08', 'type': 'WFH'},
+        ]
+        batches = []
+        result = import_attendance(iter(rows), batch_size=2, progress=lambda result: batches.append(result.processed))
+        self.assertEqual(batches, [2, 4, 5])
+        self.assertEqual((result.processed, result.imported, result.failed), (5, 2, 3))
+        self.assertEqual([error['row'] for error in result.errors], [2, 3, 4])
+        self.assertEqual(self.attendance(), {date(2024, 5, 6): 'IO', date(2024, 5, 8): 'WFH'})
+
+    def test_command_imports_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as feed:
+            feed.write('username,date,type\nimport@example.com,2024-05-06,IO\nimport@example.com,2024-05-07,XX\n')
+        self.addCleanup(os.remove, feed.name)
+        stdout = StringIO()
+        call_command('import_attendance', feed.name, stdout=stdout)
+        self.assertIn('Imported 1 of 2 rows', stdout.getvalue())
+        self.assertIn('Row 2:', stdout.getvalue())
+        self.assertEqual(self.attendance(), {date(2024, 5, 6): 'IO'})
+
+        with open(feed.name, 'w') as truncated:
+            truncated.write('[{"username": "import@example.com", "date": "2024-05-07", "type": "IO"}')
+        with self.assertRaises(CommandError):
+            call_command('import_attendance', feed.name, format='json', stdout=stdout)
+
+    def test_endpoint_streams_body(self):
+        self.client.force_login(self.admin)
+        body = json.dumps([{'username': 'import@example.com', 'date': '2024-05-06', 'type': 'IO'}])
+        response = self.client.post(reverse('attendance_bulk_import'), body, content_type='application/json')
+        self.assertEqual(response.json()['imported'], 1)
+        response = self.client.post(reverse('attendance_bulk_import'), body[:-1], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('attendance_bulk_import'), body, content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('attendance_bulk_import'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+class AttendanceUpsertApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('clock@example.com')
+        self.client.force_login(self.user)
+
+    def post(self, payload, **headers):
+        return self.client.post(
+            reverse('attendance_upsert_api'), json.dumps(payload), content_type='application/json', headers=headers
+        )
+
+    def test_batch_upserts_days(self):
+        response = self.post({'days': [{'date': '2024-05-06', 'type': 'IO'}, {'date': '2024-05-07', 'type': 'WFH'}]})
+        self.assertEqual(response.json(), {'saved': 2})
+        response = self.post({'date': '2024-05-06', 'type': 'BT'})
+        self.assertEqual(response.json(), {'saved': 1})
+        self.assertEqual(
+            dict(AttendanceRecord.objects.filter(user=self.user).values_list('date', 'type')),
+            {date(2024, 5, 6): 'BT', date(2024, 5, 7): 'WFH'},
+        )
+
+    def test_invalid_days_reported_by_index(self):
+        response = self.post({'days': [{'date': '2024-05-06', 'type': 'IO'}, {'date': 'soon', 'type': 'IO'}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['saved'], 1)
+        self.assertEqual(list(response.json()['errors']), ['1'])
+
+    def test_idempotency_key_replays_response(self):
+        first = self.post({'date': '2024-05-06', 'type': 'IO'}, **{'Idempotency-Key': 'sync-1'})
+        AttendanceRecord.objects.filter(user=self.user).delete()
+        with self.assertNumQueries(2):  # Session and user: the upsert is not repeated
+            retry = self.post({'date': '2024-05-06', 'type': 'IO'}, **{'Idempotency-Key': 'sync-1'})
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertFalse(AttendanceRecord.objects.filter(user=self.user).exists())
+
+    def test_idempotency_key_reused_with_other_body(self):
+        first = self.post({'days': []}, **{'Idempotency-Key': 'sync-1'})
+        self.assertEqual(first.status_code, 400)
+        retry = self.post({'date': '2024-05-06', 'type': 'IO'}, **{'Idempotency-Key': 'sync-1'})
+        self.assertEqual(retry.status_code, 422)
+        self.assertFalse(AttendanceRecord.objects.filter(user=self.user).exists())
+
+    def test_idempotency_claim_expires_after_killed_request(self):
+        with mock.patch('workspace.views.upsert_records', side_effect=SystemExit), self.assertRaises(SystemExit):
+            self.post({'date': '2024-05-06', 'type': 'IO'}, **{'Idempotency-Key': 'sync-1'})
+        self.assertEqual(self.post({'date': '2024-05-06', 'type': 'IO'}, **{'Idempotency-Key': 'sync-1'}).status_code, 409)
+
+        later = time.time() + settings.IDEMPOTENCY_LOCK_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            retry = self.post({'date': '2024-05-06', 'type': 'IO'}, **{'Idempotency-Key': 'sync-1'})
+        self.assertEqual(retry.json(), {'saved': 1})
+
+
+class LeaveProjectionTests(TestCase):
+    def setUp(self):
+        people = create_users(2, 'projection-', span_of_control=1)
+        (self.manager_id, self.manager), (self.user_id, _) = people
+
+    def attendance(self):
+        return dict(AttendanceRecord.objects.filter(user_id=self.user_id).values_list('date', 'type'))
+
+    def test_logged_days_survive_approval_and_cancellation(self):
+        AttendanceRecord.objects.bulk_upsert([AttendanceRecord(user_id=self.user_id, date=date(2030, 3, 4), type='IO')])
+        leave = LeaveRequest.objects.create(
+            user_id=self.user_id, leave_type='AL', start_date=date(2030, 3, 4), end_date=date(2030, 3, 6),
+            manager=self.manager,
+        )
+        LeaveRequest.objects.decide([leave.id], self.manager, 'approve')
+        self.assertEqual(self.attendance(), {date(2030, 3, 4): 'IO', date(2030, 3, 5): 'AL', date(2030, 3, 6): 'AL'})
+
+        upsert_records([AttendanceRecord(user_id=self.user_id, date=date(2030, 3, 5), type='WFH')])
+        leave.refresh_from_db()
+        leave.status = 'Cancelled'
+        leave.save()
+        self.assertEqual(self.attendance(), {date(2030, 3, 4): 'IO', date(2030, 3, 5): 'WFH'})
+
+    def test_replay_counts_days_written(self):
+        AttendanceRecord.objects.bulk_upsert([AttendanceRecord(user_id=self.user_id, date=date(2030, 3, 4), type='IO')])
+        LeaveRequest.objects.bulk_create([
+            LeaveRequest(user_id=self.user_id, leave_type='AL', start_date=start, end_date=end, status='Approved')
+            for start, end in ((date(2030, 3, 4), date(2030, 3, 8)), (date(2030, 3, 11), date(2030, 3, 12)))
+        ])
+        self.assertEqual(replay_projection(date(2030, 3, 1), date(2030, 3, 31), batch_size=3), (0, 6))
+        self.assertEqual(self.attendance()[date(2030, 3, 4)], 'IO')
+        self.assertEqual(replay_projection(date(2030, 3, 1), date(2030, 3, 31)), (6, 6))
+
+    def test_unknown_previous_status_in_email(self):
+        leave = LeaveRequest.objects.create(
+            user_id=self.user_id, leave_type='AL', start_date=date(2030, 3, 4), end_date=date(2030, 3, 4),
+            manager=self.manager, status='Approved',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            leave_status_changed.send(sender=LeaveRequest, changes=[(leave, '')])
+        body = OutboundEmail.objects.get().body
+        self.assertIn('2030-03-04 is now Approved.', body)
+
+
+class LeaveBalanceTests(TestCase):
+    def setUp(self):
+        people = create_users(2, 'balance-', span_of_control=1)
+        (self.manager_id, self.manager), (self.user_id, _) = people
+
+    def request_leave(self, start_date, end_date, leave_type='AL'):
+        return LeaveRequest.objects.create(
+            user_id=self.user_id, leave_type=leave_type, start_date=start_date, end_date=end_date,
+            manager=self.manager,
+        )
+
+    def balance(self, year=2030):
+        balance = LeaveBalance.objects.get(user_id=self.user_id, leave_type='AL', year=year)
+        return balance.pending, balance.taken, balance.remaining
+
+    def test_days_follow_status_changes(self):
+        leave = self.request_leave(date(2030, 3, 4), date(2030, 3, 10))  # Monday to Sunday: 5 working days
+        self.assertEqual(self.balance(), (5, 0, 20))
+
+        LeaveRequest.objects.decide([leave.id], self.manager, 'approve')
+        self.assertEqual(self.balance(), (0, 5, 20))
+
+        leave.refresh_from_db()
+        leave.status = 'Cancellation Pending'
+        leave.save()
+        self.assertEqual(self.balance(), (0, 5, 20))
+        LeaveRequest.objects.decide([leave.id], self.manager, 'approve')
+        self.assertEqual(self.balance(), (0, 0, 25))
+
+    def test_requests_split_across_years_and_released_on_delete(self):
+        leave = self.request_leave(date(2030, 12, 30), date(2031, 1, 2))
+        self.assertEqual((self.balance(2030), self.balance(2031)), ((2, 0, 23), (2, 0, 23)))
+        leave.delete()
+        self.assertEqual((self.balance(2030), self.balance(2031)), ((0, 0, 25), (0, 0, 25)))
+
+    def test_untracked_leave_types_have_no_balance(self):
+        self.request_leave(date(2030, 3, 4), date(2030, 3, 8), leave_type='SL')
+        self.assertFalse(LeaveBalance.objects.exists())
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        self.request_leave(date(2030, 3, 4), date(2030, 3, 8))
+        LeaveBalance.objects.update(pending=1, taken=3)
+
+        drift = reconcile_balances([self.user_id], fix=False)
+        self.assertEqual(drift, [
+            {'user_id': self.user_id, 'leave_type': 'AL', 'year': 2030, 'stored': (1, 3), 'expected': (5, 0)},
+        ])
+        self.assertEqual(self.balance(), (1, 3, 21))
+        reconcile_balances([self.user_id])
+        self.assertEqual(self.balance(), (5, 0, 20))
+        self.assertEqual(reconcile_balances(), [])
+
+    def test_form_checks_remaining_entitlement(self):
+        self.request_leave(date(2030, 3, 4), date(2030, 3, 29))  # 20 working days
+        user = User.objects.select_related('profile').get(pk=self.user_id)
+        data = {'leave_type': 'AL', 'start_date': '2030-04-01', 'end_date': '2030-04-05'}
+        with self.assertNumQueries(4):  # Balance, own overlapping requests, team size, team absences
+            self.assertTrue(LeaveRequestForm(data, user=user).is_valid())
+        data['end_date'] = '2030-04-08'
+        self.assertFalse(LeaveRequestForm(data, user=user).is_valid())
+        self.assertTrue(LeaveRequestForm(data).is_valid())
+
+    def test_form_credits_back_edited_request(self):
+        leave = self.request_leave(date(2030, 3, 4), date(2030, 3, 29))  # 20 of the 25 days
+        user = User.objects.select_related('profile').get(pk=self.user_id)
+        data = {'leave_type': 'AL', 'start_date': '2030-03-04', 'end_date': '2030-04-05'}  # 25 working days
+        self.assertTrue(self.edit_form(leave, data, user).is_valid())
+        data['end_date'] = '2030-04-08'
+        self.assertFalse(self.edit_form(leave, data, user).is_valid())
+        data.update(leave_type='PL', end_date='2030-04-05')  # Days held under another type are not credited
+        with override_settings(LEAVE_ENTITLEMENTS={'AL': 25, 'PL': 10}):
+            self.assertFalse(self.edit_form(leave, data, user).is_valid())
+
+    def edit_form(self, leave, data, user):
+        # A fresh copy each time, as a valid form writes its values onto the instance
+        return LeaveRequestForm(data, instance=LeaveRequest.objects.get(pk=leave.pk), user=user)
+
+    def test_create_view_routes_to_manager(self):
+        self.client.force_login(User.objects.get(pk=self.user_id))
+        response = self.client.post(
+            reverse('leave_request_create'), {'leave_type': 'AL', 'start_date': '2030-03-04', 'end_date': '2030-03-08'},
+        )
+        self.assertRedirects(response, reverse('leave_requests'), fetch_redirect_response=False)
+        self.assertEqual(LeaveRequest.objects.get(user_id=self.user_id).manager, self.manager)
+        self.assertEqual(self.balance(), (5, 0, 20))
+
+        response = self.client.post(
+            reverse('leave_request_create'), {'leave_type': 'AL', 'start_date': '2030-04-01', 'end_date': '2030-05-03'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'only 20 remain')
+        self.assertEqual(LeaveRequest.objects.filter(user_id=self.user_id).count(), 1)
+
+
+class LeaveConflictTests(TestCase):
+    def setUp(self):
+        people = create_users(6, 'conflict-', span_of_control=5)
+        self.manager = people[0][1]
+        self.users = list(User.objects.select_related('profile').filter(pk__in=[user_id for user_id, _ in people[1:]]))
+
+    def request_leave(self, user, start_date, end_date, status='Pending'):
+        return LeaveRequest.objects.create(
+            user=user, leave_type='PL', start_date=start_date, end_date=end_date, status=status, manager=self.manager,
+        )
+
+    def form(self, user, start_date, end_date):
+        return LeaveRequestForm(
+            {'leave_type': 'PL', 'start_date': start_date, 'end_date': end_date}, user=user,
+        )
+
+    def test_overlapping_own_request_rejected(self):
+        user = self.users[0]
+        self.request_leave(user, date(2030, 3, 4), date(2030, 3, 8))
+        self.request_leave(user, date(2030, 3, 11), date(2030, 3, 12), status='Denied')
+
+        self.assertFalse(self.form(user, '2030-03-08', '2030-03-12').is_valid())
+        self.assertTrue(self.form(user, '2030-03-09', '2030-03-12').is_valid())
+        with self.assertRaises(ValidationError):
+            self.request_leave(user, date(2030, 3, 1), date(2030, 3, 4))
+
+    def test_absent_per_day_counts_each_user_once(self):
+        first, second = self.users[:2]
+        self.request_leave(first, date(2030, 3, 4), date(2030, 3, 6))
+        self.request_leave(first, date(2030, 3, 7), date(2030, 3, 8), status='Approved')
+        LeaveRequest.objects.bulk_create([  # Overlapping rows written before conflicts were checked
+            LeaveRequest(user=second, leave_type='PL', start_date=start_date, end_date=end_date, status=status)
+            for start_date, end_date, status in (
+                (date(2030, 3, 5), date(2030, 3, 6), 'Pending'),
+                (date(2030, 3, 6), date(2030, 3, 6), 'Approved'),
+                (date(2030, 3, 6), date(2030, 3, 7), 'Cancelled'),
+            )
+        ])
+
+        with self.assertNumQueries(1):
+            absent = LeaveRequest.objects.absent_per_day(date(2030, 3, 3), date(2030, 3, 9), [first, second])
+        self.assertEqual(absent, [0, 1, 2, 2, 1, 1, 0])
+
+    def test_team_coverage_threshold(self):
+        # Five reports: at most two may be off on the same working day
+        self.request_leave(self.users[0], date(2030, 3, 4), date(2030, 3, 8))
+        self.assertTrue(self.form(self.users[2], '2030-03-06', '2030-03-06').is_valid())
+        self.request_leave(self.users[1], date(2030, 3, 6), date(2030, 3, 6))
+
+        form = self.form(self.users[2], '2030-03-05', '2030-03-10')
+        self.assertFalse(form.is_valid())
+        self.assertIn('2030-03-06', form.non_field_errors()[0])
+        self.assertNotIn('2030-03-05', form.non_field_errors()[0])
+        with override_settings(TEAM_MAX_ABSENT_SHARE=None):
+            self.assertTrue(self.form(self.users[2], '2030-03-05', '2030-03-10').is_valid())
+
+
+class ApprovalInboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        people = create_users(4, 'inbox-', span_of_control=3)
+        self.manager_id, self.manager = people[0]
+        UserProfile.objects.filter(pk=self.manager.pk).update(is_manager=True)
+        self.leave_requests = [
+            LeaveRequest.objects.create(
+                user_id=user_id, leave_type='PL', start_date=date(2030, 3, day), end_date=date(2030, 3, day),
+                manager=self.manager,
+            )
+            for day, (user_id, _) in enumerate(people[1:], start=4)
+        ]
+
+    def counter(self):
+        return UserProfile.objects.get(pk=self.manager.pk).pending_approvals
+
+    def test_counter_follows_status_changes(self):
+        self.assertEqual(self.counter(), 3)
+        LeaveRequest.objects.decide([self.leave_requests[0].pk], self.manager, 'approve')
+        self.assertEqual(self.counter(), 2)
+        self.leave_requests[1].delete()
+        self.assertEqual(self.counter(), 1)
+
+        self.manager.is_tenant_admin = True
+        self.manager.save()  # A stale copy still holding 0
+        self.assertEqual(self.counter(), 1)
+
+        UserProfile.objects.update(pending_approvals=0)
+        UserProfile.objects.recount_pending_approvals()
+        self.assertEqual(self.counter(), 1)
+
+    def test_badge_served_from_cache(self):
+        self.client.force_login(User.objects.get(pk=self.manager_id))
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'title="Leave requests awaiting your decision">3</span>')
+        with self.assertNumQueries(0):
+            self.assertEqual(pending_approval_count(self.manager.pk), 3)
+        LeaveRequest.objects.decide([self.leave_requests[0].pk], self.manager, 'reject')
+        self.assertEqual(pending_approval_count(self.manager.pk), 2)
+
+    def test_inbox_api_pages_oldest_first(self):
+        self.client.force_login(User.objects.get(pk=self.manager_id))
+        first = self.client.get(reverse('leave_inbox_api'), {'limit': 2}).json()
+        self.assertEqual(first['count'], 3)
+        self.assertEqual([row['id'] for row in first['results']], [leave.pk for leave in self.leave_requests[:2]])
+        second = self.client.get(reverse('leave_inbox_api'), {'limit': 2, 'after': first['next']}).json()
+        self.assertEqual([row['id'] for row in second['results']], [self.leave_requests[2].pk])
+        self.assertIsNone(second['next'])
+
+
+class LiveEventTests(TestCase):
+    def setUp(self):
+        people = create_users(2, 'events-', span_of_control=1)
+        (self.manager_id, self.manager), (self.user_id, _) = people
+        UserProfile.objects.filter(pk=self.manager.pk).update(is_manager=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leave = LeaveRequest.objects.create(
+                user_id=self.user_id, leave_type='PL', start_date=date(2030, 3, 4), end_date=date(2030, 3, 4),
+                manager=self.manager,
+            )
+
+    def poll(self, after=''):
+        return self.client.get(reverse('event_poll'), {'after': after}).json()
+
+    def test_decisions_reach_requester_and_manager(self):
+        self.client.force_login(User.objects.get(pk=self.user_id))
+        cursor = self.poll()['last_id']
+        with self.captureOnCommitCallbacks(execute=True):
+            LeaveRequest.objects.decide([self.leave.pk], self.manager, 'approve')
+
+        body = self.poll(cursor)
+        self.assertEqual([event['type'] for event in body['events']], ['leave_status'])
+        self.assertEqual(body['events'][0]['data']['status'], 'Approved')
+        self.assertEqual(self.poll(body['last_id'])['events'], [])
+
+        stream = async_to_sync(self.collect_stream)(
+            [profile_channel(self.manager.pk)], cursor - 1, self.manager.pk
+        )
+        self.assertIn('event: pending_approvals\ndata: {"count": 0}', stream)
+
+    async def collect_stream(self, channels, last_id, profile_id):
+        with override_settings(EVENTS_STREAM_MAX_AGE=0):
+            return ''.join([chunk async for chunk in sse_stream(channels, last_id, time.time() + 600, profile_id)])
+
+    def test_rolled_back_changes_are_not_pushed(self):
+        cursor = get_broker().latest_id
+        try:
+            with transaction.atomic():
+                LeaveRequest.objects.decide([self.leave.pk], self.manager, 'reject')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(get_broker().since([user_channel(self.user_id)], cursor), [])
+
+    def test_polling_does_not_extend_the_session(self):
+        self.client.force_login(User.objects.get(pk=self.user_id))
+        session = self.client.session
+        session['last_activity'] = (now() - timedelta(seconds=settings.SESSION_TIMEOUT - 30)).isoformat()
+        session.save()
+
+        body = self.poll()
+        self.assertEqual([event['type'] for event in body['events']], ['session_expiring'])
+        self.assertEqual(self.client.session['last_activity'], session['last_activity'])
+
+
+class WorkingCalendarTests(SimpleTestCase):
+    def test_bank_holidays_and_weekends_are_skipped(self):
+        calendar = get_calendar()
+        self.assertFalse(calendar.is_working_day(date(2024, 12, 25)))
+        self.assertTrue(calendar.is_working_day(date(2024, 12, 24)))
+        self.assertEqual(calendar.count_by_year(date(2024, 12, 23), date(2025, 1, 3)), {2024: 5, 2025: 2})
+        self.assertEqual(
+            list(calendar.days(date(2024, 12, 23), date(2024, 12, 31))),
+            [date(2024, 12, 23), date(2024, 12, 24), date(2024, 12, 27), date(2024, 12, 30), date(2024, 12, 31)],
+        )
+
+    def test_bulk_counts_match_day_by_day(self):
+        calendar = WorkingCalendar(load_closed_days())
+        ranges = [
+            (date(2023, 1, 1) + timedelta(days=offset), date(2023, 1, 1) + timedelta(days=offset + length))
+            for offset in range(0, 900, 37) for length in (-1, 0, 6, 45, 400)
+        ]
+        expected = [
+            sum(calendar.is_working_day(start_date + timedelta(days=day)) for day in range((end_date - start_date).days + 1))
+            for start_date, end_date in ranges
+        ]
+        self.assertEqual(calendar.count_many(ranges), expected)
+
+    @override_settings(ORG_CLOSURE_DAYS=['2024-12-24'])
+    def test_closure_days_reload_with_settings(self):
+        self.assertEqual(count_working_days(date(2024, 12, 23), date(2024, 12, 27)), 2)
+
+    @override_settings(BANK_HOLIDAY_DIVISION='scotland')
+    def test_divisions(self):
+        self.assertFalse(get_calendar().is_working_day(date(2025, 1, 2)))
+        self.assertTrue(get_calendar().is_working_day(date(2025, 4, 21)))  # Easter Monday is not a holiday in Scotland
+        with override_settings(BANK_HOLIDAY_DIVISION='wales'):
+            with self.assertRaises(ImproperlyConfigured):
+                get_calendar()
+
+    def test_years_outside_fixture_are_logged(self):
+        calendar = WorkingCalendar(load_closed_days(), covered_years=(2018, 2027))
+        with self.assertLogs('workspace.working_calendar', 'WARNING'):
+            calendar.is_working_day(date(2028, 1, 3))
+        with self.assertNoLogs('workspace.working_calendar', 'WARNING'):
+            calendar.is_working_day(date(2028, 5, 1))
+            calendar.is_working_day(date(2027, 5, 3))
@@ -1,10 +1,12 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView
 from django.contrib.auth import login
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.utils.timezone import now
 from django.conf import settings
 from django.db.models import Case, When, Value, IntegerField, Count
@@ -12,16 +14,33 @@ from django.urls import reverse
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.template.loader import render_to_string
-from django.core.mail import get_connection, EmailMessage
 from django.contrib.auth.tokens import default_token_generator
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
 from datetime import datetime, timedelta
-from collections import Counter
 
-import ssl
-import certifi
+import json
+from functools import partial
 
-from .models import UserProfile, LeaveRequest, AttendanceRecord, User
+from .models import UserProfile, LeaveBalance, LeaveRequest, AttendanceRecord, AttendanceMonthlySummary, User
 from .forms import CustomUserCreationForm, AttendanceRecordForm, LeaveRequestForm
+from .decorators import tenant_admin_required, manager_required
+from .attendance_import import (
+    PARSERS, ImportResult, import_attendance, iter_text_chunks, upsert_records, validate_user_rows,
+)
+from .attendance_archive import attendance_history_page
+from .events import poll_events, profile_channel, session_deadline, sse_stream, user_channel
+from .idempotency import idempotent
+from .inbox import inbox_page, pending_approval_count
+from .team_calendar import build_team_calendar
+from .mail import queue_email
+from .pagination import keyset_queryset, keyset_page
+from .profiling import get_profile_store, summarize
+from .exports import (
+    ATTENDANCE_COLUMNS, LEAVE_COLUMNS, CONTENT_TYPES, RowFormatter,
+    leave_export_queryset, stream_rows, astream_rows, stream_attendance_rows, astream_attendance_rows,
+)
+from .dashboard_cache import aget_dashboard_version, aget_dashboard_data, aset_dashboard_data
 
 
 # Home View
@@ -38,9 +57,7 @@ def register(request):
         if form.is_valid():
             user = form.save(commit=False)
             user.is_active = False  # Set user as inactive until email verification
-            user.save()
-
-            UserProfile.objects.get_or_create(user=user)
+            user.save()  # The post_save hook creates the profile
 
             token = default_token_generator.make_token(user)
             uid = urlsafe_base64_encode(force_bytes(user.pk))
@@ -54,24 +71,8 @@ def register(request):
                 'verification_link': verification_link,
             })
 
-            secure_connection = get_connection(
-                host=settings.EMAIL_HOST,
-                port=settings.EMAIL_PORT,
-                username=settings.EMAIL_HOST_USER,
-                password=settings.EMAIL_HOST_PASSWORD,
-                use_tls=True,
-                ssl_context=ssl.create_default_context(cafile=certifi.where())
-            )
-
-            email = EmailMessage(
-                subject=subject,
-                body=message,
-                from_email=settings.EMAIL_HOST_USER,
-                to=[user.email],
-                connection=secure_connection,
-            )
-            email.content_subtype = "html"
-            email.send()
+            # Delivered by the send_queued_email worker, off the request path
+            queue_email(subject, message, [user.email], html=True)
 
             messages.success(request, "Account created! Please check your email to verify your account.")
             return redirect('home')
@@ -91,11 +92,9 @@ def verify_email(request, uidb64, token):
 
     if user and default_token_generator.check_token(user, token):
         user.is_active = True
-        user.save()
+        user.save(update_fields=['is_active'])
 
-        profile, created = UserProfile.objects.get_or_create(user=user)
-        profile.is_email_verified = True
-        profile.save()
+        UserProfile.objects.filter(user=user).update(is_email_verified=True)
 
         messages.success(request, "Email verified! You can now log in.")
         return redirect('login')
@@ -128,54 +127,273 @@ def session_timeout_warning(request):
     return JsonResponse({"error": "Invalid request method."}, status=400)
 
 
+# Live Events: server-sent events, with a long-poll fallback
+async def _event_channels(user):
+    """
+    Returns the user's channels and, for managers, the profile id whose inbox count they follow.
+    """
+    profile = await sync_to_async(getattr)(user, 'profile', None)
+    if profile is not None and profile.is_manager:
+        return [user_channel(user.pk), profile_channel(profile.pk)], profile.pk
+    return [user_channel(user.pk)], None
+
+
+def _last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def event_stream(request):
+    """
+    Streams leave status changes, inbox counts and session expiry warnings as server-sent events.
+
+    Under ASGI the stream stays open without holding a worker thread. WSGI workers cannot, so
+    they answer with the backlog and let EventSource reconnect after EVENTS_RETRY_MS.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=204)  # Tells EventSource to stop reconnecting
+    channels, profile_id = await _event_channels(user)
+    last_id = _last_event_id(request.headers.get('Last-Event-ID'))
+    deadline = await session_deadline(request.session)
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(
+            sse_stream(channels, last_id, deadline, profile_id), content_type='text/event-stream'
+        )
+    else:
+        events, _ = await poll_events(channels, last_id, deadline, profile_id, wait=False)
+        response = HttpResponse(
+            f'retry: {settings.EVENTS_RETRY_MS}\n\n' + ''.join(event.as_sse() for event in events),
+            content_type='text/event-stream',
+        )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Keep proxies from buffering the stream
+    return response
+
+
+async def event_poll(request):
+    """
+    Long-poll fallback for clients without EventSource. Pass the returned "last_id" as ?after=
+    and wait "retry" milliseconds before polling again after an empty answer.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+    channels, profile_id = await _event_channels(user)
+    deadline = await session_deadline(request.session)
+    # Only wait on the event loop: never park a WSGI worker, nor the thread that the sync-only
+    # profiling middleware would hand the request to
+    wait = isinstance(request, ASGIRequest) and not settings.PROFILING_ENABLED
+    events, cursor = await poll_events(
+        channels, _last_event_id(request.GET.get('after')), deadline, profile_id, wait=wait
+    )
+    return JsonResponse({
+        "events": [event.as_dict() for event in events],
+        "last_id": cursor,
+        "retry": 0 if wait else settings.EVENTS_RETRY_MS,  # Delay before the next poll when nothing came
+    })
+
+
 # Dashboard View
 @login_required
-def dashboard(request):
+async def dashboard(request):
     """
     Simplified dashboard view to focus on user-specific data.
+
+    Runs asynchronously: under ASGI the view stays on the event loop, so the worker keeps
+    serving other requests and event streams while this one waits on the database.
     """
-    # Format attendance records for serialization
-    attendance_records = [
-        {
-            "date": record.date.strftime("%Y-%m-%d"),
-            "status": record.get_status_display() if hasattr(record, 'get_status_display') else record.status
-        }
-        for record in AttendanceRecord.objects.filter(user=request.user).order_by('-date')[:5]
-    ]
+    user = await request.auser()
+
+    # Served from the per-user cache until a signal bumps the version
+    version = await aget_dashboard_version(user.pk)
+    context = await aget_dashboard_data(user.pk, version)
+    if context is None:
+        context = await _build_dashboard_data(user)
+        await aset_dashboard_data(user.pk, version, context)
+    context['dashboard_version'] = version
+    context['dashboard_cache_timeout'] = settings.DASHBOARD_CACHE_TIMEOUT
+
+    return await sync_to_async(render)(request, 'workspace/dashboard.html', context)
+
+
+async def _build_dashboard_data(user):
+    """
+    Runs the dashboard queries. Django's async ORM executes them one at a time on its
+    shared sync thread, so they are simply awaited in turn.
+    """
+    work_types = dict(AttendanceRecord.WORK_TYPES)
+    statuses = dict(LeaveRequest.STATUS_CHOICES)
 
-    # Format leave requests for managers
-    leave_requests = []
-    if hasattr(request.user, 'profile') and request.user.profile.is_manager:
-        leave_requests = [
+    async def recent_attendance():
+        # Serialized from values() rows, one query however long the history is
+        return [
             {
-                "user": leave.user.get_full_name(),
-                "start_date": leave.start_date.strftime("%Y-%m-%d"),
-                "end_date": leave.end_date.strftime("%Y-%m-%d"),
-                "status": leave.get_status_display() if hasattr(leave, 'get_status_display') else leave.status
+                "date": record['date'].strftime("%Y-%m-%d"),
+                "status": work_types.get(record['type'], record['type']),
             }
-            for leave in LeaveRequest.objects.filter(manager=request.user, status='P').order_by('-start_date')
+            async for record in AttendanceRecord.objects.filter(user=user).order_by('-date').values('date', 'type')[:5]
+        ]
+
+    async def pending_leave_requests():
+        # Requests awaiting this manager, names joined in so the query count is flat for any team size.
+        # The profile arrives with the user, so non-managers skip the query altogether.
+        profile = await sync_to_async(getattr)(user, 'profile', None)
+        if profile is None or not profile.is_manager:
+            return []
+        return [
+            {
+                "user": f"{leave['user__first_name']} {leave['user__last_name']}".strip() or leave['user__username'],
+                "start_date": leave['start_date'].strftime("%Y-%m-%d"),
+                "end_date": leave['end_date'].strftime("%Y-%m-%d"),
+                "status": statuses[leave['status']],
+            }
+            async for leave in LeaveRequest.objects.awaiting_decision().filter(
+                manager=profile
+            ).order_by('-start_date').values(
+                'user__first_name', 'user__last_name', 'user__username', 'start_date', 'end_date', 'status'
+            )
         ]
 
-    context = {
-        "attendance_records": attendance_records,
-        "leave_requests": leave_requests
+    async def leave_balances():
+        # This year's ledger rows in one read; types without a row yet show the full entitlement
+        leave_types = dict(LeaveRequest.LEAVE_TYPES)
+        stored = {
+            balance['leave_type']: balance
+            async for balance in LeaveBalance.objects.filter(user=user, year=now().year).values(
+                'leave_type', 'entitlement', 'pending', 'taken'
+            )
+        }
+        balances = []
+        for leave_type, entitlement in settings.LEAVE_ENTITLEMENTS.items():
+            balance = stored.get(leave_type, {'entitlement': entitlement, 'pending': 0, 'taken': 0})
+            balances.append({
+                "leave_type": leave_types.get(leave_type, leave_type),
+                "entitlement": balance['entitlement'],
+                "pending": balance['pending'],
+                "taken": balance['taken'],
+                "remaining": balance['entitlement'] - balance['pending'] - balance['taken'],
+            })
+        return balances
+
+    return {
+        "attendance_records": await recent_attendance(),
+        "leave_requests": await pending_leave_requests(),
+        "leave_balances": await leave_balances(),
     }
 
-    return render(request, 'workspace/dashboard.html', context)
+
+# History scope: a user's own rows, or everyone's for tenant admins passing ?scope=all
+def _history_filters(request, user, is_admin):
+    if request.GET.get('scope') == 'all' and is_admin:
+        return {}
+    return {'user': user}
+
+
+async def _ahistory_filters(request, user):
+    is_admin = False
+    if request.GET.get('scope') == 'all':
+        # The profile normally arrives with the user, so this only queries when it was not loaded
+        profile = await sync_to_async(getattr)(user, 'profile', None)
+        is_admin = user.is_staff or bool(profile and profile.is_tenant_admin)
+    return _history_filters(request, user, is_admin)
 
 
 # Leave Request List View
 @login_required
-def leave_request_list(request):
-    leave_requests = LeaveRequest.objects.filter(user=request.user).order_by('-start_date')
-    return render(request, 'workspace/leave_request_list.html', {'leave_requests': leave_requests})
+async def leave_request_list(request):
+    user = await request.auser()
+    filters = await _ahistory_filters(request, user)
+    queryset = keyset_queryset(
+        LeaveRequest.objects.filter(**filters).select_related('manager__user').only(
+            'leave_type', 'start_date', 'end_date', 'status', 'manager__user__username'
+        ),
+        'start_date',
+        request.GET.get('after'),
+    )
+    leave_requests, next_cursor = keyset_page([leave async for leave in queryset], 'start_date')
+    return await sync_to_async(render)(request, 'workspace/leave_request_list.html', {
+        'leave_requests': leave_requests,
+        'next_cursor': next_cursor,
+        'scope': request.GET.get('scope', ''),
+    })
+
+
+@login_required
+def leave_request_create(request):
+    form = LeaveRequestForm(request.POST or None, user=request.user)
+    if request.method == 'POST' and form.is_valid():
+        leave = form.save(commit=False)
+        profile = getattr(request.user, 'profile', None)
+        leave.manager_id = profile.manager_id if profile else None  # Routed to the requester's manager
+        leave.save()
+        messages.success(request, 'Leave request submitted.')
+        return redirect('leave_requests')
+
+    return render(request, 'workspace/leave_request_form.html', {
+        'form': form,
+        'leave_types': LeaveRequest.LEAVE_TYPES,
+    })
 
 
 # Attendance Record Views
 @login_required
-def attendance_list(request):
-    records = AttendanceRecord.objects.filter(user=request.user).order_by('-date')
-    return render(request, 'workspace/attendance_list.html', {'records': records})
+async def attendance_list(request):
+    user = await request.auser()
+    filters = await _ahistory_filters(request, user)
+    # Archived days are merged in, so the history reads the same before and after archive_attendance
+    records, next_cursor = await sync_to_async(attendance_history_page)(filters, request.GET.get('after'))
+    return await sync_to_async(render)(request, 'workspace/attendance_list.html', {
+        'attendance_records': records,
+        'next_cursor': next_cursor,
+        'scope': request.GET.get('scope', ''),
+    })
+
+
+# Streaming CSV/NDJSON Exports
+def _export_response(request, columns, filename, stream, astream):
+    """
+    Streams `stream(formatter)`, or `astream(formatter)` under ASGI, as a CSV or NDJSON download.
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in CONTENT_TYPES:
+        return JsonResponse({"error": "Unsupported format. Use csv or ndjson."}, status=400)
+
+    formatter = RowFormatter(export_format, columns)
+    # ASGI servers consume an async iterator without buffering; WSGI streams the sync one
+    if isinstance(request, ASGIRequest):
+        rows = astream(formatter)
+    else:
+        rows = stream(formatter)
+
+    response = StreamingHttpResponse(rows, content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+
+def _is_admin(user):
+    profile = getattr(user, 'profile', None)
+    return user.is_staff or bool(profile and profile.is_tenant_admin)
+
+
+@login_required
+def attendance_export(request):
+    filters = _history_filters(request, request.user, _is_admin(request.user))
+    return _export_response(
+        request, ATTENDANCE_COLUMNS, 'attendance',
+        partial(stream_attendance_rows, filters), partial(astream_attendance_rows, filters),
+    )
+
+
+@login_required
+def leave_request_export(request):
+    queryset = leave_export_queryset(_history_filters(request, request.user, _is_admin(request.user)))
+    return _export_response(
+        request, LEAVE_COLUMNS, 'leave_requests', partial(stream_rows, queryset), partial(astream_rows, queryset),
+    )
 
 
 @login_required
@@ -185,7 +403,7 @@ def attendance_create(request):
         if form.is_valid():
             attendance = form.save(commit=False)
             attendance.user = request.user
-            attendance.save()
+            upsert_records([attendance])  # Re-submitting a day updates it instead of failing on (user, date)
             return redirect('attendance_list')
     else:
         form = AttendanceRecordForm()
@@ -193,6 +411,71 @@ def attendance_create(request):
     return render(request, 'workspace/attendance_create.html', {'form': form})
 
 
+# Bulk attendance import for badge-reader and HR feeds
+BULK_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/json': 'json',
+}
+
+
+@login_required
+@tenant_admin_required
+@require_POST
+def attendance_bulk_import(request):
+    """
+    Streams a CSV, NDJSON or JSON array request body into AttendanceRecord in batches.
+    """
+    input_format = BULK_CONTENT_TYPES.get(request.content_type)
+    if input_format is None:
+        return JsonResponse(
+            {"error": f"Unsupported content type. Use one of: {', '.join(BULK_CONTENT_TYPES)}."},
+            status=415,
+        )
+
+    try:
+        result = import_attendance(PARSERS[input_format](iter_text_chunks(request)))
+    except (ValueError, UnicodeDecodeError) as exc:
+        return JsonResponse({"error": f"Could not parse request body: {exc}"}, status=400)
+
+    return JsonResponse(result.as_dict())
+
+
+# Attendance API for clock-in clients
+@login_required
+@require_POST
+@idempotent('attendance')
+def attendance_upsert_api(request):
+    """
+    Records days for the current user from {"days": [{"date": "YYYY-MM-DD", "type": "IO"}, ...]}
+    or a single {"date", "type"} object.
+
+    Days are upserted on (user, date), so a retried or re-synced day overwrites itself rather
+    than failing. Responds {"saved": n} plus {"errors": {index: message}} for rejected days.
+    """
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Expected a JSON body."}, status=400)
+    days = payload.get('days', [payload]) if isinstance(payload, dict) else payload
+    if not isinstance(days, list) or not days:
+        return JsonResponse({"error": "Expected {\"days\": [{\"date\": ..., \"type\": ...}]}."}, status=400)
+    if len(days) > settings.ATTENDANCE_API_BATCH_LIMIT:
+        return JsonResponse(
+            {"error": f"At most {settings.ATTENDANCE_API_BATCH_LIMIT} days can be recorded at once."}, status=400
+        )
+
+    result = ImportResult()
+    records = validate_user_rows(days, request.user.pk, result)
+    if records:
+        upsert_records(records)
+
+    body = {"saved": len(records)}
+    if result.errors:
+        body["errors"] = {str(error['row']): error['error'] for error in result.errors}
+    return JsonResponse(body, status=200 if records or not result.errors else 400)
+
+
 @login_required
 def attendance_delete(request, pk):
     record = get_object_or_404(AttendanceRecord, pk=pk, user=request.user)
@@ -201,26 +484,117 @@ def attendance_delete(request, pk):
 
 
 # Leave Request Approval for Managers
+def _decide_leave(request, leave_id, action):
+    results = LeaveRequest.objects.decide([leave_id], request.user.profile, action)
+    if results[leave_id] == 'not_found':
+        raise Http404("Leave request not found.")
+    return redirect('dashboard')
+
+
 @login_required
+@manager_required
 def approve_leave(request, leave_id):
-    leave = get_object_or_404(LeaveRequest, id=leave_id, manager=request.user)
-    leave.status = 'A'
-    leave.save()
-    return redirect('dashboard')
+    return _decide_leave(request, leave_id, 'approve')
 
 
 @login_required
+@manager_required
 def reject_leave(request, leave_id):
-    leave = get_object_or_404(LeaveRequest, id=leave_id, manager=request.user)
-    leave.status = 'R'
-    leave.save()
-    return redirect('dashboard')
+    return _decide_leave(request, leave_id, 'reject')
+
+
+@login_required
+@manager_required
+@require_POST
+def bulk_decide_leave(request):
+    """
+    Approves or rejects a list of leave requests in one transaction.
+
+    Expects JSON {"ids": [...], "action": "approve" | "reject"} and returns the outcome per id.
+    """
+    try:
+        payload = json.loads(request.body)
+        ids = [int(leave_id) for leave_id in payload['ids']]
+        action = payload['action']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Expected {\"ids\": [...], \"action\": \"approve\" or \"reject\"}."}, status=400)
+    if action not in LeaveRequest.DECISIONS:
+        return JsonResponse({"error": "Action must be approve or reject."}, status=400)
+    if len(ids) > settings.LEAVE_BULK_DECISION_LIMIT:
+        return JsonResponse(
+            {"error": f"At most {settings.LEAVE_BULK_DECISION_LIMIT} requests can be decided at once."}, status=400
+        )
+
+    results = LeaveRequest.objects.decide(ids, request.user.profile, action)
+    return JsonResponse({"results": {str(leave_id): outcome for leave_id, outcome in results.items()}})
+
+
+@login_required
+@manager_required
+def leave_inbox_api(request):
+    """
+    Pages through the requests awaiting the manager's decision, oldest first.
+
+    Pass the returned "next" as ?after= for the following page. "count" is the
+    denormalized inbox size, also shown as the nav badge.
+    """
+    try:
+        page_size = min(int(request.GET.get('limit', settings.INBOX_PAGE_SIZE)), settings.INBOX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"error": "limit must be a number."}, status=400)
+    leave_requests, next_cursor = inbox_page(request.user.profile, request.GET.get('after'), max(page_size, 1))
+    return JsonResponse({
+        "count": pending_approval_count(request.user.profile.pk),
+        "results": [
+            {
+                "id": leave.pk,
+                "user": leave.user.get_full_name() or leave.user.username,
+                "leave_type": leave.leave_type,
+                "start_date": leave.start_date.isoformat(),
+                "end_date": leave.end_date.isoformat(),
+                "status": leave.status,
+                "created_at": leave.created_at.isoformat(),
+            }
+            for leave in leave_requests
+        ],
+        "next": next_cursor,
+    })
+
+
+# Team Calendar Views for Managers
+def _team_calendar_or_404(request, year, month):
+    if not 1 <= month <= 12 or not 1 <= year <= 9999:
+        raise Http404("Invalid calendar month.")
+    include_indirect = request.GET.get('scope') == 'org'  # Skip-level view of the whole org tree
+    return build_team_calendar(request.user.profile, year, month, include_indirect=include_indirect)
+
+
+@login_required
+@manager_required
+def team_calendar(request, year, month):
+    team_calendar = _team_calendar_or_404(request, year, month)
+    return render(request, 'workspace/team_calendar.html', {'calendar': team_calendar})
+
+
+@login_required
+@manager_required
+def team_calendar_api(request, year, month):
+    return JsonResponse(_team_calendar_or_404(request, year, month).as_dict())
+
+
+# Request profiling (QueryProfilingMiddleware)
+@login_required
+@tenant_admin_required
+def profile_summary(request):
+    """
+    Summarizes the samples this worker keeps in memory, as profile_report does for PROFILING_SINK.
+    """
+    if not settings.PROFILING_ENABLED:
+        raise Http404("Profiling is not enabled.")
+    return JsonResponse({"views": summarize(get_profile_store().recent())})
 
 
 # Attendance Summary (Utility)
 def get_attendance_counts_for_month(user):
-    current_month = now().month
-    current_year = now().year
-    records = AttendanceRecord.objects.filter(user=user, date__year=current_year, date__month=current_month)
-    counts = Counter(record.type for record in records)
-    return dict(counts)
+    today = now().date()
+    return AttendanceMonthlySummary.objects.counts([user], today.year, today.month)
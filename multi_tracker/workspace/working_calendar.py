@@ -0,0 +1,191 @@
+import json
+import logging
+import threading
+from array import array
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+logger = logging.getLogger(__name__)
+
+# Settings that change which days are closed
+CALENDAR_SETTINGS = {'BANK_HOLIDAYS_FILE', 'BANK_HOLIDAY_DIVISION', 'ORG_CLOSURE_DAYS'}
+
+
+def load_bank_holidays():
+    """
+    Reads the bank holidays of BANK_HOLIDAY_DIVISION from the local fixture.
+
+    The fixture uses the layout of the GOV.UK bank holidays feed, so it can be refreshed from it.
+    """
+    with open(settings.BANK_HOLIDAYS_FILE, encoding='utf-8') as fixture:
+        divisions = json.load(fixture)
+    if settings.BANK_HOLIDAY_DIVISION not in divisions:
+        raise ImproperlyConfigured(
+            f'BANK_HOLIDAY_DIVISION is {settings.BANK_HOLIDAY_DIVISION!r}, but {settings.BANK_HOLIDAYS_FILE} '
+            f'only has {", ".join(sorted(divisions))}.'
+        )
+    return {date.fromisoformat(event['date']) for event in divisions[settings.BANK_HOLIDAY_DIVISION]['events']}
+
+
+def load_closed_days(bank_holidays=None):
+    """
+    Returns the bank holidays (read from the fixture unless given) plus ORG_CLOSURE_DAYS.
+    """
+    if bank_holidays is None:
+        bank_holidays = load_bank_holidays()
+    return set(bank_holidays) | {date.fromisoformat(day) for day in settings.ORG_CLOSURE_DAYS}
+
+
+class WorkingCalendar:
+    """
+    Answers working-day questions in constant time from per-year tables.
+
+    Each year is built once, on first use, as a bitset with one bit per day of the year (set for
+    working days) and a prefix-sum array where prefix[i] is the number of working days before day i.
+    Weekends and closed days are the non-working days. Years outside `covered_years`, the
+    (first, last) years the holiday data spans, are logged once as they are built, since their
+    bank holidays would silently count as working days.
+    """
+
+    def __init__(self, closed_days, covered_years=None):
+        self.closed_days = frozenset(closed_days)
+        self.covered_years = covered_years
+        self._years = {}
+        self._lock = threading.Lock()
+
+    def _year(self, year):
+        table = self._years.get(year)
+        if table is None:
+            with self._lock:
+                table = self._years.get(year) or self._build_year(year)
+                self._years[year] = table
+        return table
+
+    def _build_year(self, year):
+        if self.covered_years and not self.covered_years[0] <= year <= self.covered_years[1]:
+            logger.warning(
+                'No bank holidays are known for %s (%s covers %s-%s); only weekends and ORG_CLOSURE_DAYS are closed.',
+                year, settings.BANK_HOLIDAYS_FILE, *self.covered_years,
+            )
+        first = date(year, 1, 1)
+        length = (date(year + 1, 1, 1) - first).days
+        bits = 0
+        prefix = array('H', [0]) * (length + 1)
+        weekday = first.weekday()
+        for index in range(length):
+            working = (weekday + index) % 7 < 5 and first + timedelta(days=index) not in self.closed_days
+            if working:
+                bits |= 1 << index
+            prefix[index + 1] = prefix[index] + working
+        return first.toordinal(), bits, prefix
+
+    def is_working_day(self, day):
+        start, bits, _ = self._year(day.year)
+        return bool(bits >> (day.toordinal() - start) & 1)
+
+    def count(self, start_date, end_date):
+        """
+        Number of working days in [start_date, end_date], 0 for an empty range.
+        """
+        if end_date < start_date:
+            return 0
+        if start_date.year == end_date.year:
+            start, _, prefix = self._year(start_date.year)
+            return prefix[end_date.toordinal() - start + 1] - prefix[start_date.toordinal() - start]
+        return sum(self.count_by_year(start_date, end_date).values())
+
+    def count_by_year(self, start_date, end_date):
+        """
+        Working days in [start_date, end_date] per calendar year, as {year: days}.
+        """
+        counts = {}
+        for year in range(start_date.year, end_date.year + 1):
+            start, _, prefix = self._year(year)
+            first = start_date.toordinal() - start if year == start_date.year else 0
+            last = end_date.toordinal() - start + 1 if year == end_date.year else len(prefix) - 1
+            counts[year] = prefix[last] - prefix[first]
+        return counts
+
+    def days(self, start_date, end_date):
+        """
+        Yields the working days in [start_date, end_date], skipping straight between set bits.
+        """
+        if end_date < start_date:
+            return
+        for year in range(start_date.year, end_date.year + 1):
+            start, bits, prefix = self._year(year)
+            first = start_date.toordinal() - start if year == start_date.year else 0
+            last = end_date.toordinal() - start if year == end_date.year else len(prefix) - 2
+            remaining = (bits >> first) & ((1 << (last - first + 1)) - 1)
+            offset = start + first
+            while remaining:
+                low = remaining & -remaining
+                yield date.fromordinal(offset + low.bit_length() - 1)
+                remaining ^= low
+
+    def count_many(self, ranges):
+        """
+        Counts working days for many (start_date, end_date) ranges in one pass, in input order.
+
+        Ranges within a single year, the usual case, are two array lookups each.
+        """
+        years = self._years
+        counts = []
+        for start_date, end_date in ranges:
+            if start_date.year == end_date.year and start_date <= end_date:
+                start, _, prefix = years.get(start_date.year) or self._year(start_date.year)
+                counts.append(prefix[end_date.toordinal() - start + 1] - prefix[start_date.toordinal() - start])
+            else:
+                counts.append(self.count(start_date, end_date))
+        return counts
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_calendar():
+    """
+    Returns the process-wide calendar, loading the fixture on first use.
+    """
+    global _calendar
+    if _calendar is None:
+        with _calendar_lock:
+            if _calendar is None:
+                bank_holidays = load_bank_holidays()
+                _calendar = WorkingCalendar(
+                    load_closed_days(bank_holidays),
+                    covered_years=(min(bank_holidays).year, max(bank_holidays).year) if bank_holidays else None,
+                )
+    return _calendar
+
+
+@receiver(setting_changed)
+def reset_calendar(sender, setting, **kwargs):
+    global _calendar
+    if setting in CALENDAR_SETTINGS:
+        _calendar = None
+
+
+def is_working_day(day):
+    return get_calendar().is_working_day(day)
+
+
+def working_days(start_date, end_date):
+    """
+    Yields the working days in [start_date, end_date].
+    """
+    return get_calendar().days(start_date, end_date)
+
+
+def count_working_days(start_date, end_date):
+    return get_calendar().count(start_date, end_date)
+
+
+def count_working_days_many(ranges):
+    return get_calendar().count_many(ranges)